@@ -31,6 +31,9 @@ class User(AbstractBaseUser, PermissionsMixin):
     niss = models.CharField(max_length=11, unique=True, null=True, blank=True)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    ical_feed_key = models.CharField(max_length=64, blank=True, default="",
+        help_text="Secret du flux .ics du praticien ; le renouveler révoque l'URL précédente.",
+    )
 
     objects = CustomUserManager()
 
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.mail import send_mail
+from django.utils import timezone
+
+from jobs.registry import task
+from .models import Invitation
+
+
+@task("accounts.send_invitation")
+def send_invitation(invitation_id, new_account):
+    """
+    E-mail d'invitation à rejoindre un cabinet. Ignoré si l'invitation a été
+    utilisée ou a expiré entre-temps.
+    """
+    invitation = Invitation.objects.filter(pk=invitation_id, used=False, expires_at__gt=timezone.now()).first()
+    if invitation is None:
+        return
+
+    link = f"{settings.FRONTEND_URL}/register-join?token={invitation.token}"
+    action = "finaliser votre inscription" if new_account else "accepter"
+    send_mail(
+        "Invitation à rejoindre un cabinet sur CareHub",
+        f"Bonjour {invitation.name},\n\nVous avez été invité(e) en tant que {invitation.role}."
+        f" Cliquez ici pour {action} : {link}\n\nLien valable 2 jours.",
+        settings.DEFAULT_FROM_EMAIL,
+        [invitation.email],
+    )
@@ -13,7 +13,6 @@ from datetime import timedelta
 
 from django.conf import settings
 from django.shortcuts import render
-from django.core.mail import send_mail
 from django.core.exceptions import FieldDoesNotExist
 from django.utils import timezone
 from django.db import transaction
@@ -28,7 +27,7 @@ from rest_framework_simplejwt.tokens import RefreshToken
 
 import stripe
 from auditing.utils import log_audit
-from subscriptions.services import ensure_subscription_matches_roles
+from jobs.registry import enqueue
 from subscriptions.models import Subscription
 from offices.models import Office
 from .models import Invitation, User, UserOfficeRole
@@ -165,16 +164,15 @@ class RegisterFullAccount(APIView):
         #Créateur du cabinet est direct manager
         UserOfficeRole.objects.create(user=user, office=office, role='manager')
         
-        sync_res = ensure_subscription_matches_roles(office, user.email)
+        # Stripe hors requête : le client Stripe est créé par la file de tâches ;
+        # la session de paiement est ouverte par le paywall (subscriptions/checkout/start).
+        enqueue("subscriptions.sync_roles", office_id=office.pk, email=user.email)
         refresh = RefreshToken.for_user(user)
         resp = {
             "refresh": str(refresh),
             "access": str(refresh.access_token),
         }
 
-        if isinstance(sync_res, dict) and sync_res.get("checkout_url"):
-            resp["checkout_url"] = sync_res["checkout_url"]
-
         return Response(resp, status=status.HTTP_201_CREATED)
 
 @api_view(['GET'])
@@ -285,14 +283,7 @@ def invite_user(request):
                 surname=user.surname or "",
                 expires_at=expires_at,
             )
-            link = f"{settings.FRONTEND_URL}/register-join?token={inv.token}"
-            send_mail(
-                "Invitation à rejoindre un cabinet sur CareHub",
-                f"Bonjour {user.name},\n\nVous avez été invité(e) en tant que {role}."
-                f" Cliquez ici pour accepter : {link}\n\nLien valable 2 jours.",
-                settings.DEFAULT_FROM_EMAIL,
-                [user.email],
-            )
+            enqueue("accounts.send_invitation", invitation_id=inv.pk, new_account=False)
             return Response({"message": "Invitation envoyée à un compte existant.", "invited_existing": True}, status=201)
 
         if not (email and name and surname):
@@ -313,14 +304,7 @@ def invite_user(request):
             surname=surname,
             expires_at=expires_at,
         )
-        link = f"{settings.FRONTEND_URL}/register-join?token={inv.token}"
-        send_mail(
-            "Invitation à rejoindre un cabinet sur CareHub",
-            f"Bonjour {name},\n\nVous avez été invité(e) en tant que {role}."
-            f" Cliquez ici pour finaliser votre inscription : {link}\n\nLien valable 2 jours.",
-            settings.DEFAULT_FROM_EMAIL,
-            [email],
-        )
+        enqueue("accounts.send_invitation", invitation_id=inv.pk, new_account=True)
         return Response({"message": "Invitation envoyée."}, status=201)
 
     if not (email and name and surname):
@@ -339,14 +323,7 @@ def invite_user(request):
             surname=surname,
             expires_at=expires_at,
         )
-        link = f"{settings.FRONTEND_URL}/register-join?token={inv.token}"
-        send_mail(
-            "Invitation à rejoindre un cabinet sur CareHub",
-            f"Bonjour {name},\n\nVous avez été invité(e) en tant que {role}."
-            f" Cliquez ici pour accepter : {link}\n\nLien valable 2 jours.",
-            settings.DEFAULT_FROM_EMAIL,
-            [email],
-        )
+        enqueue("accounts.send_invitation", invitation_id=inv.pk, new_account=False)
         return Response({"message": "Invitation envoyée à un compte existant."}, status=201)
 
     if _already_invited(email):
@@ -361,14 +338,7 @@ def invite_user(request):
         surname=surname,
         expires_at=expires_at,
     )
-    link = f"{settings.FRONTEND_URL}/register-join?token={inv.token}"
-    send_mail(
-        "Invitation à rejoindre un cabinet sur CareHub",
-        f"Bonjour {name},\n\nVous avez été invité(e) en tant que {role}."
-        f" Cliquez ici pour finaliser votre inscription : {link}\n\nLien valable 2 jours.",
-        settings.DEFAULT_FROM_EMAIL,
-        [email],
-    )
+    enqueue("accounts.send_invitation", invitation_id=inv.pk, new_account=True)
     return Response({"message": "Invitation envoyée."}, status=201)
     
 @api_view(['GET'])
@@ -436,7 +406,7 @@ def register_join(request):
     invitation.used = True
     invitation.save(update_fields=["used"])
 
-    ensure_subscription_matches_roles(invitation.office, invitation.email)
+    enqueue("subscriptions.sync_roles", office_id=invitation.office_id, email=invitation.email)
 
     refresh = RefreshToken.for_user(user)
     return Response(
@@ -1,6 +1,30 @@
 from django.apps import AppConfig
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models.signals import post_migrate
+
+
+def prepare_agenda_table(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    Après migrate : remplit les end_date absents, puis (PostgreSQL) pose la
+    contrainte d'exclusion, qui exige une fin bornée sur chaque ligne.
+    """
+    from .models import Agenda
+    from .utils import sync_end_dates
+
+    connection = connections[using]
+    if Agenda._meta.db_table not in connection.introspection.table_names():
+        return
+    sync_end_dates(Agenda.objects.using(using).filter(end_date__isnull=True))
+    if connection.vendor != "postgresql":
+        return
+    from .constraints import install_overlap_exclusion
+    install_overlap_exclusion(using)
 
 
 class AgendaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'agenda'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        post_migrate.connect(prepare_agenda_table, sender=self)
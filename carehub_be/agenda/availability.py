@@ -0,0 +1,102 @@
+"""
+Recherche de créneaux libres.
+
+Les rendez-vous occupés de tous les praticiens demandés sont chargés en une
+requête (même prédicat de chevauchement que AgendaSerializer.validate), triés,
+puis fusionnés avec les plages de travail en un seul passage par praticien.
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+
+from .utils import appointments_in_window
+
+
+def working_windows(first_day, last_day, day_start, day_end, weekdays):
+    """
+    Plages de travail [début, fin[ (datetimes aware, fuseau courant) entre deux dates incluses.
+    """
+    tz = timezone.get_current_timezone()
+    windows = []
+    day = first_day
+    while day <= last_day:
+        if day.weekday() in weekdays:
+            windows.append((
+                datetime.combine(day, day_start, tzinfo=tz),
+                datetime.combine(day, day_end, tzinfo=tz),
+            ))
+        day += timedelta(days=1)
+    return windows
+
+
+def busy_intervals(practitioner_ids, start, end, office=None):
+    """
+    {practitioner_id: [(début, fin), ...]} trié par début, en une requête.
+    """
+    qs = (appointments_in_window(practitioner_ids, start, end, office=office)
+          .order_by("practitioner_id", "app_date")
+          .values_list("practitioner_id", "app_date", "ends_at"))
+    busy = defaultdict(list)
+    for practitioner_id, app_date, end_date in qs:
+        busy[practitioner_id].append((app_date, end_date))
+    return busy
+
+
+def _first_start(w_start, not_before, step):
+    """
+    Premier départ de la plage : w_start, ou le premier pas (w_start + k * step)
+    qui ne précède pas not_before (ex: 10:07 -> 10:30 pour des pas de 30 min depuis 08:00).
+    """
+    if not not_before or not_before <= w_start:
+        return w_start
+    steps = -(-(not_before - w_start) // step)
+    return w_start + steps * step
+
+
+def free_slots(busy, windows, duration, step=None, not_before=None):
+    """
+    Fusionne des intervalles occupés triés avec des plages de travail triées.
+
+    Chaque intervalle occupé est visité au plus une fois par plage qu'il touche :
+    le coût est linéaire en (nb plages + nb rendez-vous).
+    """
+    step = step or duration
+    slots = []
+    i = 0
+    for w_start, w_end in windows:
+        while i < len(busy) and busy[i][1] <= w_start:
+            i += 1
+
+        cursor = _first_start(w_start, not_before, step)
+        j = i
+        while j < len(busy) and busy[j][0] < w_end:
+            b_start, b_end = busy[j]
+            while cursor + duration <= min(b_start, w_end):
+                slots.append((cursor, cursor + duration))
+                cursor += step
+            cursor = max(cursor, b_end)
+            j += 1
+
+        while cursor + duration <= w_end:
+            slots.append((cursor, cursor + duration))
+            cursor += step
+    return slots
+
+
+def find_free_slots(practitioner_ids, first_day, last_day, day_start, day_end, duration_minutes,
+                 weekdays=range(5), office=None, not_before=None):
+    """
+    Créneaux libres par praticien : {practitioner_id: [(début, fin), ...]}.
+    """
+    windows = working_windows(first_day, last_day, day_start, day_end, set(weekdays))
+    if not windows:
+        return {pid: [] for pid in practitioner_ids}
+
+    busy = busy_intervals(practitioner_ids, windows[0][0], windows[-1][1], office=office)
+    duration = timedelta(minutes=duration_minutes)
+    return {
+        pid: free_slots(busy.get(pid, []), windows, duration, not_before=not_before)
+        for pid in practitioner_ids
+    }
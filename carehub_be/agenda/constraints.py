@@ -0,0 +1,62 @@
+"""
+Contrainte d'exclusion GiST (PostgreSQL uniquement, extension btree_gist) :
+la base refuse elle-même deux rendez-vous non annulés qui se chevauchent pour
+un même praticien dans un même cabinet.
+
+Elle ne figure pas dans Agenda.Meta : l'état des migrations reste identique
+quel que soit le moteur. Elle est posée après `migrate` (signal post_migrate,
+voir AgendaConfig.ready), une seule fois, avec l'extension ; sur un autre
+moteur rien n'est fait et la validation applicative reste la seule garde.
+Ce module n'est importé que sur PostgreSQL.
+"""
+
+import logging
+
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import DateTimeRangeField, RangeBoundary, RangeOperators
+from django.db import IntegrityError, connections
+from django.db.models import Func, Q
+
+from .models import OVERLAP_CONSTRAINT, Agenda
+
+log = logging.getLogger(__name__)
+
+
+class TsTzRange(Func):
+    function = "TSTZRANGE"
+    output_field = DateTimeRangeField()
+
+
+def overlap_exclusion_constraint():
+    return ExclusionConstraint(
+        name=OVERLAP_CONSTRAINT,
+        expressions=[
+            (TsTzRange("app_date", "end_date", RangeBoundary()), RangeOperators.OVERLAPS),
+            ("practitioner", RangeOperators.EQUAL),
+            ("office", RangeOperators.EQUAL),
+        ],
+        condition=~Q(status="cancelled"),
+    )
+
+
+def install_overlap_exclusion(using):
+    """
+    Crée btree_gist et la contrainte si elle n'existe pas encore. Retourne True si elle a été posée.
+    end_date doit être rempli (AgendaConfig le fait juste avant) : TSTZRANGE(app_date, NULL)
+    est non borné et chevaucherait tous les rendez-vous suivants.
+    Des chevauchements déjà en base empêchent la création : ils sont signalés, migrate n'échoue pas.
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_constraint WHERE conname = %s", [OVERLAP_CONSTRAINT])
+        if cursor.fetchone():
+            return False
+    try:
+        with connection.schema_editor(atomic=True) as editor:
+            editor.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+            editor.add_constraint(Agenda, overlap_exclusion_constraint())
+    except IntegrityError:
+        log.warning("Contrainte %s non posée : des rendez-vous se chevauchent déjà. "
+                    "Corrigez-les puis relancez migrate.", OVERLAP_CONSTRAINT)
+        return False
+    return True
@@ -0,0 +1,85 @@
+"""
+Compteurs de séances dénormalisés (par prescription et par patient/année/catégorie).
+
+Les signaux de agenda.signals appellent apply_counter_deltas dans la transaction
+de l'écriture du rendez-vous. Les écritures en masse (bulk_create/bulk_update)
+ne déclenchent pas de signaux : elles appellent count_rows / apply_counter_deltas
+elles-mêmes.
+"""
+
+from collections import Counter
+
+from django.db.models import Count, F, Value
+from django.db.models.functions import ExtractYear, Greatest
+
+from .models import Agenda, AnnualSessionCounter, PrescriptionSessionCounter
+
+
+def key_deltas(old_keys, new_keys):
+    """
+    Différence entre deux couples de clés (voir Agenda.counter_keys).
+    """
+    deltas = Counter()
+    for old, new, kind in ((old_keys[0], new_keys[0], "prescription"), (old_keys[1], new_keys[1], "annual")):
+        if old == new:
+            continue
+        if old is not None:
+            deltas[(kind, old)] -= 1
+        if new is not None:
+            deltas[(kind, new)] += 1
+    return deltas
+
+
+def count_rows(rows, sign=1):
+    """
+    Deltas correspondant à l'ajout (sign=1) ou au retrait (sign=-1) de rendez-vous.
+    """
+    deltas = Counter()
+    for agenda in rows:
+        prescription_key, annual_key = agenda.counter_keys()
+        if prescription_key is not None:
+            deltas[("prescription", prescription_key)] += sign
+        if annual_key is not None:
+            deltas[("annual", annual_key)] += sign
+    return deltas
+
+
+def _bump(model, lookup, delta):
+    updated = model.objects.filter(**lookup).update(planned=Greatest(F("planned") + delta, Value(0)))
+    if updated or delta <= 0:
+        return
+    _, created = model.objects.get_or_create(**lookup, defaults={"planned": delta})
+    if not created:
+        model.objects.filter(**lookup).update(planned=F("planned") + delta)
+
+
+def apply_counter_deltas(deltas):
+    for (kind, key), delta in deltas.items():
+        if not delta:
+            continue
+        if kind == "prescription":
+            _bump(PrescriptionSessionCounter, {"prescription_id": key}, delta)
+        else:
+            patient_id, year, category_id = key
+            _bump(AnnualSessionCounter, {"patient_id": patient_id, "year": year, "category_id": category_id}, delta)
+
+
+def expected_counts():
+    """
+    Valeurs attendues recalculées depuis Agenda (deux requêtes groupées).
+    """
+    active = Agenda.objects.exclude(status="cancelled")
+
+    prescriptions = dict(
+        active.filter(prescription__isnull=False)
+        .values("prescription_id").annotate(n=Count("id"))
+        .values_list("prescription_id", "n")
+    )
+    annual = {
+        (row["patient_id"], row["year"], row["pathology_category_id"]): row["n"]
+        for row in (active.filter(coverage_source="annual", pathology_category__isnull=False)
+                    .annotate(year=ExtractYear("app_date"))
+                    .values("patient_id", "year", "pathology_category_id")
+                    .annotate(n=Count("id")))
+    }
+    return prescriptions, annual
@@ -0,0 +1,122 @@
+"""
+Hub pub/sub local (par processus) des changements d'agenda, par cabinet.
+
+Les signaux de agenda publient après commit ; chaque connexion SSE s'abonne
+avec sa propre file asyncio. Aucun broker externe : le hub est utilisable et
+testable en mémoire. Avec plusieurs processus, chaque client reçoit les
+événements écrits par le processus qui le sert.
+"""
+
+import asyncio
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import Agenda
+
+QUEUE_SIZE = 100
+
+# Envoyé dans la transaction à chaque publication, écritures en masse comprises.
+# events : nouvel état des rendez-vous ; previous : emplacements quittés
+# (voir agenda_slot), pour les écritures qui déplacent un rendez-vous.
+agenda_changed = Signal()
+
+
+def _offer(queue, event):
+    """
+    Dépose l'événement ; si le client est trop lent, on abandonne le plus ancien.
+    """
+    if queue.full():
+        try:
+            queue.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+    queue.put_nowait(event)
+
+
+class AgendaEventHub:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    @contextmanager
+    def subscribe(self, office_id, maxsize=QUEUE_SIZE):
+        """
+        À utiliser depuis une coroutine : renvoie une asyncio.Queue alimentée
+        par publish(), désabonnée à la sortie du bloc.
+        """
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(maxsize=maxsize))
+        with self._lock:
+            self._subscribers[office_id].add(subscriber)
+        try:
+            yield subscriber[1]
+        finally:
+            with self._lock:
+                self._subscribers[office_id].discard(subscriber)
+                if not self._subscribers[office_id]:
+                    del self._subscribers[office_id]
+
+    def subscriber_count(self, office_id):
+        with self._lock:
+            return len(self._subscribers.get(office_id, ()))
+
+    def publish(self, office_id, event):
+        """
+        Utilisable depuis n'importe quel thread (vues synchrones, signaux).
+        """
+        with self._lock:
+            subscribers = list(self._subscribers.get(office_id, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, event)
+            except RuntimeError:
+                # Boucle fermée : la connexion est partie sans se désabonner.
+                with self._lock:
+                    self._subscribers[office_id].discard((loop, queue))
+
+
+hub = AgendaEventHub()
+
+
+def agenda_event(agenda, event_type):
+    return {
+        "type": event_type,
+        "id": agenda.pk,
+        "office_id": agenda.office_id,
+        "practitioner_id": agenda.practitioner_id,
+        "patient_id": agenda.patient_id,
+        "app_date": agenda.app_date,
+        "end_date": agenda.end_date,
+        "status": agenda.status,
+        "updated_at": getattr(agenda, "updated_at", None) or timezone.now(),
+    }
+
+
+def agenda_slot(agenda):
+    return {
+        "office_id": agenda.office_id,
+        "practitioner_id": agenda.practitioner_id,
+        "app_date": agenda.app_date,
+    }
+
+
+def publish_on_commit(rows, event_type, previous=()):
+    """
+    Publie un événement par rendez-vous une fois la transaction validée.
+    Sert aux signaux et aux écritures en masse qui ne déclenchent pas de signaux.
+    """
+    events = [(agenda.office_id, agenda_event(agenda, event_type)) for agenda in rows]
+    if not events:
+        return
+
+    agenda_changed.send(sender=Agenda, events=[event for _, event in events], previous=list(previous))
+
+    def _publish():
+        for office_id, event in events:
+            hub.publish(office_id, event)
+
+    transaction.on_commit(_publish)
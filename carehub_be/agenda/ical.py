@@ -0,0 +1,137 @@
+"""
+Flux iCalendar (.ics) par praticien.
+
+L'URL est signée (django.core.signing) pour que les applications de calendrier
+puissent l'interroger sans en-tête d'authentification. Le jeton porte le secret
+du praticien (User.ical_feed_key) : le renouveler révoque l'URL précédente, et
+le flux n'est servi qu'à un praticien actif dans au moins un cabinet. Le corps est produit en
+streaming sur `.iterator()` ; ETag/Last-Modified viennent du dernier updated_at
+(et de la dernière suppression) : un calendrier inchangé répond 304 sans rien sérialiser.
+"""
+
+import hashlib
+import secrets
+from datetime import timedelta, timezone as dt_timezone
+
+from django.core import signing
+from django.db.models import Count, Exists, Max, OuterRef
+from django.utils import timezone
+
+from accounts.models import User, UserOfficeRole
+from .models import Agenda, AgendaTombstone
+
+FEED_SALT = "agenda.ical-feed"
+FEED_PAST_DAYS = 90
+STATUS_MAP = {"scheduled": "CONFIRMED", "completed": "CONFIRMED", "cancelled": "CANCELLED"}
+
+
+def is_active_practitioner(user_id):
+    return UserOfficeRole.objects.filter(user_id=user_id, role="practitioner", is_active=True).exists()
+
+
+def rotate_feed_key(user):
+    """
+    Nouveau secret de flux : l'URL précédente cesse de fonctionner.
+    """
+    user.ical_feed_key = secrets.token_urlsafe(32)
+    user.save(update_fields=["ical_feed_key"])
+    return user.ical_feed_key
+
+
+def feed_token(user):
+    key = user.ical_feed_key or rotate_feed_key(user)
+    return signing.dumps({"practitioner": user.pk, "key": key}, salt=FEED_SALT)
+
+
+def practitioner_from_token(token):
+    """
+    Id du praticien si le jeton porte son secret courant et qu'il est encore
+    praticien actif (compte et rôle), sinon None. Une requête.
+    """
+    try:
+        payload = signing.loads(token, salt=FEED_SALT)
+        practitioner_id, key = payload["practitioner"], payload["key"]
+    except (signing.BadSignature, KeyError, TypeError):
+        return None
+    if not key:
+        return None
+    active_role = UserOfficeRole.objects.filter(user_id=OuterRef("pk"), role="practitioner", is_active=True)
+    found = (User.objects
+             .filter(pk=practitioner_id, ical_feed_key=key, is_active=True)
+             .filter(Exists(active_role))
+             .exists())
+    return practitioner_id if found else None
+
+
+def feed_queryset(practitioner_id):
+    since = timezone.now() - timedelta(days=FEED_PAST_DAYS)
+    return Agenda.objects.filter(practitioner_id=practitioner_id, app_date__gte=since)
+
+
+def feed_state(practitioner_id):
+    """
+    (last_modified, etag) du flux, calculés par agrégats sans charger de rendez-vous.
+    """
+    stats = feed_queryset(practitioner_id).aggregate(last=Max("updated_at"), n=Count("id"))
+    last_deleted = (AgendaTombstone.objects
+                    .filter(practitioner_id=practitioner_id)
+                    .aggregate(last=Max("deleted_at"))["last"])
+
+    candidates = [d for d in (stats["last"], last_deleted) if d]
+    last_modified = max(candidates) if candidates else None
+    raw = f"{practitioner_id}:{stats['n']}:{last_modified.isoformat() if last_modified else ''}"
+    return last_modified, hashlib.sha1(raw.encode()).hexdigest()
+
+
+def _escape(text):
+    return (text or "").replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+def _fmt(dt):
+    return dt.astimezone(dt_timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def _fold(line):
+    """
+    Coupe les lignes à 75 octets (RFC 5545 §3.1).
+    """
+    data = line.encode("utf-8")
+    if len(data) <= 75:
+        return line + "\r\n"
+    parts, chunk = [], b""
+    for char in line:
+        encoded = char.encode("utf-8")
+        if len(chunk) + len(encoded) > (75 if not parts else 74):
+            parts.append(chunk.decode("utf-8"))
+            chunk = b""
+        chunk += encoded
+    parts.append(chunk.decode("utf-8"))
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def iter_feed(practitioner_id, host):
+    yield "BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//CareHub//Agenda//FR\r\nCALSCALE:GREGORIAN\r\n"
+
+    rows = (feed_queryset(practitioner_id)
+            .order_by("app_date")
+            .values_list("id", "app_date", "end_date", "duration_minutes", "status", "updated_at",
+                         "place", "patient__name", "patient__surname"))
+    stamp = _fmt(timezone.now())
+    for pk, app_date, end_date, duration, status, updated_at, place, name, surname in rows.iterator(chunk_size=500):
+        end_date = end_date or app_date + timedelta(minutes=duration or 30)
+        lines = [
+            "BEGIN:VEVENT",
+            f"UID:agenda-{pk}@{host}",
+            f"DTSTAMP:{stamp}",
+            f"DTSTART:{_fmt(app_date)}",
+            f"DTEND:{_fmt(end_date)}",
+            f"SUMMARY:{_escape(f'{name} {surname}'.strip())}",
+            f"LOCATION:{_escape('Domicile' if place == 'home' else 'Cabinet')}",
+            f"STATUS:{STATUS_MAP.get(status, 'CONFIRMED')}",
+        ]
+        if updated_at:
+            lines.append(f"LAST-MODIFIED:{_fmt(updated_at)}")
+        lines.append("END:VEVENT")
+        yield "".join(_fold(line) for line in lines)
+
+    yield "END:VCALENDAR\r\n"
@@ -0,0 +1,30 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from agenda.models import AgendaTombstone, TOMBSTONE_RETENTION_DAYS
+
+
+class Command(BaseCommand):
+    """
+    Supprime les traces de rendez-vous supprimés plus anciennes que la fenêtre de synchronisation.
+
+    Exemple d’exécution :
+        python manage.py purge_agenda_tombstones --days 30
+    """
+
+    help = "Supprime les tombstones d'agenda plus vieilles que N jours."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=TOMBSTONE_RETENTION_DAYS,
+            help=f"Nombre de jours à conserver (par défaut: {TOMBSTONE_RETENTION_DAYS})",
+        )
+
+    def handle(self, *args, **options):
+        cutoff_date = timezone.now() - datetime.timedelta(days=options["days"])
+        count, _ = AgendaTombstone.objects.filter(deleted_at__lt=cutoff_date).delete()
+        self.stdout.write(self.style.SUCCESS(f"{count} tombstones supprimées."))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from agenda.quota import reflow_all
+
+
+class Command(BaseCommand):
+    """
+    Recalcule index de séance, dépassement du quota annuel et tarification
+    des rendez-vous d'une année, patient par patient (tâche nocturne).
+
+    Exemple d’exécution :
+        python manage.py reflow_annual_quota --year 2025 --office 3
+    """
+
+    help = "Recalcule en lot le quota annuel et la tarification des séances d'une année."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--year", type=int, default=None, help="Année civile (par défaut : année en cours)")
+        parser.add_argument("--office", type=int, default=None, help="Limiter aux patients ayant une séance dans ce cabinet")
+
+    def handle(self, *args, **options):
+        year = options["year"] or timezone.localdate().year
+        patients, changed = reflow_all(year, office=options["office"])
+        self.stdout.write(self.style.SUCCESS(
+            f"{patients} patients parcourus, {changed} rendez-vous mis à jour pour {year}."
+        ))
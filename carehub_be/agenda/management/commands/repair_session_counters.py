@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from agenda.counters import expected_counts
+from agenda.models import AnnualSessionCounter, PrescriptionSessionCounter
+
+
+class Command(BaseCommand):
+    """
+    Recalcule les compteurs de séances depuis Agenda et corrige les écarts.
+
+    Exemple d’exécution :
+        python manage.py repair_session_counters --dry-run
+    """
+
+    help = "Vérifie et répare les compteurs de séances (prescription, patient/année/catégorie)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Affiche les écarts sans les corriger")
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        expected_prescriptions, expected_annual = expected_counts()
+
+        current_prescriptions = {c.prescription_id: c for c in PrescriptionSessionCounter.objects.select_for_update()}
+        current_annual = {(c.patient_id, c.year, c.category_id): c for c in AnnualSessionCounter.objects.select_for_update()}
+
+        fixed = 0
+        fixed += self._reconcile(
+            PrescriptionSessionCounter, current_prescriptions, expected_prescriptions,
+            lambda key: {"prescription_id": key}, dry_run,
+        )
+        fixed += self._reconcile(
+            AnnualSessionCounter, current_annual, expected_annual,
+            lambda key: {"patient_id": key[0], "year": key[1], "category_id": key[2]}, dry_run,
+        )
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING(f"{fixed} compteurs incohérents (aucune modification)."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{fixed} compteurs corrigés."))
+
+    def _reconcile(self, model, current, expected, lookup, dry_run):
+        to_create, to_update = [], []
+        for key, planned in expected.items():
+            counter = current.get(key)
+            if counter is None:
+                to_create.append(model(planned=planned, **lookup(key)))
+            elif counter.planned != planned:
+                counter.planned = planned
+                to_update.append(counter)
+
+        stale = [c for key, c in current.items() if key not in expected and c.planned != 0]
+        for counter in stale:
+            counter.planned = 0
+        to_update.extend(stale)
+
+        for row in to_create + to_update:
+            self.stdout.write(f"- {model.__name__} {row}")
+
+        if not dry_run:
+            model.objects.bulk_create(to_create, batch_size=500)
+            model.objects.bulk_update(to_update, ["planned"], batch_size=500)
+        return len(to_create) + len(to_update)
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from agenda.events import publish_on_commit
+from agenda.models import Agenda
+from agenda.pricing import year_bounds, price_appointments
+
+
+class Command(BaseCommand):
+    """
+    Recalcule la tarification de tous les rendez-vous d'une année (ex: après un import de tarifs),
+    chacun avec son propre statut BIM.
+
+    Exemple d’exécution :
+        python manage.py reprice_agenda --year 2025 --office 3
+    """
+
+    help = "Recalcule en lot la tarification des rendez-vous d'une année."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--year", type=int, required=True, help="Année civile à retarifer")
+        parser.add_argument("--office", type=int, default=None, help="Limiter à un cabinet")
+        parser.add_argument("--include-cancelled", action="store_true", help="Retarifer aussi les rendez-vous annulés")
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        start, end = year_bounds(options["year"])
+        qs = Agenda.objects.filter(app_date__gte=start, app_date__lt=end)
+        if options["office"]:
+            qs = qs.filter(office_id=options["office"])
+        if not options["include_cancelled"]:
+            qs = qs.exclude(status="cancelled")
+
+        rows = list(qs)
+        priced, missing = price_appointments(rows)
+        publish_on_commit(priced, "updated")
+
+        unknown = sum(1 for a in rows if a.is_bim is None)
+        if unknown:
+            self.stdout.write(self.style.WARNING(f"{unknown} rendez-vous au statut BIM inconnu : montants conservés."))
+
+        if missing:
+            self.stdout.write(self.style.WARNING(f"{len(missing)} rendez-vous sans tarif (données INAMI manquantes ?)."))
+        self.stdout.write(self.style.SUCCESS(f"{len(priced)} rendez-vous retarifés pour {options['year']}."))
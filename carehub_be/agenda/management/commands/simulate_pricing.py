@@ -0,0 +1,53 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from agenda.simulation import simulate_pricing, simulation_window
+from billing.models import PathologyCategory
+from billing.tariffs import tariff_index
+
+
+class Command(BaseCommand):
+    """
+    Retarife en mémoire une fenêtre passée avec la grille d'une autre année et
+    affiche l'écart par catégorie et par praticien. Chaque séance garde son statut
+    BIM ; celles au statut inconnu sont reconduites (colonne « BIM ? »). Aucune écriture.
+
+    Exemple d’exécution :
+        python manage.py simulate_pricing --tariff-year 2026 --start 2025-01-01 --end 2026-01-01 --office 3
+    """
+
+    help = "Simule l'impact d'une grille de tarifs sur les rendez-vous d'une période."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tariff-year", type=int, required=True, help="Année de la grille candidate")
+        parser.add_argument("--start", type=date.fromisoformat, required=True, help="Premier jour (YYYY-MM-DD)")
+        parser.add_argument("--end", type=date.fromisoformat, required=True, help="Jour de fin exclu (YYYY-MM-DD)")
+        parser.add_argument("--office", default=None, help="Limiter à un cabinet")
+
+    def _line(self, label, values):
+        self.stdout.write(
+            f"{label:<24} {values['count']:>7} {values['honoraires_current']:>12} "
+            f"{values['honoraires_simulated']:>12} {values['honoraires_delta']:>+11} {values['missing']:>7} "
+            f"{values['unknown_bim']:>7}"
+        )
+
+    def handle(self, *args, **options):
+        year = options["tariff_year"]
+        version = tariff_index.version_for_year(year)
+        if version is None:
+            raise CommandError(f"Aucune grille importée pour {year}.")
+
+        qs = simulation_window(options["start"], options["end"], office=options["office"])
+        result = simulate_pricing(qs, version)
+
+        header = f"{'':<24} {'séances':>7} {'actuel':>12} {'simulé':>12} {'delta':>11} {'sans tarif':>7} {'BIM ?':>7}"
+        codes = dict(PathologyCategory.objects.values_list("id", "code"))
+
+        self.stdout.write(f"Grille {year} (version {version}) appliquée du {options['start']} au {options['end']} :")
+        self.stdout.write(header)
+        for category_id, values in sorted(result["by_category"].items(), key=lambda kv: codes.get(kv[0]) or ""):
+            self._line(f"catégorie {codes.get(category_id, '-')}", values)
+        for practitioner_id, values in sorted(result["by_practitioner"].items()):
+            self._line(f"praticien {practitioner_id}", values)
+        self._line("total", result["total"])
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from agenda.utils import sync_end_dates
+
+
+class Command(BaseCommand):
+    """
+    Renseigne Agenda.end_date (app_date + durée) pour les rendez-vous existants.
+    `migrate` remplit déjà les valeurs absentes (voir AgendaConfig) ; à lancer avant
+    la migration qui rend le champ obligatoire sur une base existante, ou si des
+    données sont importées hors ORM.
+    """
+
+    help = "Recalcule end_date pour les rendez-vous dont la valeur est absente ou incohérente."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        updated = sync_end_dates(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"{updated} rendez-vous mis à jour."))
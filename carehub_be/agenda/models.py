@@ -1,14 +1,26 @@
+from datetime import timedelta
 from django.utils import timezone
 from decimal import Decimal
-from django.conf import settings
 from django.db import models
 from accounts.models import User
 from patients.models import Patient
 from offices.models import Office
-from billing.models import PathologyCategory, PathologyDetail
+from billing.models import PathologyCategory, PathologyDetail, TariffVersion
+from billing.pricing import price_for
 from prescriptions.models import Prescription
 from prescriptions.utils import get_session_number
 
+DEFAULT_DURATION_MINUTES = 30
+# Au-delà, un curseur de synchronisation est trop ancien : le client recharge tout.
+TOMBSTONE_RETENTION_DAYS = 30
+# Durée maximale d'un rendez-vous : borne la fenêtre de recherche des chevauchements.
+MAX_DURATION_MINUTES = 8 * 60
+# Séances annuelles remboursées par patient, année et catégorie.
+ANNUAL_QUOTA = 18
+# Contrainte d'exclusion des chevauchements (PostgreSQL, voir agenda.constraints).
+OVERLAP_CONSTRAINT = "agenda_no_practitioner_overlap"
+
+
 class Agenda(models.Model):
     STATUS_CHOICES = [
         ('scheduled', 'Scheduled'),
@@ -35,6 +47,9 @@ class Agenda(models.Model):
     )
 
     app_date = models.DateTimeField()
+    end_date = models.DateTimeField(blank=True, editable=False,
+        help_text="app_date + duration_minutes, maintenu à l'enregistrement (rempli par migrate pour l'existant)."
+    )
     reason = models.TextField(blank=True, null=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='scheduled')
     payment_mode = models.CharField(
@@ -49,35 +64,67 @@ class Agenda(models.Model):
     honoraires_total = models.DecimalField(max_digits=8, decimal_places=2, blank=True, null=True)
     remboursement = models.DecimalField(max_digits=8, decimal_places=2, blank=True, null=True)
     tiers_payant = models.DecimalField(max_digits=8, decimal_places=2, blank=True, null=True)
+    tariff_version = models.ForeignKey(
+        TariffVersion, on_delete=models.PROTECT, null=True, blank=True, related_name="appointments",
+        help_text="Version de tarifs appliquée au montant enregistré (vide : grille sans version).",
+    )
+    is_bim = models.BooleanField(null=True, blank=True,
+        help_text="Statut BIM appliqué au montant enregistré (vide : inconnu, montants conservés au recalcul).",
+    )
 
     duration_minutes = models.PositiveSmallIntegerField(default=30)
     session_index = models.PositiveSmallIntegerField(null=True, blank=True)
     coverage_source = models.CharField(max_length=20, choices=COVERAGE_CHOICES, default='prescription')
     is_over_annual = models.BooleanField(default=False)
 
+    updated_at = models.DateTimeField(auto_now=True)
+
     
     def __str__(self):
         return f"RDV {self.app_date} - {self.patient} avec {self.practitioner}"
+
+    def compute_end_date(self):
+        return self.app_date + timedelta(minutes=self.duration_minutes or DEFAULT_DURATION_MINUTES)
+
+    def save(self, *args, **kwargs):
+        if self.app_date:
+            self.end_date = self.compute_end_date()
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None and {"app_date", "duration_minutes"} & set(update_fields):
+                kwargs["update_fields"] = {*update_fields, "end_date"}
+        super().save(*args, **kwargs)
     
+    def counter_keys(self):
+        """
+        Clés des compteurs de séances auxquelles ce rendez-vous contribue :
+        (prescription_id | None, (patient_id, année, category_id) | None).
+        Un rendez-vous annulé ne compte nulle part.
+        """
+        if self.status == "cancelled" or not self.app_date:
+            return None, None
+        annual_key = None
+        if self.coverage_source == "annual" and self.pathology_category_id:
+            annual_key = (self.patient_id, timezone.localtime(self.app_date).year, self.pathology_category_id)
+        return self.prescription_id, annual_key
+
     def _compute_session_index(self):
         """
         Numéro de séance “consommé” :
         - si couverture prescription : index au sein de la prescription
         - si annuel : index au sein de l'année civile (pour la catégorie choisie)
         On fige l'index en base (session_index) côté prescription ; pour l'annuel,
-        on peut le recalculer à la volée si non stocké.
+        on le lit dans le compteur annuel (une ligne).
         """
         if self.coverage_source == "prescription" and self.session_index:
             return self.session_index
 
+        category_id = self.pathology_category_id or getattr(self.prescription, "pathology_category_id", None)
         year = timezone.localtime(self.app_date).year
-        qs = Agenda.objects.filter(
-            patient=self.patient,
-            coverage_source="annual",
-            app_date__year=year
-        ).exclude(status="cancelled").order_by("app_date")
+        planned = AnnualSessionCounter.planned_for(self.patient_id, year, category_id)
 
-        return qs.count() + 1
+        _, annual_key = self.counter_keys()
+        already_counted = self.pk is not None and annual_key is not None
+        return planned if already_counted else planned + 1
     
     def calculate_pricing(self, is_bim: bool):
         """
@@ -89,37 +136,13 @@ class Agenda(models.Model):
         if not self.place:
             self.place = "home"
 
-        year = timezone.localtime(self.app_date).year
         category = getattr(self.prescription, "pathology_category", None) or getattr(self, "pathology_category", None)
         if not category:
             return None
 
         session_idx = self._compute_session_index()
-
-        tariff = (PathologyDetail.objects
-            .filter(year=year, category=category, place=self.place, session_min__lte=session_idx)
-            .filter(models.Q(session_max__isnull=True) | models.Q(session_max__gte=session_idx))
-            .first())
-
-        if not tariff:
-            return None
-
-        is_first = (session_idx == 1)
-        honoraires_total = (tariff.hon_presta or 0) + (tariff.hon_depla or 0) + ((tariff.hon_dossier or 0) if is_first else 0)
-
-        remb = tariff.reimb_bim if is_bim else tariff.reimb_not_bim
-        tm = tariff.tm_bim   if is_bim else tariff.tm_not_bim
-
-        if self.coverage_source == "annual" and self.is_over_annual:
-            remb = 0
-            tm = honoraires_total
-        return {
-            "code_prestation": tariff.code_presta,
-            "code_dossier": tariff.code_dossier if is_first else None,
-            "honoraires_total": honoraires_total,
-            "remboursement": remb,
-            "tiers_payant": 0 if (self.coverage_source == "annual" and self.is_over_annual) else tm,
-        }
+        over_quota = self.coverage_source == "annual" and self.is_over_annual
+        return price_for(timezone.localdate(self.app_date), category, self.place, session_idx, is_bim, over_quota)
 
     
     def finalize_and_create_invoice(self, practitioner, due_date):
@@ -147,5 +170,77 @@ class Agenda(models.Model):
             models.Index(fields=['prescription', 'app_date']),
             models.Index(fields=['status']),
             models.Index(fields=['coverage_source', 'app_date']),
+            models.Index(fields=['office', 'updated_at']),
+            models.Index(fields=['office', 'app_date', 'id']),
+        ]
+        unique_together = []
+        # Contrainte d'exclusion des chevauchements : posée en base par
+        # agenda.constraints.install_overlap_exclusion (PostgreSQL, après migrate).
+
+
+class AgendaTombstone(models.Model):
+    """
+    Trace d'un rendez-vous supprimé, pour la synchronisation incrémentale du calendrier.
+    Purgée après TOMBSTONE_RETENTION_DAYS (`manage.py purge_agenda_tombstones`).
+    """
+    agenda_id = models.BigIntegerField()
+    # Identifiants nus : la trace survit au rendez-vous, y compris quand il est
+    # supprimé en cascade avec son cabinet.
+    office_id = models.BigIntegerField()
+    practitioner_id = models.BigIntegerField(null=True, blank=True)
+    app_date = models.DateTimeField(null=True, blank=True)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['office_id', 'deleted_at']),
         ]
-        unique_together = []
\ No newline at end of file
+
+    def __str__(self):
+        return f"RDV {self.agenda_id} supprimé le {self.deleted_at}"
+
+
+class PrescriptionSessionCounter(models.Model):
+    """
+    Nombre de rendez-vous non annulés par prescription.
+    Tenu à jour par les signaux de agenda (création, annulation, suppression) ;
+    réparable avec `manage.py repair_session_counters`.
+    """
+    prescription = models.OneToOneField(Prescription, on_delete=models.CASCADE, primary_key=True, related_name="session_counter")
+    planned = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.prescription_id}: {self.planned}"
+
+    @classmethod
+    def planned_for(cls, prescription_id):
+        if not prescription_id:
+            return 0
+        return cls.objects.filter(prescription_id=prescription_id).values_list("planned", flat=True).first() or 0
+
+
+class AnnualSessionCounter(models.Model):
+    """
+    Nombre de séances annuelles (hors prescription) non annulées par patient, année civile et catégorie.
+    """
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name="annual_session_counters")
+    year = models.PositiveSmallIntegerField()
+    category = models.ForeignKey(PathologyCategory, on_delete=models.CASCADE)
+    planned = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["patient", "year", "category"], name="uniq_annual_counter_per_patient_year_category"),
+        ]
+
+    def __str__(self):
+        return f"{self.patient_id} {self.year} {self.category_id}: {self.planned}"
+
+    @classmethod
+    def planned_for(cls, patient_id, year, category_id):
+        if not category_id:
+            return 0
+        return (cls.objects
+                .filter(patient_id=patient_id, year=year, category_id=category_id)
+                .values_list("planned", flat=True).first()) or 0
+
@@ -0,0 +1,101 @@
+"""
+Déplacement en masse des rendez-vous d'un praticien (maladie, congé imprévu).
+
+Les rendez-vous de la fenêtre sont décalés vers un autre jour et/ou réattribués
+à un autre praticien : contrôle des conflits sur le calendrier cible en une
+requête, écriture par bulk_update. Si l'année change, le quota annuel est
+recalculé (reflow) pour l'année quittée et l'année d'arrivée de chaque patient.
+"""
+
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .counters import apply_counter_deltas, key_deltas
+from .events import agenda_slot, publish_on_commit
+from .models import Agenda
+from .quota import REFLOW_FIELDS, reflow
+from .series import find_conflicts
+
+MOVE_FIELDS = ["app_date", "end_date", "practitioner", "updated_at"]
+
+
+class MoveConflict(Exception):
+    def __init__(self, conflicts):
+        super().__init__("Conflits sur le calendrier cible.")
+        self.conflicts = conflicts
+
+
+def _shift(app_date, days):
+    local = timezone.localtime(app_date)
+    return datetime.combine(local.date() + timedelta(days=days), local.time(), tzinfo=local.tzinfo)
+
+
+def move_appointments(office, practitioner, start, end, target_date=None, target_practitioner=None,
+                      dry_run=False):
+    """
+    Déplace les rendez-vous planifiés de `practitioner` dans [start, end[.
+
+    - target_date : nouveau jour du premier jour de la fenêtre (les heures sont conservées)
+    - target_practitioner : nouveau praticien
+    Les séances qui changent d'année sont renumérotées et retarifées (reflow des deux années).
+    Lève MoveConflict si le calendrier cible est occupé. Retourne la liste déplacée.
+    """
+    target_practitioner = target_practitioner or practitioner
+    days = (target_date - timezone.localtime(start).date()).days if target_date else 0
+
+    with transaction.atomic():
+        rows = list(Agenda.objects
+                    .select_for_update()
+                    .filter(office=office, practitioner=practitioner, status="scheduled",
+                            app_date__gte=start, app_date__lt=end)
+                    .order_by("app_date"))
+        if not rows:
+            return []
+
+        old_keys = {a.pk: a.counter_keys() for a in rows}
+        old_years = {a.pk: timezone.localtime(a.app_date).year for a in rows}
+        old_slots = [agenda_slot(a) for a in rows]
+        for a in rows:
+            if days:
+                a.app_date = _shift(a.app_date, days)
+            a.end_date = a.compute_end_date()
+            a.practitioner = target_practitioner
+
+        conflicts = find_conflicts(
+            target_practitioner, [(a.app_date, a.end_date) for a in rows],
+            office=office, exclude_ids=[a.pk for a in rows],
+        )
+        if conflicts:
+            raise MoveConflict(conflicts)
+        if dry_run:
+            transaction.set_rollback(True)
+            return rows
+
+        now = timezone.now()
+        for a in rows:
+            a.updated_at = now
+        Agenda.objects.bulk_update(rows, MOVE_FIELDS, batch_size=500)
+
+        deltas = Counter()
+        for a in rows:
+            deltas.update(key_deltas(old_keys[a.pk], a.counter_keys()))
+        apply_counter_deltas(deltas)
+
+        reflow_years = defaultdict(set)
+        for a in rows:
+            year = timezone.localtime(a.app_date).year
+            if year != old_years[a.pk]:
+                reflow_years[old_years[a.pk]].add(a.patient_id)
+                reflow_years[year].add(a.patient_id)
+        moved = {a.pk: a for a in rows}
+        for year, patient_ids in sorted(reflow_years.items()):
+            for updated in reflow(year, patient_ids=sorted(patient_ids), silent_ids=moved):
+                if updated.pk in moved:
+                    for field in REFLOW_FIELDS:
+                        setattr(moved[updated.pk], field, getattr(updated, field))
+
+        publish_on_commit(rows, "updated", previous=old_slots)
+    return rows
@@ -0,0 +1,137 @@
+"""
+Tarification en lot des rendez-vous.
+
+Équivalent de Agenda.calculate_pricing pour N rendez-vous à la fois :
+- une requête pour les catégories des prescriptions concernées,
+- une requête pour situer chaque séance annuelle dans son année (patient, année, catégorie),
+- les tarifs viennent de la table en mémoire (billing.pricing.price_for),
+- une seule écriture bulk_update.
+"""
+
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime
+
+from django.utils import timezone
+
+from billing.pricing import price_for
+from prescriptions.models import Prescription
+from .models import Agenda
+
+PRICING_FIELDS = ["code_prestation", "code_dossier", "honoraires_total", "remboursement", "tiers_payant", "tariff_version"]
+
+
+def _local_year(dt):
+    return timezone.localtime(dt).year
+
+
+def year_bounds(year):
+    tz = timezone.get_current_timezone()
+    return datetime(year, 1, 1, tzinfo=tz), datetime(year + 1, 1, 1, tzinfo=tz)
+
+
+def _prescription_categories(rows):
+    ids = {a.prescription_id for a in rows if a.prescription_id}
+    if not ids:
+        return {}
+    return dict(Prescription.objects.filter(id__in=ids).values_list("id", "pathology_category_id"))
+
+
+def _annual_key(agenda):
+    return agenda.patient_id, _local_year(agenda.app_date), agenda.pathology_category_id
+
+
+def _annual_timelines(rows):
+    """
+    Séances annuelles non annulées des patients concernés, triées par date et
+    regroupées comme le quota, par (patient, année, catégorie) :
+    {(patient_id, year, category_id): [(app_date, id), ...]}.
+    """
+    keys = {_annual_key(a) for a in rows if a.coverage_source == "annual"}
+    if not keys:
+        return {}
+
+    years = [y for _, y, _ in keys]
+    start, _ = year_bounds(min(years))
+    _, end = year_bounds(max(years))
+    qs = (Agenda.objects
+          .filter(patient_id__in={p for p, _, _ in keys}, coverage_source="annual",
+                  app_date__gte=start, app_date__lt=end)
+          .exclude(status="cancelled")
+          .order_by("app_date", "id")
+          .values_list("patient_id", "pathology_category_id", "app_date", "id"))
+
+    timelines = defaultdict(list)
+    for patient_id, category_id, app_date, pk in qs:
+        key = (patient_id, _local_year(app_date), category_id)
+        if key in keys:
+            timelines[key].append((app_date, pk))
+    return timelines
+
+
+def session_indexes(rows):
+    """
+    Numéro de séance de chaque rendez-vous, {id(agenda): index}.
+    - prescription : session_index figé en base
+    - annuel : rang dans l'année civile du patient pour la catégorie (séances non annulées)
+    """
+    timelines = _annual_timelines(rows)
+    indexes = {}
+    for a in rows:
+        if a.coverage_source == "prescription" and a.session_index:
+            indexes[id(a)] = a.session_index
+            continue
+        timeline = timelines.get(_annual_key(a), [])
+        indexes[id(a)] = bisect_left(timeline, (a.app_date, a.pk or 0)) + 1
+    return indexes
+
+
+def price_appointments(appointments, is_bim=None, save: bool = True, indexes=None, tariff_version=None):
+    """
+    Tarifie une liste (ou un queryset) de rendez-vous.
+
+    Les champs de tarification sont posés sur les instances ; si save=True ils
+    sont écrits avec un seul bulk_update. `indexes` permet de fournir des numéros
+    de séance déjà calculés ({id(agenda): index}). `tariff_version` impose une
+    version de tarifs au lieu de celle en vigueur à la date du rendez-vous (simulation).
+
+    Chaque rendez-vous est tarifé avec son propre statut BIM (Agenda.is_bim) ;
+    `is_bim` l'impose à tous. Un rendez-vous au statut inconnu (is_bim vide)
+    n'est pas retarifé : ses montants restent tels quels.
+
+    Retourne (priced, missing) : les rendez-vous tarifés et ceux sans tarif.
+    """
+    rows = list(appointments)
+    if not rows:
+        return [], []
+
+    categories = _prescription_categories(rows)
+    if indexes is None:
+        indexes = session_indexes(rows)
+
+    priced, missing = [], []
+    for a in rows:
+        bim = a.is_bim if is_bim is None else is_bim
+        if bim is None:
+            continue
+        if not a.place:
+            a.place = "home"
+        category_id = categories.get(a.prescription_id) or a.pathology_category_id
+        session_idx = indexes.get(id(a))
+        over_quota = a.coverage_source == "annual" and a.is_over_annual
+        day = timezone.localdate(a.app_date)
+        pricing = price_for(day, category_id, a.place, session_idx, bim, over_quota, version=tariff_version) if category_id else None
+        if not pricing:
+            missing.append(a)
+            continue
+
+        for field, value in pricing.items():
+            setattr(a, field, value)
+        priced.append(a)
+
+    if save and priced:
+        now = timezone.now()
+        for a in priced:
+            a.updated_at = now
+        Agenda.objects.bulk_update(priced, PRICING_FIELDS + ["updated_at"], batch_size=500)
+    return priced, missing
@@ -0,0 +1,121 @@
+"""
+Recalcul (reflow) du quota annuel d'un patient.
+
+Le drapeau is_over_annual, l'index de séance et la tarification sont posés à
+l'écriture d'après un comptage à cet instant : l'annulation d'une séance
+antérieure ne corrige pas les suivantes. Le reflow reparcourt les séances
+non annulées dans l'ordre chronologique, recalcule ces valeurs en une passe
+et n'écrit que les lignes qui ont changé (un seul bulk_update).
+
+- séances annuelles : rang par (patient, année, catégorie) -> is_over_annual et tarif
+- séances sous prescription : rang dans la prescription -> session_index et tarif
+
+Chaque séance est retarifée avec son propre statut BIM ; une séance au statut
+inconnu garde ses montants, seuls son index et son dépassement sont recalculés.
+"""
+
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from .events import publish_on_commit
+from .models import ANNUAL_QUOTA, Agenda
+from .pricing import PRICING_FIELDS, price_appointments, year_bounds
+
+REFLOW_FIELDS = ["session_index", "is_over_annual"] + PRICING_FIELDS
+PATIENT_CHUNK = 500
+
+
+def _snapshot(agenda):
+    return tuple(getattr(agenda, field) for field in REFLOW_FIELDS)
+
+
+def _load(year, patient_ids=None):
+    """
+    Séances annuelles de l'année et séances des prescriptions actives cette
+    année-là (toutes années confondues, l'index de prescription est global).
+    """
+    start, end = year_bounds(year)
+    active = Agenda.objects.exclude(status="cancelled")
+    in_year = active.filter(app_date__gte=start, app_date__lt=end)
+    if patient_ids is not None:
+        in_year = in_year.filter(patient_id__in=patient_ids)
+
+    annual = list(in_year.filter(coverage_source="annual").order_by("app_date", "id"))
+    prescription_ids = (in_year.filter(coverage_source="prescription", prescription__isnull=False)
+                        .values("prescription_id"))
+    prescribed = list(active.filter(coverage_source="prescription", prescription_id__in=prescription_ids)
+                      .order_by("app_date", "id"))
+    return annual, prescribed
+
+
+def _plan(annual, prescribed):
+    """
+    Pose les nouvelles valeurs sur les instances et retourne les index de tarification.
+    """
+    indexes = {}
+    ranks = defaultdict(int)
+    for a in annual:
+        key = (a.patient_id, timezone.localtime(a.app_date).year, a.pathology_category_id)
+        ranks[key] += 1
+        a.session_index = None
+        a.is_over_annual = ranks[key] > ANNUAL_QUOTA
+        indexes[id(a)] = ranks[key]
+
+    ranks = defaultdict(int)
+    for a in prescribed:
+        ranks[a.prescription_id] += 1
+        a.session_index = ranks[a.prescription_id]
+        indexes[id(a)] = a.session_index
+    return indexes
+
+
+def reflow(year, patient_ids=None, silent_ids=()):
+    """
+    Recalcule les séances de `year` pour les patients donnés (tous si None),
+    tous cabinets confondus : le quota annuel est propre au patient.
+    Retourne la liste des rendez-vous modifiés. Aucun événement n'est publié
+    pour `silent_ids` (rendez-vous dont l'appelant publie déjà la modification).
+    """
+    annual, prescribed = _load(year, patient_ids)
+    rows = annual + prescribed
+    if not rows:
+        return []
+
+    before = {id(a): _snapshot(a) for a in rows}
+    indexes = _plan(annual, prescribed)
+    price_appointments(rows, save=False, indexes=indexes)
+
+    changed = [a for a in rows if _snapshot(a) != before[id(a)]]
+    if changed:
+        now = timezone.now()
+        for a in changed:
+            a.updated_at = now
+        with transaction.atomic():
+            Agenda.objects.bulk_update(changed, REFLOW_FIELDS + ["updated_at"], batch_size=500)
+            publish_on_commit([a for a in changed if a.pk not in silent_ids], "updated")
+    return changed
+
+
+def reflow_patient_year(patient_id, year):
+    return reflow(year, patient_ids=[patient_id])
+
+
+def reflow_all(year, office=None, chunk=PATIENT_CHUNK):
+    """
+    Reflow nocturne : tous les patients ayant une séance dans l'année,
+    par paquets pour borner la mémoire. Retourne (patients, lignes modifiées).
+    `office` choisit seulement les patients (séance dans ce cabinet) ; leurs
+    séances des autres cabinets comptent toujours dans le quota.
+    """
+    start, end = year_bounds(year)
+    qs = Agenda.objects.filter(app_date__gte=start, app_date__lt=end).exclude(status="cancelled")
+    if office is not None:
+        qs = qs.filter(office=office)
+    patient_ids = sorted(set(qs.values_list("patient_id", flat=True)))
+
+    changed = 0
+    for i in range(0, len(patient_ids), chunk):
+        changed += len(reflow(year, patient_ids=patient_ids[i:i + chunk]))
+    return len(patient_ids), changed
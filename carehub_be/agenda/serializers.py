@@ -1,21 +1,60 @@
-from datetime import timedelta
+from datetime import time, timedelta
+from django.db import IntegrityError, transaction
 from django.utils import timezone
 from rest_framework import serializers
-from .models import Agenda
+from accounts.models import User, UserOfficeRole
+from billing.models import PathologyCategory
+from billing.tariffs import tariff_index
+from patients.models import Patient
+from prescriptions.models import Prescription
+from .counters import apply_counter_deltas, count_rows
+from .events import publish_on_commit
+from .models import (
+    Agenda, AnnualSessionCounter, PrescriptionSessionCounter,
+    ANNUAL_QUOTA, DEFAULT_DURATION_MINUTES, MAX_DURATION_MINUTES, OVERLAP_CONSTRAINT,
+)
+from .pricing import price_appointments
+from .series import MAX_SERIES_SESSIONS, expand_weekly, find_conflicts
+from .utils import overlapping_appointments
 
-ANNUAL_QUOTA = 18
+OVERLAP_ERROR = "Chevauchement de rendez-vous pour ce praticien."
 
 def _count_prescription_planned(prescription):
-    return Agenda.objects.filter(prescription=prescription).exclude(status='cancelled').count()
+    return PrescriptionSessionCounter.planned_for(prescription.pk if prescription else None)
 
-def _count_annual_planned(patient, year):
-    return (Agenda.objects
-            .filter(patient=patient, coverage_source='annual', app_date__year=year)
-            .exclude(status='cancelled')
-            .count())
+def _count_annual_planned(patient, year, category):
+    return AnnualSessionCounter.planned_for(patient.pk, year, getattr(category, 'pk', category))
+
+def _quota_category(prescription, pathology_category):
+    return prescription.pathology_category_id if prescription else getattr(pathology_category, 'pk', None)
+
+CALENDAR_FIELDS = (
+    'id', 'app_date', 'end_date', 'duration_minutes', 'status', 'place', 'coverage_source',
+    'payment_mode', 'patient_id', 'practitioner_id', 'prescription_id', 'pathology_category_id', 'updated_at',
+)
+
+def calendar_values(queryset):
+    return queryset.values(
+        *CALENDAR_FIELDS,
+        'patient__name', 'patient__surname', 'practitioner__name', 'practitioner__surname',
+    )
+
+def calendar_row(row):
+    row['patient_display'] = f"{row.pop('patient__name')} {row.pop('patient__surname')}".strip()
+    row['practitioner_display'] = f"{row.pop('practitioner__name')} {row.pop('practitioner__surname')}"
+    return row
+
+def calendar_rows(queryset):
+    """
+    Projection en lecture seule pour les cellules du calendrier.
+
+    Une requête `.values()` avec les noms patient/praticien joints, sans instance de
+    modèle ni introspection des champs DRF : chaque ligne est déjà un dict prêt à rendre.
+    """
+    return [calendar_row(row) for row in calendar_values(queryset)]
 
 class AgendaSerializer(serializers.ModelSerializer):
-    duration_minutes = serializers.IntegerField(required=False)
+    duration_minutes = serializers.IntegerField(required=False, min_value=1, max_value=MAX_DURATION_MINUTES)
 
     class Meta:
         model = Agenda
@@ -27,7 +66,7 @@ class AgendaSerializer(serializers.ModelSerializer):
 
         app_date = attrs.get('app_date') or (instance.app_date if instance else None)
         practitioner = attrs.get('practitioner') or (instance.practitioner if instance else None)
-        office = attrs.get('office') or (instance.office if instance else None)
+        office = attrs.get('office') or (instance.office if instance else None) or self.context.get('office')
         patient = attrs.get('patient') or (instance.patient if instance else None)
         pres = attrs.get('prescription') if 'prescription' in attrs else (instance.prescription if instance else None)
 
@@ -51,37 +90,34 @@ class AgendaSerializer(serializers.ModelSerializer):
         if not changing_time_or_owner:
             return attrs
 
-        duration = attrs.get('duration_minutes') or (instance.duration_minutes if instance else 30)
+        duration = attrs.get('duration_minutes') or (instance.duration_minutes if instance else DEFAULT_DURATION_MINUTES)
         start_dt = app_date
         end_dt   = app_date + timedelta(minutes=duration)
 
-        qs = Agenda.objects.filter(practitioner=practitioner, office=office).exclude(status='cancelled')
-        if instance:
-            qs = qs.exclude(pk=instance.pk)
-
-        qs = qs.filter(app_date__date=start_dt.date())
-
-        for other in qs:
-            o_start = other.app_date
-            o_end   = other.app_date + timedelta(minutes=other.duration_minutes or 30)
-            if (o_start < end_dt) and (o_end > start_dt):
-                raise serializers.ValidationError("Chevauchement de rendez-vous pour ce praticien.")
+        conflicts = overlapping_appointments(
+            practitioner, start_dt, end_dt, office=office,
+            exclude_pk=instance.pk if instance else None,
+        )
+        if conflicts.exists():
+            raise serializers.ValidationError(OVERLAP_ERROR)
 
         return attrs
 
     def _compute_session_index(self, pres):
         return _count_prescription_planned(pres) + 1 if pres else None
 
-    def _compute_is_over_annual(self, patient, app_date, coverage_source):
+    def _compute_is_over_annual(self, patient, app_date, coverage_source, category):
         year = timezone.localtime(app_date).year
-        count = _count_annual_planned(patient, year)
+        count = _count_annual_planned(patient, year, category)
         if coverage_source == 'annual':
             count += 1
         return count > ANNUAL_QUOTA
 
     def _apply_pricing(self, agenda, request):
-        is_bim = bool(request and request.data.get('is_bim', False))
-        pricing = agenda.calculate_pricing(is_bim=is_bim)
+        # Statut BIM de la requête (champ du modèle) ou, à défaut, celui déjà enregistré.
+        if agenda.is_bim is None:
+            agenda.is_bim = False
+        pricing = agenda.calculate_pricing(is_bim=agenda.is_bim)
         if not pricing:
             raise serializers.ValidationError("Tarification indisponible (données INAMI manquantes ?).")
         agenda.code_prestation = pricing.get("code_prestation")
@@ -89,9 +125,15 @@ class AgendaSerializer(serializers.ModelSerializer):
         agenda.honoraires_total = pricing.get("honoraires_total")
         agenda.remboursement = pricing.get("remboursement")
         agenda.tiers_payant = pricing.get("tiers_payant")
-        agenda.save(update_fields=[
-            "code_prestation","code_dossier","honoraires_total","remboursement","tiers_payant"
-        ])
+        agenda.tariff_version_id = pricing.get("tariff_version_id")
+        # Même transaction que l'écriture du rendez-vous, déjà publiée : pas de second événement.
+        agenda._skip_change_event = True
+        try:
+            agenda.save(update_fields=[
+                "code_prestation","code_dossier","honoraires_total","remboursement","tiers_payant","tariff_version","is_bim"
+            ])
+        finally:
+            agenda._skip_change_event = False
 
     def create(self, validated_data):
         request = self.context.get('request')
@@ -111,12 +153,19 @@ class AgendaSerializer(serializers.ModelSerializer):
 
         patient = validated_data['patient']
         app_date = validated_data['app_date']
-        validated_data['is_over_annual'] = self._compute_is_over_annual(patient, app_date, validated_data['coverage_source'])
+        category = _quota_category(pres, validated_data.get('pathology_category'))
+        validated_data['is_over_annual'] = self._compute_is_over_annual(patient, app_date, validated_data['coverage_source'], category)
 
         validated_data['place'] = validated_data.get('place') or 'home'
 
-        agenda = Agenda.objects.create(**validated_data)
-        self._apply_pricing(agenda, request)
+        try:
+            with transaction.atomic():
+                agenda = Agenda.objects.create(**validated_data)
+                self._apply_pricing(agenda, request)
+        except IntegrityError as e:
+            if OVERLAP_CONSTRAINT not in str(e):
+                raise
+            raise serializers.ValidationError(OVERLAP_ERROR)
         return agenda
 
     def update(self, instance, validated_data):
@@ -143,11 +192,204 @@ class AgendaSerializer(serializers.ModelSerializer):
 
         patient = validated_data.get('patient', instance.patient)
         app_date = validated_data.get('app_date', instance.app_date)
-        validated_data['is_over_annual'] = self._compute_is_over_annual(patient, app_date, validated_data['coverage_source'])
+        category = _quota_category(pres_new, validated_data.get('pathology_category', instance.pathology_category))
+        validated_data['is_over_annual'] = self._compute_is_over_annual(patient, app_date, validated_data['coverage_source'], category)
 
         if not validated_data.get('place'):
             validated_data['place'] = getattr(instance, 'place', 'home') or 'home'
 
-        agenda = super().update(instance, validated_data)
-        self._apply_pricing(agenda, request)
+        try:
+            with transaction.atomic():
+                agenda = super().update(instance, validated_data)
+                self._apply_pricing(agenda, request)
+        except IntegrityError as e:
+            if OVERLAP_CONSTRAINT not in str(e):
+                raise
+            raise serializers.ValidationError(OVERLAP_ERROR)
         return agenda
+
+
+class AvailabilityQuerySerializer(serializers.Serializer):
+    practitioners = serializers.CharField()
+    start = serializers.DateField()
+    end = serializers.DateField()
+    duration = serializers.IntegerField(required=False, default=DEFAULT_DURATION_MINUTES, min_value=5, max_value=MAX_DURATION_MINUTES)
+    day_start = serializers.TimeField(required=False, default=time(8, 0))
+    day_end = serializers.TimeField(required=False, default=time(18, 0))
+    weekdays = serializers.CharField(required=False, default="0,1,2,3,4")
+
+    MAX_RANGE_DAYS = 62
+
+    def _parse_ids(self, value, field):
+        try:
+            return [int(v) for v in value.split(',') if v.strip()]
+        except ValueError:
+            raise serializers.ValidationError({field: "Liste d'identifiants invalide."})
+
+    def validate(self, attrs):
+        attrs['practitioners'] = self._parse_ids(attrs['practitioners'], 'practitioners')
+        if not attrs['practitioners']:
+            raise serializers.ValidationError({"practitioners": "Au moins un praticien est requis."})
+
+        attrs['weekdays'] = self._parse_ids(attrs['weekdays'], 'weekdays')
+        if any(d < 0 or d > 6 for d in attrs['weekdays']):
+            raise serializers.ValidationError({"weekdays": "Jours attendus entre 0 (lundi) et 6 (dimanche)."})
+
+        if attrs['end'] < attrs['start']:
+            raise serializers.ValidationError({"end": "La date de fin précède la date de début."})
+        if (attrs['end'] - attrs['start']).days > self.MAX_RANGE_DAYS:
+            raise serializers.ValidationError({"end": f"Plage limitée à {self.MAX_RANGE_DAYS} jours."})
+        if attrs['day_end'] <= attrs['day_start']:
+            raise serializers.ValidationError({"day_end": "L'heure de fin doit suivre l'heure de début."})
+        return attrs
+
+
+class AgendaSeriesSerializer(serializers.Serializer):
+    """
+    Crée une série de rendez-vous en une transaction :
+    expansion de la règle, contrôle des chevauchements en une requête,
+    numéros de séance attribués en mémoire, tarification en lot et bulk_create.
+    """
+    patient = serializers.PrimaryKeyRelatedField(queryset=Patient.objects.all())
+    practitioner = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
+    prescription = serializers.PrimaryKeyRelatedField(queryset=Prescription.objects.all(), required=False, allow_null=True)
+    pathology_category = serializers.PrimaryKeyRelatedField(queryset=PathologyCategory.objects.all(), required=False, allow_null=True)
+    place = serializers.ChoiceField(choices=Agenda.PLACE_CHOICES, required=False, default='home')
+    payment_mode = serializers.ChoiceField(choices=Agenda._meta.get_field('payment_mode').choices, required=False, default='total')
+    reason = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    duration_minutes = serializers.IntegerField(required=False, default=DEFAULT_DURATION_MINUTES, min_value=1, max_value=MAX_DURATION_MINUTES)
+    is_bim = serializers.BooleanField(required=False, default=False)
+
+    start_date = serializers.DateField()
+    weekdays = serializers.ListField(child=serializers.IntegerField(min_value=0, max_value=6), allow_empty=False)
+    time = serializers.TimeField()
+    count = serializers.IntegerField(min_value=1, max_value=MAX_SERIES_SESSIONS)
+
+    def validate(self, attrs):
+        if not attrs.get('prescription') and not attrs.get('pathology_category'):
+            raise serializers.ValidationError(
+                "En mode 'annual', 'pathology_category' est requis pour tarifer."
+            )
+
+        office = self.context.get('office')
+        duration = timedelta(minutes=attrs['duration_minutes'])
+        starts = expand_weekly(attrs['start_date'], attrs['weekdays'], attrs['time'], attrs['count'])
+        intervals = [(start, start + duration) for start in starts]
+
+        conflicts = find_conflicts(attrs['practitioner'], intervals, office=office)
+        if conflicts:
+            raise serializers.ValidationError({
+                "detail": OVERLAP_ERROR,
+                "conflicts": [start.isoformat() for start, _ in conflicts],
+            })
+
+        attrs['occurrences'] = starts
+        return attrs
+
+    def _build_rows(self, validated_data, office):
+        pres = validated_data.get('prescription')
+        patient = validated_data['patient']
+        common = dict(
+            patient=patient,
+            practitioner=validated_data['practitioner'],
+            prescription=pres,
+            pathology_category=validated_data.get('pathology_category'),
+            office=office,
+            place=validated_data['place'],
+            payment_mode=validated_data['payment_mode'],
+            reason=validated_data.get('reason'),
+            duration_minutes=validated_data['duration_minutes'],
+            coverage_source='prescription' if pres else 'annual',
+            is_bim=validated_data['is_bim'],
+        )
+
+        rows, indexes = [], {}
+        next_prescription_index = _count_prescription_planned(pres) + 1 if pres else None
+        category = _quota_category(pres, validated_data.get('pathology_category'))
+        annual_counts = {}
+        for start in validated_data['occurrences']:
+            year = timezone.localtime(start).year
+            if year not in annual_counts:
+                annual_counts[year] = _count_annual_planned(patient, year, category)
+            if not pres:
+                annual_counts[year] += 1
+
+            agenda = Agenda(app_date=start, **common)
+            agenda.end_date = agenda.compute_end_date()
+            agenda.is_over_annual = annual_counts[year] > ANNUAL_QUOTA
+            if pres:
+                agenda.session_index = next_prescription_index
+                indexes[id(agenda)] = next_prescription_index
+                next_prescription_index += 1
+            else:
+                indexes[id(agenda)] = annual_counts[year]
+            rows.append(agenda)
+        return rows, indexes
+
+    def create(self, validated_data):
+        office = self.context.get('office')
+        rows, indexes = self._build_rows(validated_data, office)
+
+        _, missing = price_appointments(rows, save=False, indexes=indexes)
+        if missing:
+            raise serializers.ValidationError("Tarification indisponible (données INAMI manquantes ?).")
+
+        try:
+            with transaction.atomic():
+                created = Agenda.objects.bulk_create(rows)
+                apply_counter_deltas(count_rows(created))
+                publish_on_commit(created, "created")
+                return created
+        except IntegrityError as e:
+            if OVERLAP_CONSTRAINT not in str(e):
+                raise
+            raise serializers.ValidationError(OVERLAP_ERROR)
+
+
+class AgendaMoveSerializer(serializers.Serializer):
+    """
+    Déplacement en masse : les rendez-vous planifiés de `practitioner` dans
+    [start, end[ passent au jour `target_date` et/ou au praticien `target_practitioner`.
+    """
+    practitioner = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
+    start = serializers.DateTimeField()
+    end = serializers.DateTimeField()
+    target_date = serializers.DateField(required=False, allow_null=True)
+    target_practitioner = serializers.PrimaryKeyRelatedField(queryset=User.objects.all(), required=False, allow_null=True)
+    dry_run = serializers.BooleanField(required=False, default=False)
+
+    MAX_RANGE_DAYS = 14
+
+    def validate(self, attrs):
+        if attrs['end'] <= attrs['start']:
+            raise serializers.ValidationError({"end": "La fin de la fenêtre doit suivre son début."})
+        if attrs['end'] - attrs['start'] > timedelta(days=self.MAX_RANGE_DAYS):
+            raise serializers.ValidationError({"end": f"Fenêtre limitée à {self.MAX_RANGE_DAYS} jours."})
+        if not attrs.get('target_date') and not attrs.get('target_practitioner'):
+            raise serializers.ValidationError("Indiquez 'target_date' et/ou 'target_practitioner'.")
+
+        office = self.context.get('office')
+        target = attrs.get('target_practitioner')
+        if office and target and not UserOfficeRole.objects.filter(
+            user=target, office=office, role='practitioner', is_active=True
+        ).exists():
+            raise serializers.ValidationError({"target_practitioner": "Ce praticien n'appartient pas au cabinet."})
+        return attrs
+
+
+class PricingSimulationQuerySerializer(serializers.Serializer):
+    tariff_year = serializers.IntegerField(min_value=2000, max_value=2100)
+    start = serializers.DateField()
+    end = serializers.DateField()
+
+    MAX_RANGE_DAYS = 366
+
+    def validate(self, attrs):
+        if attrs['end'] <= attrs['start']:
+            raise serializers.ValidationError({"end": "La date de fin doit suivre la date de début."})
+        if (attrs['end'] - attrs['start']).days > self.MAX_RANGE_DAYS:
+            raise serializers.ValidationError({"end": f"Plage limitée à {self.MAX_RANGE_DAYS} jours."})
+        attrs['tariff_version'] = tariff_index.version_for_year(attrs['tariff_year'])
+        if attrs['tariff_version'] is None:
+            raise serializers.ValidationError({"tariff_year": "Aucune grille importée pour cette année."})
+        return attrs
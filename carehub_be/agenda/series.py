@@ -0,0 +1,62 @@
+"""
+Séries de rendez-vous récurrents (ex: mardi/jeudi 10:00 pour 18 séances).
+"""
+
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+
+from .utils import appointments_in_window
+
+MAX_SERIES_SESSIONS = 60
+
+
+def expand_weekly(start_date, weekdays, at, count):
+    """
+    Dates des `count` premières occurrences à l'heure `at` les jours `weekdays`
+    (0 = lundi) à partir de start_date inclus, dans le fuseau courant.
+    """
+    weekdays = set(weekdays)
+    if not weekdays or count < 1:
+        return []
+
+    tz = timezone.get_current_timezone()
+    occurrences = []
+    day = start_date
+    while len(occurrences) < count:
+        if day.weekday() in weekdays:
+            occurrences.append(datetime.combine(day, at, tzinfo=tz))
+        day += timedelta(days=1)
+    return occurrences
+
+
+def find_conflicts(practitioner, intervals, office=None, exclude_ids=()):
+    """
+    Retourne les intervalles de `intervals` (triés, [(début, fin), ...]) qui
+    chevauchent un rendez-vous existant du praticien, ou un autre intervalle de la série.
+    Une seule requête couvre toute la série ; la comparaison se fait par fusion.
+    `exclude_ids` écarte des rendez-vous en cours de déplacement.
+    """
+    if not intervals:
+        return []
+
+    qs = appointments_in_window([practitioner.pk], intervals[0][0], max(e for _, e in intervals), office=office)
+    if exclude_ids:
+        qs = qs.exclude(pk__in=exclude_ids)
+    busy = list(qs.order_by("app_date").values_list("app_date", "ends_at"))
+
+    conflicts = []
+    i = 0
+    previous_end = None
+    for start, end in intervals:
+        while i < len(busy) and busy[i][1] <= start:
+            i += 1
+        j = i
+        clash = previous_end is not None and previous_end > start
+        while not clash and j < len(busy) and busy[j][0] < end:
+            clash = busy[j][1] > start
+            j += 1
+        if clash:
+            conflicts.append((start, end))
+        previous_end = max(previous_end, end) if previous_end else end
+    return conflicts
@@ -0,0 +1,98 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .counters import apply_counter_deltas, key_deltas
+from .events import agenda_slot, publish_on_commit
+from .models import Agenda, AgendaTombstone
+from .quota import reflow_patient_year
+
+# Champs dont dépendent les clés des compteurs (Agenda.counter_keys).
+COUNTER_FIELDS = {"status", "coverage_source", "prescription", "patient", "pathology_category", "app_date"}
+# Champs de l'emplacement (cabinet, praticien, date) publié avec les changements.
+SLOT_FIELDS = {"office", "practitioner", "app_date"}
+
+
+@receiver(pre_save, sender=Agenda)
+def remember_counter_keys(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Mémorise les clés de compteur et l'emplacement de la ligne en base avant modification.
+    Une écriture qui ne touche aucun champ concerné (ex: tarification) ne coûte rien.
+    """
+    instance._old_counter_keys = None
+    instance._old_status = None
+    instance._old_slot = None
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and not ((COUNTER_FIELDS | SLOT_FIELDS) & set(update_fields)):
+        return
+
+    old = (Agenda.objects
+           .filter(pk=instance.pk)
+           .only("status", "coverage_source", "prescription_id", "patient_id", "pathology_category_id",
+                 "app_date", "office_id", "practitioner_id")
+           .first())
+    instance._old_counter_keys = old.counter_keys() if old else (None, None)
+    instance._old_status = old.status if old else None
+    instance._old_slot = agenda_slot(old) if old else None
+
+
+@receiver(post_save, sender=Agenda)
+def update_session_counters(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old_keys = (None, None) if created else getattr(instance, "_old_counter_keys", None)
+    if old_keys is None:
+        return
+    apply_counter_deltas(key_deltas(old_keys, instance.counter_keys()))
+    instance._old_counter_keys = None
+
+
+@receiver(post_save, sender=Agenda)
+def publish_agenda_change(sender, instance, created, raw=False, **kwargs):
+    """
+    Publie created / updated / cancelled. Une écriture interne qui complète une
+    écriture déjà publiée dans la même transaction (ex: tarification par
+    AgendaSerializer) pose _skip_change_event et ne publie rien.
+    """
+    if raw or getattr(instance, "_skip_change_event", False):
+        return
+    old_status = getattr(instance, "_old_status", None)
+    if created:
+        event_type = "created"
+    elif instance.status == "cancelled" and old_status not in (None, "cancelled"):
+        event_type = "cancelled"
+    else:
+        event_type = "updated"
+    old_slot = getattr(instance, "_old_slot", None)
+    publish_on_commit([instance], event_type, previous=[old_slot] if old_slot else ())
+
+
+@receiver(post_save, sender=Agenda)
+def reflow_after_cancel(sender, instance, created, raw=False, **kwargs):
+    """
+    Une séance annulée libère une place : les séances suivantes du patient
+    (même année) sont renumérotées et retarifées.
+    """
+    if raw or created:
+        return
+    if instance.status != "cancelled" or getattr(instance, "_old_status", None) in (None, "cancelled"):
+        return
+    reflow_patient_year(instance.patient_id, timezone.localtime(instance.app_date).year)
+
+
+@receiver(post_delete, sender=Agenda)
+def release_session_counters(sender, instance, **kwargs):
+    apply_counter_deltas(key_deltas(instance.counter_keys(), (None, None)))
+
+
+@receiver(post_delete, sender=Agenda)
+def record_tombstone(sender, instance, **kwargs):
+    publish_on_commit([instance], "deleted")
+    AgendaTombstone.objects.create(
+        agenda_id=instance.pk,
+        office_id=instance.office_id,
+        practitioner_id=instance.practitioner_id,
+        app_date=instance.app_date,
+    )
+
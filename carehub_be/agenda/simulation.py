@@ -0,0 +1,113 @@
+"""
+Simulation de tarification (what-if) : impact d'une grille INAMI candidate.
+
+Les rendez-vous d'une fenêtre historique sont retarifés en mémoire avec la
+grille d'une autre année (price_appointments, save=False) et comparés aux
+montants enregistrés. Rien n'est écrit. Les rendez-vous sont traités par
+paquets pour borner la mémoire ; une année de données tient en quelques secondes.
+
+Chaque rendez-vous est simulé avec son propre statut BIM (Agenda.is_bim), comme
+son montant enregistré. Un statut inconnu n'est pas simulé : le montant actuel
+est reconduit et compté dans `unknown_bim`, l'écart reste comparable.
+"""
+
+from collections import defaultdict
+from datetime import datetime, time
+from decimal import Decimal
+
+from django.utils import timezone
+
+from .models import Agenda
+from .pricing import _prescription_categories, price_appointments
+
+SIMULATION_CHUNK = 5000
+SIMULATION_FIELDS = (
+    "id", "app_date", "patient", "practitioner", "prescription", "pathology_category",
+    "place", "coverage_source", "session_index", "is_over_annual", "is_bim", "honoraires_total", "remboursement",
+)
+ZERO = Decimal("0.00")
+
+
+def _bucket():
+    return {
+        "count": 0, "missing": 0, "unknown_bim": 0,
+        "honoraires_current": ZERO, "honoraires_simulated": ZERO,
+        "remboursement_current": ZERO, "remboursement_simulated": ZERO,
+    }
+
+
+def _finish(bucket):
+    bucket["honoraires_delta"] = bucket["honoraires_simulated"] - bucket["honoraires_current"]
+    bucket["remboursement_delta"] = bucket["remboursement_simulated"] - bucket["remboursement_current"]
+    return bucket
+
+
+def simulation_window(start, end, office=None):
+    """
+    Rendez-vous du jour `start` (inclus) au jour `end` (exclu).
+    """
+    tz = timezone.get_current_timezone()
+    qs = Agenda.objects.filter(
+        app_date__gte=datetime.combine(start, time.min, tzinfo=tz),
+        app_date__lt=datetime.combine(end, time.min, tzinfo=tz),
+    )
+    if office is not None:
+        qs = qs.filter(office=office)
+    return qs
+
+
+def simulate_pricing(queryset, tariff_version, chunk=SIMULATION_CHUNK):
+    """
+    Compare les montants enregistrés de `queryset` à ceux de la version de tarifs
+    `tariff_version` (voir TariffIndex.version_for_year).
+
+    Retourne {"total": {...}, "by_category": {category_id: {...}}, "by_practitioner": {id: {...}}}
+    avec pour chaque groupe : count, missing (sans tarif candidat), unknown_bim
+    (statut BIM inconnu), honoraires et remboursement actuels / simulés / delta.
+    """
+    total = _bucket()
+    by_category = defaultdict(_bucket)
+    by_practitioner = defaultdict(_bucket)
+
+    rows = (queryset.exclude(status="cancelled")
+            .only(*SIMULATION_FIELDS)
+            .order_by("app_date", "id"))
+
+    batch = []
+    for agenda in rows.iterator(chunk_size=chunk):
+        batch.append(agenda)
+        if len(batch) >= chunk:
+            _simulate_batch(batch, tariff_version, total, by_category, by_practitioner)
+            batch = []
+    if batch:
+        _simulate_batch(batch, tariff_version, total, by_category, by_practitioner)
+
+    return {
+        "tariff_version": tariff_version,
+        "total": _finish(total),
+        "by_category": {k: _finish(v) for k, v in by_category.items()},
+        "by_practitioner": {k: _finish(v) for k, v in by_practitioner.items()},
+    }
+
+
+def _simulate_batch(batch, tariff_version, total, by_category, by_practitioner):
+    current = {id(a): (a.honoraires_total or ZERO, a.remboursement or ZERO) for a in batch}
+    priced, missing = price_appointments(batch, save=False, tariff_version=tariff_version)
+    categories = _prescription_categories(batch)
+
+    missing_ids = {id(a) for a in missing}
+    for a in batch:
+        honoraires, remboursement = current[id(a)]
+        category_id = categories.get(a.prescription_id) or a.pathology_category_id
+        for bucket in (total, by_category[category_id], by_practitioner[a.practitioner_id]):
+            bucket["count"] += 1
+            bucket["honoraires_current"] += honoraires
+            bucket["remboursement_current"] += remboursement
+            if a.is_bim is None or id(a) in missing_ids:
+                # Statut BIM inconnu ou sans tarif candidat : le montant actuel est reconduit.
+                bucket["unknown_bim" if a.is_bim is None else "missing"] += 1
+                bucket["honoraires_simulated"] += honoraires
+                bucket["remboursement_simulated"] += remboursement
+            else:
+                bucket["honoraires_simulated"] += a.honoraires_total or ZERO
+                bucket["remboursement_simulated"] += a.remboursement or ZERO
@@ -0,0 +1,83 @@
+"""
+Flux Server-Sent Events des changements d'agenda d'un cabinet (vue asynchrone).
+
+Le flux est infini : il exige un serveur ASGI (asgi.py, ex: `uvicorn
+carehub_be.asgi:application`). Sous WSGI (runserver, gunicorn sync) la réponse
+serait consommée en entier et bloquerait un worker pour toujours : la vue
+répond alors 501.
+
+EventSource ne permet pas d'envoyer d'en-tête Authorization : le jeton d'accès
+JWT et le cabinet passent en paramètres (?token=...&office=...).
+"""
+
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from accounts.models import UserOfficeRole
+from subscriptions.utils import office_has_active_access
+from .events import hub
+
+KEEPALIVE_SECONDS = 20
+
+
+def _authorize(token, office_id):
+    """
+    Retourne (office_id, None) si le jeton est valide et l'utilisateur membre actif
+    d'un cabinet abonné, sinon (None, JsonResponse d'erreur).
+    """
+    if not token or not office_id:
+        return None, JsonResponse({"detail": "token et office sont requis."}, status=400)
+
+    auth = JWTAuthentication()
+    try:
+        user = auth.get_user(auth.get_validated_token(token))
+    except (InvalidToken, TokenError):
+        return None, JsonResponse({"detail": "Jeton invalide ou expiré."}, status=401)
+
+    uor = (UserOfficeRole.objects
+           .select_related("office")
+           .filter(user=user, office_id=office_id, is_active=True)
+           .first())
+    if not uor:
+        return None, JsonResponse({"detail": "Interdit"}, status=403)
+    if not uor.office.is_paid and not office_has_active_access(uor.office):
+        return None, JsonResponse({"detail": "payment_required"}, status=402)
+    return uor.office_id, None
+
+
+def _format(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event, cls=DjangoJSONEncoder)}\n\n"
+
+
+async def agenda_stream(request):
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({"detail": "Flux disponible uniquement via le serveur ASGI."}, status=501)
+
+    office_id, error = await sync_to_async(_authorize)(
+        request.GET.get("token"), request.GET.get("office")
+    )
+    if error:
+        return error
+
+    async def events():
+        with hub.subscribe(office_id) as queue:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield _format(event)
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -1,3 +1,562 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import unittest
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import AsyncClient, TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.models import User, UserOfficeRole
+from billing.models import PathologyCategory
+from billing.tariffs import tariff_index
+from offices.models import Office
+from patients.models import Patient
+from .availability import free_slots
+from .events import agenda_changed, hub
+from .models import OVERLAP_CONSTRAINT, Agenda, AgendaTombstone, AnnualSessionCounter
+from .moves import MoveConflict, move_appointments
+from .pricing import price_appointments, session_indexes
+from .serializers import AgendaMoveSerializer, AgendaSeriesSerializer, AgendaSerializer, calendar_rows
+from .utils import ScheduledEnd, overlapping_appointments, sync_end_dates
+from .simulation import simulate_pricing
+
+
+class CalendarProjectionBenchmark(TestCase):
+    """
+    Coût en requêtes d'un calendrier chargé (2 000 rendez-vous) : AgendaSerializer
+    complet comme projection calendar_rows tiennent en une requête, quel que soit le volume.
+    """
+    N = 2000
+
+    @classmethod
+    def setUpTestData(cls):
+        office = Office.objects.create(name="Cabinet", bce_number="0123", street="Rue", number_street="1",
+                                       zipcode="1000", city="Bruxelles", email="cabinet@carehub.test")
+        category = PathologyCategory.objects.create(code="PC", label="Courante")
+        practitioners = [
+            User.objects.create_user(email=f"kine{i}@carehub.test", name="Kiné", surname=str(i))
+            for i in range(5)
+        ]
+        patients = [
+            Patient.objects.create(name="Patient", surname=str(i), birth_date=datetime.date(1980, 1, 1),
+                                   street="Rue", street_number="1", zipcode="1000", city="Bruxelles",
+                                   telephone="0470000000", office=office)
+            for i in range(50)
+        ]
+        start = datetime.datetime(2025, 1, 6, 8, tzinfo=datetime.timezone.utc)
+        Agenda.objects.bulk_create([
+            Agenda(patient=patients[i % 50], practitioner=practitioners[i % 5], office=office,
+                   pathology_category=category, coverage_source="annual",
+                   app_date=start + datetime.timedelta(minutes=30 * i),
+                   end_date=start + datetime.timedelta(minutes=30 * i + 30))
+            for i in range(cls.N)
+        ])
+
+    def test_calendar_projection_cost(self):
+        qs = Agenda.objects.all().order_by("app_date")
+        with self.assertNumQueries(1):
+            full = AgendaSerializer(qs, many=True).data
+        with self.assertNumQueries(1):
+            light = calendar_rows(qs)
+
+        self.assertEqual(len(full), self.N)
+        self.assertEqual(len(light), self.N)
+        self.assertEqual(light[0]["patient_display"], "Patient 0")
+        self.assertEqual(light[0]["practitioner_display"], "Kiné 0")
+
+
+class AgendaEventHubTests(TestCase):
+    """
+    Le hub SSE fonctionne en mémoire : un abonné reçoit les changements
+    publiés après commit par les signaux d'Agenda, sans broker externe.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.office = Office.objects.create(name="Cabinet", bce_number="0456", street="Rue", number_street="1",
+                                           zipcode="1000", city="Bruxelles", email="hub@carehub.test")
+        cls.category = PathologyCategory.objects.create(code="FA", label="Aiguë")
+        cls.practitioner = User.objects.create_user(email="hub-kine@carehub.test", name="Kiné", surname="Hub")
+        cls.patient = Patient.objects.create(name="Patient", surname="Hub", birth_date=datetime.date(1980, 1, 1),
+                                             street="Rue", street_number="1", zipcode="1000", city="Bruxelles",
+                                             telephone="0470000000", office=cls.office)
+
+    def _create_and_cancel(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            agenda = Agenda.objects.create(
+                patient=self.patient, practitioner=self.practitioner, office=self.office,
+                pathology_category=self.category, coverage_source="annual",
+                app_date=datetime.datetime(2025, 3, 3, 10, tzinfo=datetime.timezone.utc),
+            )
+        with self.captureOnCommitCallbacks(execute=True):
+            agenda.status = "cancelled"
+            agenda.save()
+        return agenda
+
+    async def test_subscriber_receives_agenda_events(self):
+        with hub.subscribe(self.office.id) as queue:
+            agenda = await sync_to_async(self._create_and_cancel)()
+            created = await asyncio.wait_for(queue.get(), timeout=1)
+            cancelled = await asyncio.wait_for(queue.get(), timeout=1)
+
+        self.assertEqual((created["type"], created["id"]), ("created", agenda.id))
+        self.assertEqual((cancelled["type"], cancelled["id"]), ("cancelled", agenda.id))
+        self.assertEqual(hub.subscriber_count(self.office.id), 0)
+
+
+    def test_stream_requires_asgi(self):
+        response = self.client.get(reverse("agenda-stream"), {"token": "x", "office": self.office.id})
+        self.assertEqual(response.status_code, 501)
+
+    async def test_stream_sends_an_event_then_releases_the_subscription(self):
+        await sync_to_async(UserOfficeRole.objects.create)(user=self.practitioner, office=self.office,
+                                                          role="practitioner")
+        await Office.objects.filter(pk=self.office.pk).aupdate(is_paid=True)
+        token = str(AccessToken.for_user(self.practitioner))
+
+        response = await AsyncClient().get(reverse("agenda-stream"), {"token": token, "office": self.office.id})
+        self.assertEqual(response.status_code, 200)
+        chunks = aiter(response.streaming_content)
+        self.assertEqual(await anext(chunks), b"retry: 3000\n\n")
+
+        pending = asyncio.ensure_future(anext(chunks))
+        await asyncio.sleep(0)
+        self.assertEqual(hub.subscriber_count(self.office.id), 1)
+        await sync_to_async(self._create_and_cancel)()
+        first = await asyncio.wait_for(pending, timeout=1)
+        self.assertTrue(first.startswith(b"event: created\n"))
+        self.assertTrue((await anext(chunks)).startswith(b"event: cancelled\n"))
+
+        # Déconnexion du client : le serveur ASGI annule la tâche qui attend le prochain événement.
+        pending = asyncio.ensure_future(anext(chunks))
+        await asyncio.sleep(0)
+        pending.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await pending
+        self.assertEqual(hub.subscriber_count(self.office.id), 0)
+
+
+class AgendaTombstoneTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.office = Office.objects.create(name="Cabinet", bce_number="0321", street="Rue", number_street="1",
+                                           zipcode="1000", city="Bruxelles", email="tomb@carehub.test")
+        cls.practitioner = User.objects.create_user(email="tomb-kine@carehub.test", name="Kiné", surname="Tomb")
+        cls.patient = Patient.objects.create(name="Patient", surname="Tomb", birth_date=datetime.date(1980, 1, 1),
+                                             street="Rue", street_number="1", zipcode="1000", city="Bruxelles",
+                                             telephone="0470000000", office=cls.office)
+
+    def test_office_cascade_delete_records_tombstones(self):
+        agenda = Agenda.objects.create(
+            patient=self.patient, practitioner=self.practitioner, office=self.office,
+            app_date=datetime.datetime(2025, 3, 3, 10, tzinfo=datetime.timezone.utc),
+        )
+        office_id = self.office.id
+
+        self.office.delete()
+
+        tombstone = AgendaTombstone.objects.get(agenda_id=agenda.id)
+        self.assertEqual((tombstone.office_id, tombstone.practitioner_id), (office_id, self.practitioner.id))
+
+
+class DeltaSyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.office = Office.objects.create(name="Cabinet", bce_number="0654", street="Rue", number_street="1",
+                                           zipcode="1000", city="Bruxelles", email="delta@carehub.test", is_paid=True)
+        cls.practitioner = User.objects.create_user(email="delta-kine@carehub.test", name="Kiné", surname="Delta")
+        UserOfficeRole.objects.create(user=cls.practitioner, office=cls.office, role="practitioner")
+        patient = Patient.objects.create(name="Patient", surname="Delta", birth_date=datetime.date(1980, 1, 1),
+                                         street="Rue", street_number="1", zipcode="1000", city="Bruxelles",
+                                         telephone="0470000000", office=cls.office)
+        cls.agenda = Agenda.objects.create(patient=patient, practitioner=cls.practitioner, office=cls.office,
+                                           app_date=datetime.datetime(2025, 3, 3, 10, tzinfo=datetime.timezone.utc))
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.practitioner)
+
+    def test_naive_since_is_read_in_the_current_timezone(self):
+        since = timezone.localtime() - datetime.timedelta(hours=1)
+        response = self.api.get(reverse("agenda-list"), {"since": since.replace(tzinfo=None).isoformat()})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row["id"] for row in response.data["changed"]], [self.agenda.id])
+
+    def test_unknown_office_is_rejected(self):
+        response = self.api.get(reverse("agenda-list"), {"since": timezone.now().isoformat(), "office": 999999})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("office", response.data)
+
+        response = self.api.get(reverse("agenda-list"), {"since": "2025-02-30T10:00:00"})
+        self.assertEqual(response.status_code, 400)
+
+
+class AnnualReflowTests(TestCase):
+    """
+    L'annulation d'une séance annuelle renumérote les suivantes et les retarife
+    avec le statut BIM de chaque rendez-vous ; un statut inconnu garde ses montants.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command("import_tariffs", year=2025, stdout=StringIO())
+        cls.office = Office.objects.create(name="Cabinet", bce_number="0789", street="Rue", number_street="1",
+                                           zipcode="1000", city="Bruxelles", email="reflow@carehub.test")
+        cls.category = PathologyCategory.objects.get(code="PC")
+        cls.practitioner = User.objects.create_user(email="reflow-kine@carehub.test", name="Kiné", surname="Reflow")
+        UserOfficeRole.objects.create(user=cls.practitioner, office=cls.office, role="practitioner")
+        cls.patients = [
+            Patient.objects.create(name="Patient", surname=str(i), birth_date=datetime.date(1980, 1, 1),
+                                   street="Rue", street_number="1", zipcode="1000", city="Bruxelles",
+                                   telephone="0470000000", office=cls.office)
+            for i in range(2)
+        ]
+
+    def _sessions(self, patient, is_bim, count=2):
+        start = datetime.datetime(2025, 3, 3, 10, tzinfo=datetime.timezone.utc)
+        rows = [
+            Agenda.objects.create(
+                patient=patient, practitioner=self.practitioner, office=self.office,
+                pathology_category=self.category, coverage_source="annual", place="office", is_bim=is_bim,
+                app_date=start + datetime.timedelta(days=7 * i),
+            )
+            for i in range(count)
+        ]
+        price_appointments(rows, is_bim=bool(is_bim))
+        return rows
+
+    def _cancel(self, agenda):
+        agenda.status = "cancelled"
+        agenda.save()
+
+    def test_cancel_reprices_with_row_bim_status(self):
+        first, second = self._sessions(self.patients[0], is_bim=True)
+        self.assertEqual((second.remboursement, second.tiers_payant), (Decimal("28.30"), Decimal("2.50")))
+
+        self._cancel(first)
+
+        second.refresh_from_db()
+        self.assertEqual(second.code_dossier, "567033")
+        self.assertEqual((second.remboursement, second.tiers_payant), (Decimal("35.49"), Decimal("2.50")))
+
+    def test_office_reflow_counts_the_other_offices(self):
+        other = Office.objects.create(name="Autre", bce_number="0790", street="Rue", number_street="1",
+                                      zipcode="1000", city="Bruxelles", email="reflow-other@carehub.test")
+        elsewhere, here = self._sessions(self.patients[0], is_bim=False)
+        Agenda.objects.filter(pk=elsewhere.pk).update(office=other)
+        Agenda.objects.filter(pk=here.pk).update(is_over_annual=True)
+
+        with mock.patch("agenda.quota.ANNUAL_QUOTA", 1):
+            call_command("reflow_annual_quota", year=2025, office=self.office.pk, stdout=StringIO())
+
+        here.refresh_from_db()
+        self.assertTrue(here.is_over_annual)
+        self.assertEqual(here.honoraires_total, Decimal("30.80"))
+
+    def test_session_indexes_rank_per_category(self):
+        other = PathologyCategory.objects.create(code="XX", label="Autre")
+        start = datetime.datetime(2025, 3, 3, 10, tzinfo=datetime.timezone.utc)
+        rows = [
+            Agenda.objects.create(
+                patient=self.patients[0], practitioner=self.practitioner, office=self.office,
+                pathology_category=category, coverage_source="annual",
+                app_date=start + datetime.timedelta(days=7 * i),
+            )
+            for i, category in enumerate([self.category, other, self.category])
+        ]
+
+        indexes = session_indexes(rows)
+
+        self.assertEqual([indexes[id(a)] for a in rows], [1, 1, 2])
+
+    def test_reprice_command_uses_each_row_status(self):
+        bim, _ = self._sessions(self.patients[0], is_bim=True)
+        plain, _ = self._sessions(self.patients[1], is_bim=False)
+        Agenda.objects.filter(pk__in=[bim.pk, plain.pk]).update(remboursement=None)
+
+        call_command("reprice_agenda", year=2025, stdout=StringIO())
+
+        bim.refresh_from_db()
+        plain.refresh_from_db()
+        self.assertEqual(bim.remboursement, Decimal("35.49"))
+        self.assertEqual(plain.remboursement, Decimal("31.74"))
+
+    def test_simulation_uses_each_row_status(self):
+        self._sessions(self.patients[0], is_bim=True)
+        self._sessions(self.patients[1], is_bim=False)
+        unknown = Agenda.objects.filter(patient=self.patients[1]).order_by("app_date").last()
+        Agenda.objects.filter(pk=unknown.pk).update(is_bim=None)
+
+        result = simulate_pricing(Agenda.objects.all(), tariff_index.version_for_year(2025))
+
+        total = result["total"]
+        self.assertEqual((total["count"], total["unknown_bim"], total["missing"]), (4, 1, 0))
+        self.assertEqual(total["remboursement_delta"], Decimal("0.00"))
+        self.assertEqual(total["honoraires_delta"], Decimal("0.00"))
+
+    def test_serializer_create_publishes_a_single_event(self):
+        published = []
+
+        def collect(sender, events=(), **kwargs):
+            published.extend(event["type"] for event in events)
+
+        agenda_changed.connect(collect)
+        try:
+            serializer = AgendaSerializer(data={
+                "patient": self.patients[0].pk, "practitioner": self.practitioner.pk,
+                "pathology_category": self.category.pk, "place": "office", "is_bim": "false",
+                "app_date": "2025-03-03T10:00:00Z",
+            }, context={"office": self.office})
+            serializer.is_valid(raise_exception=True)
+            agenda = serializer.save(office=self.office)
+        finally:
+            agenda_changed.disconnect(collect)
+
+        self.assertEqual(published, ["created"])
+        agenda.refresh_from_db()
+        self.assertIs(agenda.is_bim, False)
+        self.assertEqual(agenda.remboursement, Decimal("31.74"))
+
+    def test_unknown_bim_status_keeps_amounts(self):
+        first, second = self._sessions(self.patients[1], is_bim=None)
+        Agenda.objects.filter(pk=second.pk).update(session_index=7)
+        before = (second.honoraires_total, second.remboursement, second.tiers_payant)
+
+        self._cancel(first)
+
+        second.refresh_from_db()
+        self.assertIsNone(second.session_index)
+        self.assertFalse(second.is_over_annual)
+        self.assertEqual((second.honoraires_total, second.remboursement, second.tiers_payant), before)
+
+
+class SeriesMoveAndCounterTests(TestCase):
+    """
+    Série créée en une fois (numéros de séance et compteurs), conflits refusés,
+    déplacement en masse et réparation des compteurs dénormalisés.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command("import_tariffs", year=2025, stdout=StringIO())
+        cls.office = Office.objects.create(name="Cabinet", bce_number="0456", street="Rue", number_street="1",
+                                           zipcode="1000", city="Bruxelles", email="series@carehub.test")
+        cls.category = PathologyCategory.objects.get(code="PC")
+        cls.practitioner = User.objects.create_user(email="series-kine@carehub.test", name="Kiné", surname="Série")
+        UserOfficeRole.objects.create(user=cls.practitioner, office=cls.office, role="practitioner")
+        cls.patient = Patient.objects.create(name="Patient", surname="Série", birth_date=datetime.date(1980, 1, 1),
+                                             street="Rue", street_number="1", zipcode="1000", city="Bruxelles",
+                                             telephone="0470000000", office=cls.office)
+
+    def _series(self, count=4):
+        serializer = AgendaSeriesSerializer(data={
+            "patient": self.patient.pk, "practitioner": self.practitioner.pk,
+            "pathology_category": self.category.pk, "place": "office",
+            "start_date": "2025-03-03", "weekdays": [0, 2], "time": "10:00", "count": count,
+        }, context={"office": self.office})
+        serializer.is_valid(raise_exception=True)
+        return serializer.save()
+
+    def _planned(self):
+        return AnnualSessionCounter.planned_for(self.patient.pk, 2025, self.category.pk)
+
+    def test_series_creates_numbered_rows_and_counts_them(self):
+        rows = self._series()
+
+        self.assertEqual([timezone.localtime(a.app_date).weekday() for a in rows], [0, 2, 0, 2])
+        stored = list(Agenda.objects.order_by("app_date"))
+        self.assertEqual([a.code_dossier for a in stored], ["567033", None, None, None])
+        self.assertEqual(stored[1].honoraires_total, Decimal("30.80"))
+        self.assertEqual(self._planned(), 4)
+
+        stored[0].status = "cancelled"
+        stored[0].save()
+        self.assertEqual(self._planned(), 3)
+
+    def test_series_overlapping_an_appointment_is_rejected(self):
+        existing = Agenda.objects.create(patient=self.patient, practitioner=self.practitioner, office=self.office,
+                                         app_date=datetime.datetime(2025, 3, 5, 9, 45, tzinfo=timezone.get_current_timezone()))
+
+        with self.assertRaises(ValidationError) as caught:
+            self._series()
+
+        self.assertEqual(len(caught.exception.detail["conflicts"]), 1)
+        self.assertEqual(list(Agenda.objects.values_list("pk", flat=True)), [existing.pk])
+
+    def test_move_conflict_and_dry_run_write_nothing(self):
+        rows = self._series(count=2)
+        monday = rows[0].app_date
+        window = (monday - datetime.timedelta(hours=1), monday + datetime.timedelta(days=1))
+        tuesday = timezone.localtime(monday).date() + datetime.timedelta(days=1)
+
+        moved = move_appointments(self.office, self.practitioner, *window, target_date=tuesday, dry_run=True)
+        self.assertEqual(timezone.localtime(moved[0].app_date).date(), tuesday)
+        self.assertEqual(Agenda.objects.get(pk=rows[0].pk).app_date, monday)
+
+        Agenda.objects.create(patient=self.patient, practitioner=self.practitioner, office=self.office,
+                              app_date=monday + datetime.timedelta(days=1))
+        with self.assertRaises(MoveConflict) as caught:
+            move_appointments(self.office, self.practitioner, *window, target_date=tuesday)
+        self.assertEqual(len(caught.exception.conflicts), 1)
+        self.assertEqual(Agenda.objects.get(pk=rows[0].pk).app_date, monday)
+
+    def test_move_into_next_year_reflows_both_years(self):
+        tz = timezone.get_current_timezone()
+        dates = [datetime.datetime(2025, 12, 1, 10, tzinfo=tz), datetime.datetime(2025, 12, 29, 10, tzinfo=tz),
+                 datetime.datetime(2026, 1, 12, 10, tzinfo=tz)]
+        first, moved, later = rows = [
+            Agenda.objects.create(patient=self.patient, practitioner=self.practitioner, office=self.office,
+                                  pathology_category=self.category, coverage_source="annual", place="office",
+                                  is_bim=False, app_date=day)
+            for day in dates
+        ]
+        price_appointments(rows)
+        self.assertEqual(later.code_dossier, "567033")
+
+        with mock.patch("agenda.quota.ANNUAL_QUOTA", 1):
+            [result] = move_appointments(self.office, self.practitioner, dates[1], dates[1] + datetime.timedelta(hours=1),
+                                         target_date=datetime.date(2026, 1, 5))
+
+        moved.refresh_from_db()
+        later.refresh_from_db()
+        self.assertEqual((moved.code_dossier, moved.is_over_annual), ("567033", False))
+        self.assertEqual((later.code_dossier, later.honoraires_total, later.is_over_annual), (None, Decimal("30.80"), True))
+        self.assertEqual((result.code_dossier, result.is_over_annual), ("567033", False))
+        self.assertEqual(AnnualSessionCounter.planned_for(self.patient.pk, 2026, self.category.pk), 2)
+        self.assertEqual(AnnualSessionCounter.planned_for(self.patient.pk, 2025, self.category.pk), 1)
+
+    def test_move_target_must_be_a_practitioner(self):
+        secretary = User.objects.create_user(email="series-sec@carehub.test", name="Sec", surname="Série")
+        UserOfficeRole.objects.create(user=secretary, office=self.office, role="secretary")
+        serializer = AgendaMoveSerializer(data={
+            "practitioner": self.practitioner.pk, "target_practitioner": secretary.pk,
+            "start": "2025-03-03T00:00:00Z", "end": "2025-03-04T00:00:00Z",
+        }, context={"office": self.office})
+
+        self.assertFalse(serializer.is_valid())
+        self.assertIn("target_practitioner", serializer.errors)
+
+    def test_repair_restores_drifted_counters(self):
+        self._series(count=3)
+        AnnualSessionCounter.objects.update(planned=9)
+
+        call_command("repair_session_counters", dry_run=True, stdout=StringIO())
+        self.assertEqual(self._planned(), 9)
+
+        call_command("repair_session_counters", stdout=StringIO())
+        self.assertEqual(self._planned(), 3)
+
+
+class IcalFeedTests(TestCase):
+    """
+    URL du flux réservée aux praticiens actifs, révocable, revérifiée à chaque lecture.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.office = Office.objects.create(name="Cabinet", bce_number="0654", street="Rue", number_street="1",
+                                           zipcode="1000", city="Bruxelles", email="ics@carehub.test", is_paid=True)
+        cls.practitioner = User.objects.create_user(email="ics-kine@carehub.test", name="Kiné", surname="Ics")
+        cls.role = UserOfficeRole.objects.create(user=cls.practitioner, office=cls.office, role="practitioner")
+        cls.secretary = User.objects.create_user(email="ics-sec@carehub.test", name="Sec", surname="Ics")
+        UserOfficeRole.objects.create(user=cls.secretary, office=cls.office, role="secretary")
+
+    def _feed_url(self, user, method="get"):
+        client = APIClient()
+        client.force_authenticate(user)
+        response = getattr(client, method)(reverse("agenda-feed-url"), HTTP_X_OFFICE_ID=str(self.office.id))
+        return response.status_code, response.data.get("url")
+
+    def _fetch(self, url):
+        return self.client.get(url).status_code
+
+    def test_feed_url_is_restricted_to_practitioners(self):
+        status_code, _ = self._feed_url(self.secretary)
+        self.assertEqual(status_code, 403)
+
+    def test_rotation_revokes_previous_url(self):
+        _, url = self._feed_url(self.practitioner)
+        self.assertEqual(self._fetch(url), 200)
+
+        _, rotated = self._feed_url(self.practitioner, method="post")
+
+        self.assertNotEqual(rotated, url)
+        self.assertEqual(self._fetch(url), 404)
+        self.assertEqual(self._fetch(rotated), 200)
+
+    def test_inactive_role_stops_the_feed(self):
+        _, url = self._feed_url(self.practitioner)
+        UserOfficeRole.objects.filter(pk=self.role.pk).update(is_active=False)
+        self.assertEqual(self._fetch(url), 404)
+
+
+class FreeSlotsTests(TestCase):
+    def test_not_before_is_rounded_up_to_the_next_step(self):
+        day = datetime.datetime(2025, 3, 3, tzinfo=datetime.timezone.utc)
+        windows = [(day.replace(hour=8), day.replace(hour=12))]
+        busy = [(day.replace(hour=11), day.replace(hour=11, minute=30))]
+
+        slots = free_slots(busy, windows, datetime.timedelta(minutes=30), not_before=day.replace(hour=10, minute=7))
+
+        self.assertEqual([start.strftime("%H:%M") for start, _ in slots], ["10:30", "11:30"])
+
+
+class EndDateTests(TestCase):
+    """
+    La fin calculée en SQL (repli des lignes sans end_date) et la fin stockée
+    coïncident ; sync_end_dates corrige les valeurs incohérentes.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        office = Office.objects.create(name="Cabinet", bce_number="0321", street="Rue", number_street="1",
+                                       zipcode="1000", city="Bruxelles", email="ends@carehub.test")
+        cls.practitioner = User.objects.create_user(email="ends-kine@carehub.test", name="Kiné", surname="Fin")
+        patient = Patient.objects.create(name="Patient", surname="Fin", birth_date=datetime.date(1980, 1, 1),
+                                         street="Rue", street_number="1", zipcode="1000", city="Bruxelles",
+                                         telephone="0470000000", office=office)
+        cls.agenda = Agenda.objects.create(patient=patient, practitioner=cls.practitioner, office=office,
+                                           app_date=datetime.datetime(2025, 3, 3, 23, 40, tzinfo=datetime.timezone.utc),
+                                           duration_minutes=45)
+
+    def test_scheduled_end_matches_stored_end(self):
+        computed = Agenda.objects.annotate(ends=ScheduledEnd()).values_list("ends", flat=True).get()
+        self.assertEqual(computed, self.agenda.end_date)
+        self.assertEqual(computed, datetime.datetime(2025, 3, 4, 0, 25, tzinfo=datetime.timezone.utc))
+
+    def test_sync_repairs_stale_end_dates(self):
+        Agenda.objects.update(end_date=self.agenda.app_date)
+        start = self.agenda.app_date + datetime.timedelta(minutes=30)
+        self.assertFalse(overlapping_appointments(self.practitioner, start, start + datetime.timedelta(hours=1)).exists())
+
+        self.assertEqual(sync_end_dates(), 1)
+        self.assertEqual(sync_end_dates(), 0)
+        self.assertTrue(overlapping_appointments(self.practitioner, start, start + datetime.timedelta(hours=1)).exists())
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "Contrainte d'exclusion GiST : PostgreSQL uniquement.")
+class OverlapExclusionTests(TestCase):
+    def test_database_rejects_overlapping_appointments(self):
+        office = Office.objects.create(name="Cabinet", bce_number="0987", street="Rue", number_street="1",
+                                       zipcode="1000", city="Bruxelles", email="gist@carehub.test")
+        practitioner = User.objects.create_user(email="gist-kine@carehub.test", name="Kiné", surname="Gist")
+        patient = Patient.objects.create(name="Patient", surname="Gist", birth_date=datetime.date(1980, 1, 1),
+                                         street="Rue", street_number="1", zipcode="1000", city="Bruxelles",
+                                         telephone="0470000000", office=office)
+        start = datetime.datetime(2025, 3, 3, 10, tzinfo=datetime.timezone.utc)
+        Agenda.objects.create(patient=patient, practitioner=practitioner, office=office, app_date=start)
+
+        with self.assertRaisesMessage(IntegrityError, OVERLAP_CONSTRAINT), transaction.atomic():
+            Agenda.objects.create(patient=patient, practitioner=practitioner, office=office,
+                                  app_date=start + datetime.timedelta(minutes=15))
@@ -1,10 +1,13 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import AgendaViewSet
+from .streams import agenda_stream
+from .views import AgendaViewSet, ical_feed
 
 router = DefaultRouter()
 router.register(r'', AgendaViewSet, basename='agenda')
 
 urlpatterns = [
+    path('stream/', agenda_stream, name='agenda-stream'),
+    path('feed/<str:token>.ics', ical_feed, name='agenda-ical-feed'),
     path('', include(router.urls))
 ]
\ No newline at end of file
@@ -0,0 +1,83 @@
+from datetime import timedelta
+
+from django.db.models import DateTimeField, Func
+from django.db.models.functions import Coalesce
+
+from .models import Agenda, MAX_DURATION_MINUTES
+
+
+class ScheduledEnd(Func):
+    """
+    app_date + duration_minutes calculé en SQL : fin des rendez-vous dont
+    end_date n'est pas encore renseigné (lignes antérieures au champ).
+    """
+    output_field = DateTimeField()
+
+    def __init__(self, start="app_date", minutes="duration_minutes"):
+        super().__init__(start, minutes)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, template="(%(expressions)s * INTERVAL '1 minute')",
+                              arg_joiner=" + ", **extra_context)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection,
+                              template="strftime('%%%%Y-%%%%m-%%%%d %%%%H:%%%%M:%%%%S', %(expressions)s || ' minutes')",
+                              arg_joiner=", '+' || ", **extra_context)
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, template="DATE_ADD(%(expressions)s MINUTE)",
+                              arg_joiner=", INTERVAL ", **extra_context)
+
+
+def appointments_in_window(practitioner_ids, start, end, office=None):
+    """
+    Rendez-vous non annulés des praticiens qui chevauchent [start, end[,
+    annotés de leur fin `ends_at`.
+
+    Une seule requête par plage sur l'index (office, practitioner, app_date) :
+    app_date est borné par la durée maximale d'un rendez-vous, end_date stocké
+    évite tout calcul côté Python. Une ligne sans end_date (pas encore remplie,
+    voir sync_end_dates) prend app_date + duration_minutes.
+    """
+    qs = (Agenda.objects
+          .annotate(ends_at=Coalesce("end_date", ScheduledEnd()))
+          .filter(practitioner_id__in=practitioner_ids,
+                  app_date__gt=start - timedelta(minutes=MAX_DURATION_MINUTES),
+                  app_date__lt=end,
+                  ends_at__gt=start)
+          .exclude(status="cancelled"))
+    if office is not None:
+        qs = qs.filter(office=office)
+    return qs
+
+
+def overlapping_appointments(practitioner, start, end, office=None, exclude_pk=None):
+    """
+    Rendez-vous non annulés du praticien qui chevauchent [start, end[.
+    """
+    qs = appointments_in_window([getattr(practitioner, "pk", practitioner)], start, end, office=office)
+    if exclude_pk:
+        qs = qs.exclude(pk=exclude_pk)
+    return qs
+
+
+def sync_end_dates(queryset=None, batch_size=1000):
+    """
+    Recalcule end_date (app_date + durée) là où il est absent ou incohérent.
+    Retourne le nombre de rendez-vous mis à jour.
+    """
+    queryset = Agenda.objects.all() if queryset is None else queryset
+    batch, updated = [], 0
+    rows = queryset.only("id", "app_date", "duration_minutes", "end_date").order_by("id")
+    for agenda in rows.iterator(chunk_size=batch_size):
+        end_date = agenda.compute_end_date()
+        if agenda.end_date != end_date:
+            agenda.end_date = end_date
+            batch.append(agenda)
+        if len(batch) >= batch_size:
+            updated += queryset.model.objects.using(queryset.db).bulk_update(batch, ["end_date"])
+            batch = []
+    if batch:
+        updated += queryset.model.objects.using(queryset.db).bulk_update(batch, ["end_date"])
+    return updated
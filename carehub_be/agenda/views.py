@@ -1,17 +1,46 @@
+from datetime import timedelta
+
+from django.db import IntegrityError
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
 from django.utils.dateparse import parse_datetime
-from rest_framework import viewsets
+from django.urls import reverse
+from django.views.decorators.http import condition
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
 
-from accounts.models import UserOfficeRole
+from accounts.models import User, UserOfficeRole
+from billing.models import PathologyCategory
 from offices.models import Office
-from .models import Agenda
-from .serializers import AgendaSerializer
+from .models import Agenda, AgendaTombstone, TOMBSTONE_RETENTION_DAYS
+from .availability import find_free_slots
+from .ical import (
+    feed_state, feed_token, is_active_practitioner, iter_feed, practitioner_from_token, rotate_feed_key,
+)
+from .moves import MoveConflict, move_appointments
+from .simulation import simulate_pricing, simulation_window
+from .serializers import (
+    AgendaMoveSerializer, AgendaSerializer, AgendaSeriesSerializer, AvailabilityQuerySerializer,
+    PricingSimulationQuerySerializer,
+    OVERLAP_CONSTRAINT, OVERLAP_ERROR, calendar_row, calendar_rows, calendar_values,
+)
+from carehub_be.pagination import KeysetPagination
 from subscriptions.permissions import RequireActiveSubscription
 
+SYNC_CURSOR_MARGIN = timedelta(seconds=5)
+
+
+class AgendaPagination(KeysetPagination):
+    ordering = ("app_date", "id")
+
+
 class AgendaViewSet(viewsets.ModelViewSet):
     queryset = Agenda.objects.all()
     serializer_class = AgendaSerializer
     permission_classes = [IsAuthenticated, RequireActiveSubscription]
+    pagination_class = AgendaPagination
 
     def _resolve_office(self, request):
         office_id = request.headers.get('X-Office-Id') or request.query_params.get('office')
@@ -23,6 +52,13 @@ class AgendaViewSet(viewsets.ModelViewSet):
         uor = UserOfficeRole.objects.filter(user=request.user, is_active=True).order_by('id').first()
         return uor.office if uor else None
 
+    def _filter_practitioners(self, qs):
+        practitioners = self.request.query_params.get('practitioners')
+        if practitioners:
+            ids = [p for p in practitioners.split(',') if p]
+            qs = qs.filter(practitioner_id__in=ids)
+        return qs
+
     def get_queryset(self):
         office = self._resolve_office(self.request)
         qs = Agenda.objects.all()
@@ -36,19 +72,237 @@ class AgendaViewSet(viewsets.ModelViewSet):
         if end:
             qs = qs.filter(app_date__lte=parse_datetime(end))
 
-        practitioners = self.request.query_params.get('practitioners')
-        if practitioners:
-            ids = [p for p in practitioners.split(',') if p]
-            qs = qs.filter(practitioner_id__in=ids)
+        return self._filter_practitioners(qs).order_by('app_date')
+
+    def _wants_calendar(self):
+        return self.request.query_params.get('view') == 'calendar'
+
+    def _render_rows(self, queryset):
+        if self._wants_calendar():
+            return calendar_rows(queryset)
+        return self.get_serializer(queryset, many=True).data
+
+    def list(self, request, *args, **kwargs):
+        """
+        Liste des rendez-vous. `view=calendar` renvoie la projection légère du calendrier.
+        """
+        since = request.query_params.get('since')
+        if since:
+            return self._delta(request, since)
+        if self._wants_calendar():
+            queryset = calendar_values(self.filter_queryset(self.get_queryset()))
+            page = self.paginate_queryset(queryset)
+            if page is not None:
+                return self.get_paginated_response([calendar_row(row) for row in page])
+            return Response([calendar_row(row) for row in queryset])
+        return super().list(request, *args, **kwargs)
+
+    def _delta(self, request, since):
+        """
+        Synchronisation incrémentale : rendez-vous modifiés et supprimés depuis `since`.
+        La fenêtre start/end n'est pas appliquée, un rendez-vous déplacé hors de la
+        semaine affichée doit aussi remonter. Le client renvoie `cursor` au prochain appel.
+        """
+        from rest_framework.exceptions import ValidationError
+        try:
+            since_dt = parse_datetime(since)
+        except ValueError:
+            since_dt = None
+        if since_dt is None:
+            raise ValidationError({"since": "Horodatage ISO 8601 attendu."})
+        if timezone.is_naive(since_dt):
+            since_dt = timezone.make_aware(since_dt)
+
+        office = self._resolve_office(request)
+        if not office:
+            raise ValidationError({"office": "Impossible de déterminer le cabinet."})
+
+        now = timezone.now()
+        if since_dt < now - timedelta(days=TOMBSTONE_RETENTION_DAYS):
+            return Response({"reset": True, "cursor": now.isoformat(), "changed": [], "deleted": []})
+
+        # Marge pour les transactions encore ouvertes au moment de la lecture.
+        cursor = now - SYNC_CURSOR_MARGIN
 
-        return qs.order_by('app_date')
+        changed = self._filter_practitioners(Agenda.objects.filter(office=office, updated_at__gte=since_dt))
+        deleted = self._filter_practitioners(AgendaTombstone.objects.filter(office_id=office.id, deleted_at__gte=since_dt))
+
+        return Response({
+            "reset": False,
+            "cursor": cursor.isoformat(),
+            "changed": self._render_rows(changed.order_by('app_date')),
+            "deleted": list(deleted.values_list('agenda_id', flat=True)),
+        })
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in ('create', 'series', 'move'):
+            context['office'] = self._resolve_office(self.request)
+        return context
 
     def perform_create(self, serializer):
-        office = self._resolve_office(self.request)
+        office = serializer.context.get('office') or self._resolve_office(self.request)
         if not office:
             from rest_framework.exceptions import ValidationError
             raise ValidationError({"office": "Impossible de déterminer le cabinet."})
         serializer.save(office=office)
 
     def perform_update(self, serializer):
-        serializer.save()
\ No newline at end of file
+        serializer.save()
+
+    @action(detail=False, methods=['get'], url_path='availability')
+    def availability(self, request):
+        """
+        Créneaux libres par praticien.
+        Params: practitioners=1,2 & start=YYYY-MM-DD & end=YYYY-MM-DD
+                [& duration=30 & day_start=08:00 & day_end=18:00 & weekdays=0,1,2,3,4]
+        """
+        params = AvailabilityQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        p = params.validated_data
+
+        slots = find_free_slots(
+            p['practitioners'], p['start'], p['end'], p['day_start'], p['day_end'], p['duration'],
+            weekdays=p['weekdays'], office=self._resolve_office(request), not_before=timezone.now(),
+        )
+        return Response({
+            "duration": p['duration'],
+            "practitioners": [
+                {
+                    "practitioner": pid,
+                    "slots": [{"start": s, "end": e} for s, e in practitioner_slots],
+                }
+                for pid, practitioner_slots in slots.items()
+            ],
+        })
+
+    @action(detail=False, methods=['post'], url_path='series')
+    def series(self, request):
+        """
+        Crée une série récurrente, ex: {"weekdays": [1, 3], "time": "10:00", "count": 18, "start_date": ...}.
+        """
+        context = self.get_serializer_context()
+        if not context.get('office'):
+            from rest_framework.exceptions import ValidationError
+            raise ValidationError({"office": "Impossible de déterminer le cabinet."})
+        serializer = AgendaSeriesSerializer(data=request.data, context=context)
+        serializer.is_valid(raise_exception=True)
+        created = serializer.save()
+        return Response(AgendaSerializer(created, many=True).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'], url_path='move')
+    def move(self, request):
+        """
+        Déplace d'un bloc les rendez-vous d'un praticien, ex:
+        {"practitioner": 3, "start": ..., "end": ..., "target_date": "2025-03-12", "target_practitioner": 5}.
+        `dry_run=true` contrôle les conflits sans rien écrire.
+        """
+        from rest_framework.exceptions import ValidationError
+        context = self.get_serializer_context()
+        office = context.get('office')
+        if not office:
+            raise ValidationError({"office": "Impossible de déterminer le cabinet."})
+        serializer = AgendaMoveSerializer(data=request.data, context=context)
+        serializer.is_valid(raise_exception=True)
+        p = serializer.validated_data
+
+        try:
+            moved = move_appointments(
+                office, p['practitioner'], p['start'], p['end'],
+                target_date=p.get('target_date'), target_practitioner=p.get('target_practitioner'),
+                dry_run=p['dry_run'],
+            )
+        except MoveConflict as e:
+            return Response({
+                "detail": OVERLAP_ERROR,
+                "conflicts": [start.isoformat() for start, _ in e.conflicts],
+            }, status=status.HTTP_409_CONFLICT)
+        except IntegrityError as e:
+            if OVERLAP_CONSTRAINT not in str(e):
+                raise
+            return Response({"detail": OVERLAP_ERROR}, status=status.HTTP_409_CONFLICT)
+
+        if p['dry_run']:
+            return Response({"dry_run": True, "count": len(moved)})
+        return Response(AgendaSerializer(moved, many=True).data)
+
+    @action(detail=False, methods=['get'], url_path='pricing-simulation')
+    def pricing_simulation(self, request):
+        """
+        Impact d'une grille candidate sur une fenêtre passée, sans rien écrire.
+        Params: tariff_year=2026 & start=YYYY-MM-DD & end=YYYY-MM-DD
+        """
+        office = self._resolve_office(request)
+        if not office or not UserOfficeRole.objects.filter(
+            user=request.user, office=office, is_active=True, role__in=['manager', 'secretary']
+        ).exists():
+            return Response({"detail": "Réservé aux managers et secrétaires du cabinet."}, status=status.HTTP_403_FORBIDDEN)
+
+        params = PricingSimulationQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        p = params.validated_data
+
+        result = simulate_pricing(simulation_window(p['start'], p['end'], office=office), p['tariff_version'])
+
+        categories = dict(PathologyCategory.objects.filter(id__in=[c for c in result['by_category'] if c])
+                          .values_list('id', 'code'))
+        practitioners = {
+            u.pk: f"{u.name} {u.surname}"
+            for u in User.objects.filter(id__in=result['by_practitioner']).only('name', 'surname')
+        }
+        return Response({
+            "tariff_year": p['tariff_year'],
+            "tariff_version": result['tariff_version'],
+            "start": p['start'],
+            "end": p['end'],
+            "total": result['total'],
+            "by_category": [
+                {"category": cid, "code": categories.get(cid), **values}
+                for cid, values in result['by_category'].items()
+            ],
+            "by_practitioner": [
+                {"practitioner": pid, "practitioner_display": practitioners.get(pid), **values}
+                for pid, values in result['by_practitioner'].items()
+            ],
+        })
+
+    @action(detail=False, methods=['get', 'post'], url_path='feed-url')
+    def feed_url(self, request):
+        """
+        URL signée du flux .ics du praticien connecté, à ajouter dans son calendrier.
+        POST renouvelle le secret : l'URL précédente est révoquée.
+        """
+        if not is_active_practitioner(request.user.pk):
+            return Response({"detail": "Réservé aux praticiens actifs."}, status=status.HTTP_403_FORBIDDEN)
+        if request.method == 'POST':
+            rotate_feed_key(request.user)
+        path = reverse('agenda-ical-feed', kwargs={'token': feed_token(request.user)})
+        return Response({"url": request.build_absolute_uri(path)})
+
+
+def _feed_state(request, token):
+    if not hasattr(request, '_feed_state'):
+        practitioner_id = practitioner_from_token(token)
+        request._feed_practitioner = practitioner_id
+        request._feed_state = feed_state(practitioner_id) if practitioner_id else (None, None)
+    return request._feed_state
+
+
+@condition(
+    etag_func=lambda request, token: _feed_state(request, token)[1],
+    last_modified_func=lambda request, token: _feed_state(request, token)[0],
+)
+def ical_feed(request, token):
+    """
+    Flux iCalendar d'un praticien (GET conditionnel : 304 si inchangé).
+    """
+    _feed_state(request, token)
+    if not request._feed_practitioner:
+        raise Http404
+    response = StreamingHttpResponse(
+        iter_feed(request._feed_practitioner, request.get_host().split(':')[0]),
+        content_type='text/calendar; charset=utf-8',
+    )
+    response['Content-Disposition'] = 'inline; filename="carehub.ics"'
+    return response
+
@@ -0,0 +1,11 @@
+from django.contrib import admin
+
+from .models import DailyPractitionerRollup
+
+
+@admin.register(DailyPractitionerRollup)
+class DailyPractitionerRollupAdmin(admin.ModelAdmin):
+    list_display = ("day", "office", "practitioner", "scheduled_count", "completed_count", "cancelled_count", "honoraires_booked")
+    list_filter = ("office",)
+    date_hierarchy = "day"
+    readonly_fields = [f.name for f in DailyPractitionerRollup._meta.fields]
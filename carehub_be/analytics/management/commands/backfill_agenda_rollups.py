@@ -0,0 +1,26 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from analytics.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    """
+    Reconstruit les agrégats journaliers des rendez-vous depuis Agenda
+    (mise en place initiale, ou réparation après une écriture hors application).
+
+    Exemple d’exécution :
+        python manage.py backfill_agenda_rollups --office 3 --start 2025-01-01 --end 2026-01-01
+    """
+
+    help = "Reconstruit les rollups journaliers d'agenda (par cabinet, praticien et jour)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--office", default=None, help="Limiter à un cabinet")
+        parser.add_argument("--start", type=date.fromisoformat, default=None, help="Premier jour (YYYY-MM-DD)")
+        parser.add_argument("--end", type=date.fromisoformat, default=None, help="Jour de fin exclu (YYYY-MM-DD)")
+
+    def handle(self, *args, **options):
+        days = rebuild_rollups(office=options["office"], start=options["start"], end=options["end"])
+        self.stdout.write(self.style.SUCCESS(f"{days} journées praticien recalculées."))
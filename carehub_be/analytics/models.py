@@ -0,0 +1,42 @@
+from django.db import models
+
+from accounts.models import User
+from offices.models import Office
+
+
+class DailyPractitionerRollup(models.Model):
+    """
+    Agrégat journalier des rendez-vous d'un praticien dans un cabinet.
+    Maintenu par analytics.rollups à chaque écriture d'agenda ; reconstruit par
+    `manage.py backfill_agenda_rollups`. Le tableau de bord ne lit que cette table.
+    """
+    office = models.ForeignKey(Office, on_delete=models.CASCADE)
+    practitioner = models.ForeignKey(User, on_delete=models.CASCADE)
+    day = models.DateField()
+
+    scheduled_count = models.PositiveIntegerField(default=0)
+    completed_count = models.PositiveIntegerField(default=0)
+    cancelled_count = models.PositiveIntegerField(default=0)
+
+    scheduled_minutes = models.PositiveIntegerField(default=0)
+    completed_minutes = models.PositiveIntegerField(default=0)
+    cancelled_minutes = models.PositiveIntegerField(default=0)
+
+    # Montants des rendez-vous non annulés (planifiés + réalisés) et des seuls réalisés.
+    honoraires_booked = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    honoraires_completed = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    remboursement_booked = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    remboursement_completed = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["office", "practitioner", "day"], name="uniq_rollup_office_practitioner_day"),
+        ]
+        indexes = [
+            models.Index(fields=["office", "day"]),
+        ]
+
+    def __str__(self):
+        return f"{self.office_id} - {self.practitioner_id} - {self.day}"
@@ -0,0 +1,141 @@
+"""
+Maintien des agrégats journaliers (DailyPractitionerRollup).
+
+Plutôt que d'appliquer des deltas, chaque écriture d'agenda marque les
+journées touchées (cabinet, praticien, jour), avant et après modification ;
+ces journées sont recalculées depuis Agenda après commit, en une requête
+groupée, puis écrites par un seul upsert. Le recalcul est idempotent : un
+rollup manqué se répare au prochain changement ou par le backfill.
+"""
+
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from agenda.models import Agenda
+from .models import DailyPractitionerRollup
+
+ROLLUP_VALUE_FIELDS = [
+    "scheduled_count", "completed_count", "cancelled_count",
+    "scheduled_minutes", "completed_minutes", "cancelled_minutes",
+    "honoraires_booked", "honoraires_completed", "remboursement_booked", "remboursement_completed",
+]
+
+
+def slot_key(slot):
+    """
+    (office_id, practitioner_id, jour) d'un événement ou emplacement d'agenda.
+    """
+    if not slot.get("app_date"):
+        return None
+    return slot["office_id"], slot["practitioner_id"], timezone.localtime(slot["app_date"]).date()
+
+
+def _day_start(day):
+    return datetime.combine(day, time.min, tzinfo=timezone.get_current_timezone())
+
+
+def _aggregate(queryset):
+    """
+    Une requête groupée (cabinet, praticien, jour, statut) -> {clé: valeurs du rollup}.
+    """
+    rows = (queryset
+            .annotate(day=TruncDate("app_date"))
+            .values("office_id", "practitioner_id", "day", "status")
+            .annotate(n=Count("id"), minutes=Sum("duration_minutes"),
+                      honoraires=Sum("honoraires_total"), remboursement=Sum("remboursement"))
+            .order_by())
+
+    totals = defaultdict(lambda: dict.fromkeys(ROLLUP_VALUE_FIELDS, 0))
+    for row in rows:
+        values = totals[(row["office_id"], row["practitioner_id"], row["day"])]
+        status = row["status"]
+        values[f"{status}_count"] += row["n"]
+        values[f"{status}_minutes"] += row["minutes"] or 0
+        if status == "cancelled":
+            continue
+        honoraires = row["honoraires"] or Decimal("0")
+        remboursement = row["remboursement"] or Decimal("0")
+        values["honoraires_booked"] += honoraires
+        values["remboursement_booked"] += remboursement
+        if status == "completed":
+            values["honoraires_completed"] += honoraires
+            values["remboursement_completed"] += remboursement
+    return totals
+
+
+def _write(totals, stale_filter):
+    """
+    Upsert des rollups calculés ; suppression des journées devenues vides.
+    """
+    objs = [
+        DailyPractitionerRollup(office_id=office_id, practitioner_id=practitioner_id, day=day, **values)
+        for (office_id, practitioner_id, day), values in totals.items()
+    ]
+    with transaction.atomic():
+        if objs:
+            DailyPractitionerRollup.objects.bulk_create(
+                objs, batch_size=500, update_conflicts=True,
+                unique_fields=["office", "practitioner", "day"],
+                update_fields=ROLLUP_VALUE_FIELDS + ["updated_at"],
+            )
+        existing = (DailyPractitionerRollup.objects.filter(stale_filter)
+                    .values_list("id", "office_id", "practitioner_id", "day"))
+        stale = [pk for pk, *key in existing if tuple(key) not in totals]
+        if stale:
+            DailyPractitionerRollup.objects.filter(id__in=stale).delete()
+
+
+def refresh_rollups(keys):
+    """
+    Recalcule les journées données ({(office_id, practitioner_id, jour), ...}).
+    Une requête d'agrégat couvre toutes les clés, regroupées par (cabinet, praticien).
+    """
+    keys = {k for k in keys if k and all(k)}
+    if not keys:
+        return
+
+    days_by_owner = defaultdict(set)
+    for office_id, practitioner_id, day in keys:
+        days_by_owner[(office_id, practitioner_id)].add(day)
+
+    source, targets = Q(), Q()
+    for (office_id, practitioner_id), days in days_by_owner.items():
+        source |= Q(office_id=office_id, practitioner_id=practitioner_id,
+                    app_date__gte=_day_start(min(days)), app_date__lt=_day_start(max(days) + timedelta(days=1)))
+        targets |= Q(office_id=office_id, practitioner_id=practitioner_id, day__in=days)
+
+    totals = {k: v for k, v in _aggregate(Agenda.objects.filter(source)).items() if k in keys}
+    _write(totals, targets)
+
+
+def refresh_on_commit(keys):
+    keys = set(keys)
+    transaction.on_commit(lambda: refresh_rollups(keys))
+
+
+def rebuild_rollups(office=None, start=None, end=None):
+    """
+    Reconstruit les rollups d'un cabinet (ou de tous) sur [start, end[ (dates, optionnelles).
+    Retourne le nombre de journées écrites.
+    """
+    agenda = Agenda.objects.all()
+    scope = Q()
+    if office is not None:
+        agenda = agenda.filter(office_id=office)
+        scope &= Q(office_id=office)
+    if start is not None:
+        agenda = agenda.filter(app_date__gte=_day_start(start))
+        scope &= Q(day__gte=start)
+    if end is not None:
+        agenda = agenda.filter(app_date__lt=_day_start(end))
+        scope &= Q(day__lt=end)
+
+    totals = _aggregate(agenda)
+    _write(totals, scope)
+    return len(totals)
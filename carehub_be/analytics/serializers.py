@@ -0,0 +1,31 @@
+from datetime import timedelta
+
+from django.utils import timezone
+from rest_framework import serializers
+
+
+class UtilizationQuerySerializer(serializers.Serializer):
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    practitioners = serializers.CharField(required=False)
+    period = serializers.ChoiceField(choices=["week", "day"], required=False, default="week")
+
+    DEFAULT_WEEKS = 8
+    MAX_RANGE_DAYS = 366
+
+    def validate(self, attrs):
+        today = timezone.localdate()
+        end = attrs.get('end') or today + timedelta(days=1)
+        start = attrs.get('start') or end - timedelta(weeks=self.DEFAULT_WEEKS)
+        if end <= start:
+            raise serializers.ValidationError({"end": "La date de fin doit suivre la date de début."})
+        if (end - start).days > self.MAX_RANGE_DAYS:
+            raise serializers.ValidationError({"end": f"Plage limitée à {self.MAX_RANGE_DAYS} jours."})
+        attrs['start'], attrs['end'] = start, end
+
+        raw = attrs.get('practitioners')
+        try:
+            attrs['practitioners'] = [int(v) for v in raw.split(',') if v.strip()] if raw else []
+        except ValueError:
+            raise serializers.ValidationError({"practitioners": "Liste d'identifiants invalide."})
+        return attrs
@@ -0,0 +1,13 @@
+from django.dispatch import receiver
+
+from agenda.events import agenda_changed
+from .rollups import refresh_on_commit, slot_key
+
+
+@receiver(agenda_changed)
+def mark_rollups_dirty(sender, events, previous=(), **kwargs):
+    """
+    Toute écriture d'agenda (unitaire ou en masse) marque les journées
+    touchées, y compris celles que les rendez-vous déplacés ont quittées.
+    """
+    refresh_on_commit(slot_key(slot) for slot in [*events, *previous])
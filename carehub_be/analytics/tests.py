@@ -0,0 +1,113 @@
+import datetime
+from decimal import Decimal
+
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from accounts.models import User, UserOfficeRole
+from agenda.models import Agenda
+from agenda.moves import move_appointments
+from offices.models import Office
+from patients.models import Patient
+from .models import DailyPractitionerRollup
+from .rollups import rebuild_rollups
+
+MONDAY = datetime.datetime(2025, 3, 3, 10, tzinfo=datetime.timezone.utc)
+
+
+class RollupMaintenanceTests(TestCase):
+    """
+    Les rollups suivent les écritures d'agenda (signal agenda_changed, après commit),
+    y compris la journée quittée par un rendez-vous déplacé.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.office = Office.objects.create(name="Cabinet", bce_number="0123", street="Rue", number_street="1",
+                                           zipcode="1000", city="Bruxelles", email="stats@carehub.test", is_paid=True)
+        cls.practitioner = User.objects.create_user(email="stats-kine@carehub.test", name="Kiné", surname="Stats")
+        UserOfficeRole.objects.create(user=cls.practitioner, office=cls.office, role="practitioner")
+        cls.manager = User.objects.create_user(email="stats-manager@carehub.test", name="Gestion", surname="Stats")
+        UserOfficeRole.objects.create(user=cls.manager, office=cls.office, role="manager")
+        cls.patient = Patient.objects.create(name="Patient", surname="Stats", birth_date=datetime.date(1980, 1, 1),
+                                             street="Rue", street_number="1", zipcode="1000", city="Bruxelles",
+                                             telephone="0470000000", office=cls.office)
+
+    def _create(self, app_date=MONDAY, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Agenda.objects.create(patient=self.patient, practitioner=self.practitioner, office=self.office,
+                                         app_date=app_date, honoraires_total=Decimal("30.80"), **fields)
+
+    def _rollup(self, day):
+        return DailyPractitionerRollup.objects.filter(
+            office=self.office, practitioner=self.practitioner, day=day,
+        ).first()
+
+    def test_create_and_cancel_update_the_day(self):
+        agenda = self._create()
+        self._create(app_date=MONDAY + datetime.timedelta(hours=1), status="completed")
+
+        rollup = self._rollup(MONDAY.date())
+        self.assertEqual((rollup.scheduled_count, rollup.completed_count), (1, 1))
+        self.assertEqual((rollup.scheduled_minutes, rollup.honoraires_booked), (30, Decimal("61.60")))
+        self.assertEqual(rollup.honoraires_completed, Decimal("30.80"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            agenda.status = "cancelled"
+            agenda.save()
+
+        rollup.refresh_from_db()
+        self.assertEqual((rollup.scheduled_count, rollup.cancelled_count), (0, 1))
+        self.assertEqual(rollup.honoraires_booked, Decimal("30.80"))
+
+    def test_moved_appointments_leave_their_old_day(self):
+        self._create()
+        tuesday = MONDAY.date() + datetime.timedelta(days=1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            move_appointments(self.office, self.practitioner, MONDAY, MONDAY + datetime.timedelta(days=1),
+                              target_date=tuesday)
+
+        self.assertIsNone(self._rollup(MONDAY.date()))
+        self.assertEqual(self._rollup(tuesday).scheduled_count, 1)
+
+    def test_rebuild_matches_incremental_rollups(self):
+        self._create()
+        self._create(app_date=MONDAY + datetime.timedelta(days=2), status="completed")
+        incremental = list(DailyPractitionerRollup.objects.order_by("day").values("day", "scheduled_count",
+                                                                                 "completed_count"))
+        DailyPractitionerRollup.objects.all().delete()
+
+        self.assertEqual(rebuild_rollups(office=self.office.id), 2)
+
+        rebuilt = list(DailyPractitionerRollup.objects.order_by("day").values("day", "scheduled_count",
+                                                                              "completed_count"))
+        self.assertEqual(rebuilt, incremental)
+
+    def test_utilization_view_reads_rollups(self):
+        self._create()
+        self._create(app_date=MONDAY + datetime.timedelta(days=1), status="completed")
+        client = APIClient()
+        client.force_authenticate(self.manager)
+
+        response = client.get(reverse("analytics-utilization"),
+                              {"start": "2025-03-03", "end": "2025-03-10", "period": "day"},
+                              HTTP_X_OFFICE_ID=str(self.office.id))
+
+        self.assertEqual(response.status_code, 200)
+        [entry] = response.data["practitioners"]
+        self.assertEqual(entry["practitioner"], self.practitioner.id)
+        self.assertEqual([(p["scheduled"], p["completed"]) for p in entry["periods"]], [(1, 0), (0, 1)])
+        self.assertEqual(entry["periods"][0]["booked_hours"], 0.5)
+
+        weekly = client.get(reverse("analytics-utilization"), {"start": "2025-03-03", "end": "2025-03-10"},
+                            HTTP_X_OFFICE_ID=str(self.office.id))
+        [period] = weekly.data["practitioners"][0]["periods"]
+        self.assertEqual((period["scheduled"], period["completed"], period["booked_hours"]), (1, 1, 1.0))
+
+    def test_utilization_view_is_reserved_to_managers(self):
+        client = APIClient()
+        client.force_authenticate(self.practitioner)
+        response = client.get(reverse("analytics-utilization"), HTTP_X_OFFICE_ID=str(self.office.id))
+        self.assertEqual(response.status_code, 403)
@@ -0,0 +1,7 @@
+from django.urls import path
+
+from .views import UtilizationView
+
+urlpatterns = [
+    path('utilization/', UtilizationView.as_view(), name='analytics-utilization'),
+]
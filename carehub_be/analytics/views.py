@@ -0,0 +1,72 @@
+from collections import defaultdict
+
+from django.db.models import F, Sum
+from django.db.models.functions import TruncWeek
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from offices.utils import manager_office
+from subscriptions.permissions import RequireActiveSubscription
+from .models import DailyPractitionerRollup
+from .rollups import ROLLUP_VALUE_FIELDS
+from .serializers import UtilizationQuerySerializer
+
+
+def _hours(minutes):
+    return round((minutes or 0) / 60, 2)
+
+
+class UtilizationView(APIView):
+    """
+    Heures planifiées / réalisées / annulées et montants par praticien et par semaine (ou jour).
+    Lit uniquement les rollups journaliers, jamais les rendez-vous.
+    Params: [start=YYYY-MM-DD & end=YYYY-MM-DD & practitioners=1,2 & period=week|day]
+    """
+    permission_classes = [IsAuthenticated, RequireActiveSubscription]
+
+    def get(self, request):
+        office = manager_office(request)
+        if not office:
+            return Response({"detail": "Réservé aux managers et secrétaires du cabinet."}, status=403)
+
+        params = UtilizationQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        p = params.validated_data
+
+        qs = DailyPractitionerRollup.objects.filter(office=office, day__gte=p['start'], day__lt=p['end'])
+        if p['practitioners']:
+            qs = qs.filter(practitioner_id__in=p['practitioners'])
+
+        period = F('day') if p['period'] == 'day' else TruncWeek('day')
+        rows = (qs.annotate(period=period)
+                .values('practitioner_id', 'practitioner__name', 'practitioner__surname', 'period')
+                .annotate(**{field: Sum(field) for field in ROLLUP_VALUE_FIELDS})
+                .order_by('practitioner_id', 'period'))
+
+        practitioners = defaultdict(lambda: {"periods": []})
+        for row in rows:
+            entry = practitioners[row['practitioner_id']]
+            entry["practitioner"] = row['practitioner_id']
+            entry["practitioner_display"] = f"{row['practitioner__name']} {row['practitioner__surname']}"
+            entry["periods"].append({
+                "start": row['period'],
+                "scheduled": row['scheduled_count'],
+                "completed": row['completed_count'],
+                "cancelled": row['cancelled_count'],
+                "scheduled_hours": _hours(row['scheduled_minutes']),
+                "completed_hours": _hours(row['completed_minutes']),
+                "cancelled_hours": _hours(row['cancelled_minutes']),
+                "booked_hours": _hours((row['scheduled_minutes'] or 0) + (row['completed_minutes'] or 0)),
+                "honoraires_booked": row['honoraires_booked'],
+                "honoraires_completed": row['honoraires_completed'],
+                "remboursement_booked": row['remboursement_booked'],
+                "remboursement_completed": row['remboursement_completed'],
+            })
+
+        return Response({
+            "start": p['start'],
+            "end": p['end'],
+            "period": p['period'],
+            "practitioners": list(practitioners.values()),
+        })
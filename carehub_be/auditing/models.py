@@ -22,6 +22,7 @@ class AuditEvent(models.Model):
         ("OFFICE_UNARCHIVED", "Office unarchived"),
         ("LOGIN", "Login"),
         ("LOGOUT", "Logout"),
+        ("INVOICES_OVERDUE", "Invoices overdue"),
     ]
 
     event_type = models.CharField(max_length=50, choices=EVENT_TYPES)
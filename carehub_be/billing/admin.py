@@ -1,24 +1,36 @@
 from django.contrib import admin
-from .models import PathologyCategory, PathologyDetail
+from .models import PathologyCategory, PathologyDetail, TariffVersion
 
 @admin.register(PathologyCategory)
 class PathologyCategoryAdmin(admin.ModelAdmin):
     list_display = ('code','label')
     search_fields = ('code','label')
 
+@admin.register(TariffVersion)
+class TariffVersionAdmin(admin.ModelAdmin):
+    list_display = ("id", "year", "label", "effective_from", "effective_to", "source", "created_at")
+    list_filter = ("year",)
+    readonly_fields = ("created_at",)
+
 @admin.register(PathologyDetail)
 class PathologyAdmin(admin.ModelAdmin):
     list_display = (
-        "year", "category", "place",
+        "year", "version", "category", "place",
         "session_range",
         "code_presta", "code_dossier",
         "hon_presta", "hon_depla", "hon_dossier",
         "reimb_not_bim", "reimb_bim",
         "tm_not_bim", "tm_bim",
     )
-    list_filter = ("year", "category", "place")
+    list_filter = ("year", "version", "category", "place")
     search_fields = ("category__code", "category__label", "code_presta", "code_dossier")
 
+    def has_change_permission(self, request, obj=None):
+        # Un span versionné est immuable : consultation seule.
+        if obj is not None and obj.version_id:
+            return False
+        return super().has_change_permission(request, obj)
+
     @admin.display(description="Quantième")
     def session_range(self, obj: PathologyDetail):
         if obj.session_max:
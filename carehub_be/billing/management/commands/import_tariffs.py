@@ -1,133 +1,345 @@
 import csv
-from decimal import Decimal
+import io
+import sys
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
 from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
-from django.db.models import Count
+from django.db.models import Count, Q
+
+from billing.models import PathologyCategory, PathologyDetail, TariffVersion
+from billing.tariffs import bump_tariff_stamp
+
+DEFAULT_GRID = Path(__file__).resolve().parents[2] / "data" / "tariffs_2025.csv"
+# La grille fournie n'a pas de colonne year.
+DEFAULT_GRID_YEAR = 2025
+
+VALUE_FIELDS = [
+    "code_presta", "code_dossier", "code_depla",
+    "hon_presta", "hon_dossier", "hon_depla", "hon_total",
+    "reimb_not_bim", "reimb_bim", "tm_not_bim", "tm_bim",
+]
+DECIMAL_FIELDS = {
+    "hon_presta", "hon_dossier", "hon_depla", "hon_total", "reimb_not_bim", "reimb_bim", "tm_not_bim", "tm_bim",
+}
+EMPTY = (None, "", "—", "/")
+
+
+def D(x):
+    if x is None or x.strip() in EMPTY:
+        return Decimal("0.00")
+    try:
+        return Decimal(x.strip().replace(",", "."))
+    except InvalidOperation:
+        raise ValueError(f"montant invalide : {x!r}")
+
+
+def S(x):
+    if x is None or x.strip() in EMPTY:
+        return ""
+    return x.strip()
+
+
+def I(x):
+    if x is None or x.strip() in EMPTY:
+        return None
+    return int(x)
 
-from billing.models import PathologyCategory, PathologyDetail
 
 class Command(BaseCommand):
-    help ="Import/Upsert tarifss for a given year from CSV."
+    """
+    Importe une grille de tarifs INAMI depuis un CSV (chemin ou `-` pour stdin).
+
+    Colonnes : [year,] category, [category_label,] [place,] session_min, session_max,
+    code_presta, code_dossier, [code_depla,] hon_presta, hon_dossier, [hon_depla,] hon_total,
+    reimb_not_bim, reimb_bim, tm_not_bim, tm_bim
+    - year absent ou vide : --year s'applique ; place absent ou vide : "office".
+    - code_depla / hon_depla : frais de déplacement (lieu "home"), vides ou absents sinon.
+    - sans fichier : grille fournie billing/data/tariffs_2025.csv (année 2025 par défaut).
+
+    Les quantièmes sont validés par (année, catégorie, lieu) : ni trou ni chevauchement.
+    Chaque année du CSV devient une nouvelle version immuable (TariffVersion),
+    applicable à partir de --effective-from (1er janvier par défaut) ; la version
+    en vigueur à cette date est close la veille. Une grille identique à la version
+    en vigueur ne crée rien. Tout est écrit en une transaction.
+
+    Exemples d’exécution :
+        python manage.py import_tariffs
+        python manage.py import_tariffs grille_2026.csv --delimiter ";"
+        python manage.py import_tariffs correctif.csv --year 2026 --effective-from 2026-07-01 --label "Index juillet"
+        cat grille.csv | python manage.py import_tariffs - --year 2026 --dry-run
+    """
+
+    help = "Import des tarifs INAMI depuis un CSV (chemin ou stdin), en nouvelle version datée."
 
     def add_arguments(self, parser):
-        parser.add_argument("--reset", action="store_true", help="Purge les catégories et tarifs avant réimport")
-        parser.add_argument("--year", type=int, default=None, help="Filtrer par année pour les PathologyDetail")
-    
+        parser.add_argument("path", nargs="?", default=None, help="Fichier CSV, ou '-' pour stdin")
+        parser.add_argument("--reset", action="store_true",
+                            help="Purge les tarifs sans version de l'année non utilisés par des prescriptions, "
+                                 "et les catégories orphelines")
+        parser.add_argument("--year", type=int, default=None, help="Année des lignes sans colonne year (et filtre)")
+        parser.add_argument("--delimiter", default=",", help="Séparateur du CSV (par défaut ',')")
+        parser.add_argument("--dry-run", action="store_true", help="Valide et affiche le diff sans rien écrire")
+        parser.add_argument("--prune", action="store_true",
+                            help="Supprime les spans sans version absents du CSV (hors spans référencés)")
+        parser.add_argument("--effective-from", type=date.fromisoformat, default=None,
+                            help="Premier jour d'application (YYYY-MM-DD, par défaut le 1er janvier de l'année)")
+        parser.add_argument("--label", default="", help="Libellé de la version (ex: 'Index juillet')")
+
+    # --- lecture ---
+
+    def _open(self, path):
+        if path == "-":
+            return io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8-sig")
+        try:
+            return open(path or DEFAULT_GRID, newline="", encoding="utf-8-sig")
+        except OSError as e:
+            raise CommandError(f"Lecture impossible : {e}")
+
+    def _read(self, handle, delimiter, year):
+        """
+        Lit le CSV en flux ; retourne ({code: label}, {clé: valeurs}).
+        Clé d'un span : (année, code catégorie, lieu, session_min, session_max).
+        """
+        categories, spans, errors = {}, {}, []
+        for line, row in enumerate(csv.DictReader(handle, delimiter=delimiter), start=2):
+            try:
+                row_year = I(row.get("year")) or year
+                if row_year is None:
+                    raise ValueError("année absente (colonne year ou --year)")
+                if year is not None and row_year != year:
+                    continue
+
+                code = S(row.get("category"))
+                if not code:
+                    raise ValueError("catégorie absente")
+                categories.setdefault(code, S(row.get("category_label")) or "Unknown")
+
+                key = (row_year, code, S(row.get("place")) or "office", I(row.get("session_min")), I(row.get("session_max")))
+                if key[3] is None:
+                    raise ValueError("session_min absent")
+                if key in spans:
+                    raise ValueError("span en double")
+                spans[key] = {
+                    field: D(row.get(field)) if field in DECIMAL_FIELDS else S(row.get(field))
+                    for field in VALUE_FIELDS
+                }
+            except (TypeError, ValueError) as e:
+                errors.append(f"ligne {line} : {e}")
+
+        if errors:
+            raise CommandError("CSV invalide :\n" + "\n".join(errors))
+        if not spans:
+            raise CommandError("Aucune ligne de tarif à importer.")
+        return categories, spans
+
+    def _validate(self, spans):
+        """
+        Par (année, catégorie, lieu), les quantièmes doivent couvrir 1..n sans trou
+        ni chevauchement ; seul le dernier span peut être ouvert (session_max vide).
+        """
+        grids = defaultdict(list)
+        for year, code, place, smin, smax in spans:
+            grids[(year, code, place)].append((smin, smax))
+
+        errors = []
+        for (year, code, place), ranges in sorted(grids.items()):
+            label = f"{year} {code} {place}"
+            expected = 1
+            for smin, smax in sorted(ranges):
+                if smax is not None and smax < smin:
+                    errors.append(f"{label} : span {smin}-{smax} inversé")
+                if expected is None:
+                    errors.append(f"{label} : span {smin} après un span ouvert")
+                elif smin > expected:
+                    errors.append(f"{label} : trou, séances {expected}-{smin - 1} non couvertes")
+                elif smin < expected:
+                    errors.append(f"{label} : chevauchement à la séance {smin}")
+                expected = None if smax is None else smax + 1
+        if errors:
+            raise CommandError("Grille invalide :\n" + "\n".join(errors))
+        return grids
+
+    # --- écriture ---
+
+    def _upsert_categories(self, categories):
+        PathologyCategory.objects.bulk_create(
+            [PathologyCategory(code=code, label=label) for code, label in categories.items()],
+            update_conflicts=True, unique_fields=["code"], update_fields=["label"],
+        )
+        return dict(PathologyCategory.objects.filter(code__in=categories).values_list("code", "id"))
+
+    def _effective_version(self, year, day):
+        """
+        Version de l'année en vigueur à `day` (ou None), et ses spans indexés par
+        (catégorie, lieu, session_min, session_max). Sans version, les spans non
+        versionnés de l'année servent de référence.
+        """
+        version = (TariffVersion.objects
+                   .filter(year=year, effective_from__lte=day)
+                   .filter(Q(effective_to__isnull=True) | Q(effective_to__gte=day))
+                   .order_by("-effective_from", "-id")
+                   .first())
+        rows = (PathologyDetail.objects.filter(version=version) if version
+                else PathologyDetail.objects.filter(version__isnull=True, year=year))
+        return version, {
+            (row.category_id, row.place, row.session_min, row.session_max): row
+            for row in rows.select_related("category")
+        }
+
+    @staticmethod
+    def _stored(row, field):
+        # Les codes vides lus du CSV valent "" ; en base, NULL pour les lignes plus anciennes.
+        value = getattr(row, field)
+        return value if field in DECIMAL_FIELDS else value or ""
+
+    def _diff(self, year_spans, cat_ids, existing):
+        created, changed, unchanged = [], [], 0
+        for (y, code, place, smin, smax), values in year_spans.items():
+            current = existing.pop((cat_ids[code], place, smin, smax), None)
+            if current is None:
+                created.append((y, code, place, smin, smax))
+            elif any(self._stored(current, f) != v for f, v in values.items()):
+                changed.append((y, code, place, smin, smax))
+            else:
+                unchanged += 1
+        return created, changed, unchanged, list(existing.values())
+
+    def _publish(self, year, effective_from, label, source, year_spans, cat_ids):
+        """
+        Crée la version et ses spans, puis ajuste les intervalles voisins :
+        la version en cours à effective_from est close la veille, une version de
+        même début est remplacée (intervalle vide), et la nouvelle s'arrête la veille
+        d'une version future déjà importée.
+        """
+        following = (TariffVersion.objects
+                     .filter(year=year, effective_from__gt=effective_from)
+                     .order_by("effective_from").first())
+        version = TariffVersion.objects.create(
+            year=year, label=label, source=source, effective_from=effective_from,
+            effective_to=following.effective_from - timedelta(days=1) if following else None,
+        )
+        PathologyDetail.objects.bulk_create([
+            PathologyDetail(version=version, year=y, category_id=cat_ids[code], place=place,
+                            session_min=smin, session_max=smax, **values)
+            for (y, code, place, smin, smax), values in year_spans.items()
+        ], batch_size=500)
+
+        previous = TariffVersion.objects.filter(year=year).exclude(pk=version.pk)
+        previous.filter(effective_from__lt=effective_from).filter(
+            Q(effective_to__isnull=True) | Q(effective_to__gte=effective_from)
+        ).update(effective_to=effective_from - timedelta(days=1))
+        previous.filter(effective_from=effective_from).update(effective_to=effective_from - timedelta(days=1))
+        return version
+
+    def _delete_unreferenced(self, candidates):
+        """
+        Supprime les spans `candidates` qu'aucune prescription n'utilise
+        (Prescription.pathology_detail est en CASCADE). Retourne (supprimés, conservés).
+        """
+        referenced = set(PathologyDetail.objects
+                         .filter(pk__in=candidates, prescription__isnull=False)
+                         .values_list("pk", flat=True))
+        deletable = [pk for pk in candidates if pk not in referenced]
+        PathologyDetail.objects.filter(pk__in=deletable).delete()
+        return len(deletable), len(candidates) - len(deletable)
+
+    def _prune(self, obsolete):
+        """
+        Supprime les spans sans version absents du CSV, sauf ceux référencés par
+        des prescriptions. Les spans versionnés sont immuables : une nouvelle
+        version ne les reprend simplement pas.
+        """
+        candidates = [row.pk for row in obsolete if row.version_id is None]
+        if not candidates:
+            return
+        deleted, kept = self._delete_unreferenced(candidates)
+        self.stdout.write(self.style.WARNING(
+            f"{deleted} spans supprimés" + (f", {kept} conservés (référencés par des prescriptions)." if kept else ".")
+        ))
+
+    def _reset(self, year):
+        """
+        Purge les tarifs sans version de l'année et les catégories devenues inutiles.
+        Les spans et catégories encore utilisés par des prescriptions sont conservés.
+        """
+        candidates = list(PathologyDetail.objects.filter(year=year, version__isnull=True).values_list("pk", flat=True))
+        deleted, kept = self._delete_unreferenced(candidates)
+        self.stdout.write(self.style.WARNING(
+            f"Purge des tarifs {year} sans version : {deleted} lignes supprimées"
+            + (f", {kept} conservées (référencées par des prescriptions)." if kept else ".")
+        ))
+
+        orphan_qs = (PathologyCategory.objects
+                     .annotate(n=Count('agenda'))
+                     .filter(n=0)
+                     .exclude(pathologydetail__isnull=False)
+                     .exclude(prescription__isnull=False))
+        if orphan_qs.exists():
+            orphan_count = orphan_qs.count()
+            orphan_qs.delete()
+            self.stdout.write(self.style.WARNING(f"{orphan_count} catégories orphelines supprimées."))
+        else:
+            self.stdout.write("Aucune catégorie orpheline à supprimer.")
 
     @transaction.atomic
     def handle(self, *args, **options):
         year = options["year"]
-        do_reset = options["reset"]
+        if options["path"] is None and year is None:
+            year = DEFAULT_GRID_YEAR
+        with self._open(options["path"]) as handle:
+            categories, spans = self._read(handle, options["delimiter"], year)
+        self._validate(spans)
 
-        if do_reset:
-            deleted, _ = PathologyDetail.objects.filter(year=year).delete()
-            self.stdout.write(self.style.WARNING(f"Purge des tarifs {year}: {deleted} lignes supprimées."))
+        by_year = defaultdict(dict)
+        for key, values in spans.items():
+            by_year[key[0]][key] = values
+        if options["effective_from"] and len(by_year) > 1:
+            raise CommandError("--effective-from exige un CSV d'une seule année (ou --year).")
 
-            orphan_qs = PathologyCategory.objects.annotate(n=Count('agenda')).filter(n=0)
-            if orphan_qs.exists():
-                orphan_count = orphan_qs.count()
-                orphan_qs.delete()
-                self.stdout.write(self.style.WARNING(f"{orphan_count} catégories orphelines supprimées."))
-            else:
-                self.stdout.write("Aucune catégorie orpheline à supprimer.")
-
-        CATEGORIES = [
-            {"code": "PC", "label": "Courante"},
-            {"code": "FA", "label": "Aiguë"},
-            {"code": "FB", "label": "Chronique"},
-            {"code": "Pallia", "label": "Palliatif"},
-            {"code": "E", "label": "Lourde"},
-        ]
-
-        if isinstance(CATEGORIES, list):
-            cat_map = {c["code"]: c["label"] for c in CATEGORIES}
-        else:
-            cat_map = CATEGORIES
+        if options["reset"] and not options["dry_run"]:
+            for y in by_year:
+                self._reset(y)
 
-        cat_objs = {}
-        for code, label in cat_map.items():
-            obj, created = PathologyCategory.objects.update_or_create(
-                code=code,
-                defaults={"label": label},
-            )
-            cat_objs[code] = obj
-            self.stdout.write(f"- {'créé' if created else 'mis à jour'} : {obj.code} → {obj.label}")
-
-        TARIFS_2025 = [
-            # --- PC ---
-            dict(cat="PC", smin=1, smax=1, code="567011", dossier="567033",
-                 presta="30.80", hon_dossier="7.19", total="37.99", remb_nb="31.74", remb_b="35.49", tm_nb="6.25", tm_b="2.50"),
-            dict(cat="PC", smin=2, smax=9, code="567011", dossier=None,
-                 presta="30.80", hon_dossier=None, total="30.80", remb_nb="24.55", remb_b="28.30", tm_nb="6.25", tm_b="2.50"),
-            dict(cat="PC", smin=10, smax=18, code="560011", dossier=None,
-                 presta="30.80", hon_dossier=None, total="30.80", remb_nb="24.55", remb_b="28.30", tm_nb="6.25", tm_b="2.50"),
-            dict(cat="PC", smin=19, smax=None,code="560055", dossier=None,
-                 presta="30.80", hon_dossier=None, total="30.80", remb_nb="24.55", remb_b="28.30", tm_nb="6.25", tm_b="2.50"),
-
-            # --- FA ---
-            dict(cat="FA", smin=1, smax=1, code="567276", dossier="563076",
-                 presta="30.80", hon_dossier="32.86", total="63.66", remb_nb="58.16", remb_b="61.66", tm_nb="5.50", tm_b="2.00"),
-            dict(cat="FA", smin=2, smax=60, code="567276", dossier=None,
-                 presta="30.80", hon_dossier=None, total="30.80", remb_nb="25.20", remb_b="28.20", tm_nb="5.60", tm_b="2.60"),
-            dict(cat="FA", smin=61, smax=80, code="563010", dossier=None,
-                 presta="30.80", hon_dossier=None, total="25.67", remb_nb="21.37", remb_b="24.87", tm_nb="5.50", tm_b="2.00"),
-            dict(cat="FA", smin=81, smax=None, code="563054", dossier=None,
-                 presta="30.80", hon_dossier=None, total="30.80", remb_nb="25.62", remb_b="29.12", tm_nb="5.18", tm_b="2.68"),
-
-            # --- FB ---
-            dict(cat="FB", smin=1,  smax=1, code="563614", dossier="563673",
-                 presta="30.80", hon_dossier="32.86", total="63.66", remb_nb="58.16", remb_b="61.66", tm_nb="5.50", tm_b="2.00"),
-            dict(cat="FB", smin=2,  smax=60, code="563614", dossier=None,
-                 presta="30.80", hon_dossier=None, total="30.80", remb_nb="25.20", remb_b="28.20", tm_nb="5.60", tm_b="2.60"),
-            dict(cat="FB", smin=61, smax=80,  code="564270", dossier=None,
-                 presta="25.67", hon_dossier=None, total="25.67", remb_nb="21.37", remb_b="24.87", tm_nb="5.50", tm_b="2.00"),
-            dict(cat="FB", smin=81, smax=None,code="563651", dossier=None,
-                 presta="30.80", hon_dossier=None, total="30.80", remb_nb="25.62", remb_b="29.12", tm_nb="5.18", tm_b="2.68"),
-
-            # --- E (post-natal) ---
-            dict(cat="E", smin=1, smax=1, code="560652", dossier="560711",
-                 presta="30.80", hon_dossier="32.86", total="63.66", remb_nb="59.78", remb_b="62.28", tm_nb="3.88", tm_b="1.38"),
-            dict(cat="E", smin=2, smax=None, code="561013", dossier=None,
-                 presta="30.80", hon_dossier=None, total="30.80", remb_nb="29.42", remb_b="29.42", tm_nb="1.38", tm_b="1.38"),
-
-            # --- Pallia ---
-            dict(cat="Pallia", smin=1, smax=None, code="564211", dossier=None,
-                 presta=None, hon_dossier=None, total=None, remb_nb=None, remb_b=None, tm_nb=None, tm_b=None),
-        ]
-
-        def D(x):
-            if x in (None, "", "—", "/"):
-                return Decimal("0.00")
-            return Decimal(str(x).replace(",", "."))
-
-        def S(x):
-            if x in (None, "", "—", "/"):
-                return None
-            return str(x)
-        
-        count = 0
-        for row in TARIFS_2025:
-            cat = cat_objs[row["cat"]]
-            smax = row["smax"]
-
-            PathologyDetail.objects.update_or_create(
-                category=cat,
-                year=year,
-                place="office",
-                session_min=row["smin"],
-                session_max=smax,
-                defaults=dict(
-                    code_presta=S(row["code"]) or "",
-                    code_dossier=S(row["dossier"]) or "",
-                    hon_presta=D(row["presta"]),
-                    hon_dossier=D(row["hon_dossier"]),
-                    hon_total=D(row["total"]),
-                    reimb_not_bim=D(row["remb_nb"]),
-                    reimb_bim=D(row["remb_b"]),
-                    tm_not_bim=D(row["tm_nb"]),
-                    tm_bim=D(row["tm_b"]),
-                ),
+        cat_ids = self._upsert_categories(categories)
+        source = "stdin" if options["path"] == "-" else str(options["path"] or DEFAULT_GRID.name)
+
+        published = 0
+        for y, year_spans in sorted(by_year.items()):
+            effective_from = options["effective_from"] or date(y, 1, 1)
+            current, existing = self._effective_version(y, effective_from)
+            created, changed, unchanged, obsolete = self._diff(year_spans, cat_ids, existing)
+            reference = f"version {current.pk}" if current else "grille sans version"
+
+            self.stdout.write(
+                f"{y} : {len(year_spans)} spans lus, par rapport à la {reference} : {len(created)} nouveaux, "
+                f"{len(changed)} modifiés, {unchanged} inchangés, {len(obsolete)} absents du CSV."
             )
-            count += 1
+            for row in obsolete:
+                self.stdout.write(f"- absent : {row.year} {row.category.code} {row.place} {row.session_min}-{row.session_max or ''}")
+
+            if not (created or changed or obsolete):
+                self.stdout.write(f"{y} : grille identique, aucune nouvelle version.")
+                continue
+            if options["dry_run"]:
+                continue
+
+            version = self._publish(y, effective_from, options["label"], source, year_spans, cat_ids)
+            published += 1
+            self.stdout.write(self.style.SUCCESS(
+                f"{y} : version {version.pk} créée, applicable du {version.effective_from}"
+                + (f" au {version.effective_to}." if version.effective_to else ".")
+            ))
+            if options["prune"]:
+                self._prune(obsolete)
+
+        if options["dry_run"]:
+            transaction.set_rollback(True)
+            self.stdout.write(self.style.WARNING("Dry-run : aucune écriture."))
+            return
 
-        self.stdout.write(self.style.SUCCESS(f"{count} lignes tarifs {year} (cabinet) upsertées."))
+        bump_tariff_stamp()
+        self.stdout.write(self.style.SUCCESS(f"{published} version(s) de tarifs publiée(s)."))
@@ -1,3 +1,4 @@
+from django.core.exceptions import ValidationError
 from django.db import models
 
 class PathologyCategory(models.Model):
@@ -7,6 +8,48 @@ class PathologyCategory(models.Model):
     def __str__(self):
         return self.code
 
+class TariffVersion(models.Model):
+    """
+    Instantané immuable d'une grille de tarifs, applicable du `effective_from`
+    au `effective_to` inclus (ouvert si vide). Un réimport crée une nouvelle
+    version et clôt la précédente ; les spans d'une version ne sont jamais
+    modifiés ni supprimés, la retarification d'un rendez-vous passé est reproductible.
+    """
+    year = models.PositiveIntegerField()
+    label = models.CharField(max_length=120, blank=True, default="")
+    source = models.CharField(max_length=255, blank=True, default="")
+    effective_from = models.DateField()
+    effective_to = models.DateField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["effective_from", "id"]
+        indexes = [
+            models.Index(fields=["effective_from", "effective_to"]),
+        ]
+
+    def __str__(self):
+        end = self.effective_to.isoformat() if self.effective_to else "…"
+        return f"Tarifs {self.year} v{self.pk} ({self.effective_from.isoformat()} → {end})"
+
+    @property
+    def is_superseded(self):
+        return self.effective_to is not None and self.effective_to < self.effective_from
+
+
+class TariffRevision(models.Model):
+    """
+    Ligne unique (id=1) dont le compteur avance à chaque écriture de tarifs.
+    Tampon partagé par tous les processus : un worker qui lit une autre valeur
+    que la sienne recharge sa table de résolution (billing.tariffs).
+    """
+    revision = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Révision des tarifs {self.revision}"
+
+
 class PathologyDetail(models.Model):
     PLACE_CHOICES = [
         ("home", "Domicile"),
@@ -14,6 +57,7 @@ class PathologyDetail(models.Model):
     ]
 
     year = models.PositiveIntegerField(null=True, blank=True)
+    version = models.ForeignKey(TariffVersion, on_delete=models.PROTECT, null=True, blank=True, related_name="spans")
     category = models.ForeignKey(PathologyCategory, on_delete=models.CASCADE)
     session_label = models.CharField(max_length=20, blank=True, default="")
     place = models.CharField(max_length=10, choices=PLACE_CHOICES, default="home")
@@ -38,14 +82,25 @@ class PathologyDetail(models.Model):
     class Meta:
         constraints = [
             models.UniqueConstraint(
-                fields=["year", "category", "session_min", "session_max", "place"],
-                name="uniq_tariff_span_per_year_category_place",
+                fields=["version", "year", "category", "session_min", "session_max", "place"],
+                name="uniq_tariff_span_per_version_category_place",
             )
         ]
         ordering = ["year", "category__code", "place", "session_min"]
 
     def __str__(self):
-        return f"{self.category} - {self.session_number}"
+        return f"{self.category} - {self.session_min}-{self.session_max or ''}"
+
+    IMMUTABLE_ERROR = "Un tarif versionné est immuable : importez une nouvelle version."
+
+    def clean(self):
+        if self.pk and self.version_id:
+            raise ValidationError(self.IMMUTABLE_ERROR)
+
+    def save(self, *args, **kwargs):
+        if self.pk and self.version_id:
+            raise ValidationError(self.IMMUTABLE_ERROR)
+        super().save(*args, **kwargs)
     
     def calculate_invoice_data(self, is_bim: bool, is_first_session: bool):
         total = (self.hon_presta or 0) + (self.hon_depla or 0)
@@ -0,0 +1,42 @@
+"""
+Service de tarification unique : Agenda, Prescription et l'aperçu de
+tarification passent tous par price_for (table de tarifs en mémoire).
+"""
+
+from .tariffs import get_tariff
+
+
+def price_session(tariff, session_idx, is_bim: bool, over_quota: bool = False):
+    """
+    Calcule la tarification d'une séance à partir d'une ligne PathologyDetail.
+    - 1ère séance : ajoute les honoraires de dossier
+    - hors quota annuel : pas de remboursement, pas de tiers payant
+    """
+    is_first = (session_idx == 1)
+    honoraires_total = (tariff.hon_presta or 0) + (tariff.hon_depla or 0) + ((tariff.hon_dossier or 0) if is_first else 0)
+
+    remb = tariff.reimb_bim if is_bim else tariff.reimb_not_bim
+    tm = tariff.tm_bim if is_bim else tariff.tm_not_bim
+
+    if over_quota:
+        remb = 0
+        tm = honoraires_total
+    return {
+        "code_prestation": tariff.code_presta,
+        "code_dossier": tariff.code_dossier if is_first else None,
+        "honoraires_total": honoraires_total,
+        "remboursement": remb,
+        "tiers_payant": 0 if over_quota else tm,
+        "tariff_version_id": tariff.version_id,
+    }
+
+
+def price_for(day, category, place, session_idx, is_bim: bool, over_quota: bool = False, version=None):
+    """
+    Tarification de la séance n° session_idx d'une catégorie (instance ou id) à la
+    date `day`, ou None sans tarif. `version` impose une version de tarifs.
+    """
+    tariff = get_tariff(day, category, place or "home", session_idx, version=version)
+    if not tariff:
+        return None
+    return price_session(tariff, session_idx, is_bim, over_quota)
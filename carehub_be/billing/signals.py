@@ -0,0 +1,15 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import PathologyDetail
+from .tariffs import bump_tariff_stamp
+
+
+@receiver(post_save, sender=PathologyDetail)
+@receiver(post_delete, sender=PathologyDetail)
+def invalidate_tariff_index(sender, **kwargs):
+    """
+    Toute écriture unitaire sur un tarif (admin, shell) invalide l'index des workers.
+    Les imports en masse appellent bump_tariff_stamp() eux-mêmes.
+    """
+    bump_tariff_stamp()
@@ -0,0 +1,225 @@
+"""
+Table de résolution des tarifs INAMI (PathologyDetail) : date + numéro de séance -> tarif.
+
+Les tarifs sont groupés en versions immuables (TariffVersion) applicables sur
+un intervalle de dates. Une résolution se fait en deux accès mémoire :
+- la version en vigueur à la date du rendez-vous (bisect sur les débuts),
+- dans la grille (catégorie, lieu) de cette version, un tableau dense couvrant
+  les séances 1..N, plus une ligne de queue pour le span ouvert.
+
+Une version ne change jamais : sa grille est chargée une fois par processus.
+La liste des intervalles suit la révision des tarifs en base (TariffRevision),
+relue au plus toutes les TARIFF_STAMP_CHECK_SECONDS et avancée par chaque
+import ou écriture de tarif. À chaque changement, les grilles qui ne sont plus
+applicables sont libérées : la mémoire reste bornée aux versions en vigueur.
+Les spans antérieurs aux versions (version vide) forment une version implicite
+par année civile, utilisée quand aucune version ne couvre la date.
+"""
+
+import threading
+import time
+from bisect import bisect_right
+from datetime import date
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .models import PathologyDetail, TariffRevision, TariffVersion
+
+TARIFF_REVISION_ID = 1
+TARIFF_STAMP_CHECK_SECONDS = 5
+
+
+def legacy_key(year):
+    return f"legacy-{year}"
+
+
+def current_tariff_stamp():
+    """
+    Retourne la révision courante des tarifs : (compteur, horodatage), (0, None)
+    si aucune écriture. L'horodatage distingue deux écritures de même compteur
+    quand la première a été annulée (rollback) après avoir été lue localement.
+    """
+    return (TariffRevision.objects
+            .filter(pk=TARIFF_REVISION_ID)
+            .values_list("revision", "updated_at")
+            .first()) or (0, None)
+
+
+def bump_tariff_stamp():
+    """
+    Avance la révision des tarifs : tous les workers rechargent leur index.
+    À appeler dans la transaction qui écrit les tarifs.
+    """
+    updated = (TariffRevision.objects
+               .filter(pk=TARIFF_REVISION_ID)
+               .update(revision=F("revision") + 1, updated_at=timezone.now()))
+    if not updated:
+        TariffRevision.objects.get_or_create(pk=TARIFF_REVISION_ID)
+        TariffRevision.objects.filter(pk=TARIFF_REVISION_ID).update(revision=F("revision") + 1,
+                                                                    updated_at=timezone.now())
+    tariff_index.expire()
+
+
+def build_intervals():
+    """
+    Versions applicables triées par début : [(effective_from, effective_to, id, year), ...].
+    Les versions remplacées (intervalle vide) sont écartées ; les années n'ayant que
+    des spans sans version donnent une version implicite (voir legacy_key).
+    """
+    intervals = [
+        (v.effective_from, v.effective_to, v.pk, v.year)
+        for v in TariffVersion.objects.order_by("effective_from", "id")
+        if not v.is_superseded
+    ]
+    legacy_years = (PathologyDetail.objects
+                    .filter(version__isnull=True, year__isnull=False)
+                    .values_list("year", flat=True).distinct())
+    legacy = {year: legacy_key(year) for year in legacy_years}
+    return intervals, legacy
+
+
+def build_grid(version):
+    """
+    {(category_id, place): (dense, tail)} d'une version, en une requête.
+    dense[i] est le tarif de la séance i + 1 (None si la grille a un trou),
+    tail celui des séances au-delà (span ouvert) ou None.
+    """
+    qs = PathologyDetail.objects.filter(session_min__isnull=False)
+    if isinstance(version, str):
+        qs = qs.filter(version__isnull=True, year=int(version.split("-", 1)[1]))
+    else:
+        qs = qs.filter(version_id=version)
+
+    grid = {}
+    for row in qs.order_by("category_id", "place", "session_min"):
+        dense, tail = grid.setdefault((row.category_id, row.place), ([], [None]))
+        if row.session_max is None:
+            tail[0] = row
+            continue
+        if len(dense) < row.session_max:
+            dense.extend([None] * (row.session_max - len(dense)))
+        for idx in range(row.session_min, row.session_max + 1):
+            dense[idx - 1] = row
+
+    return {key: (tuple(dense), tail[0]) for key, (dense, tail) in grid.items()}
+
+
+class TariffIndex:
+    """
+    Résolution en mémoire, propre au processus.
+    - intervalles des versions : rechargés quand la révision en base change
+    - grilles : chargées une fois par version (immuables), libérées quand la
+      version n'est plus applicable
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._checked_at = None
+        self._intervals = []
+        self._starts = []
+        self._legacy = {}
+        self._grids = {}
+
+    def _check_interval(self):
+        return getattr(settings, "TARIFF_STAMP_CHECK_SECONDS", TARIFF_STAMP_CHECK_SECONDS)
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self._check_interval():
+            return
+        stamp = current_tariff_stamp()
+        self._checked_at = now
+        if stamp == self._stamp:
+            return
+        with self._lock:
+            if stamp == self._stamp:
+                return
+            self._intervals, self._legacy = build_intervals()
+            self._starts = [start for start, _, _, _ in self._intervals]
+            # Les grilles implicites (sans version) peuvent changer ; les versions, jamais.
+            # Un compteur qui n'avance pas trahit une écriture lue puis annulée : ses
+            # grilles (et ses ids, que la base peut réattribuer) sont abandonnées.
+            if self._stamp is None or stamp[0] <= self._stamp[0]:
+                self._grids = {}
+            else:
+                live = {pk for _, _, pk, _ in self._intervals}
+                self._grids = {k: v for k, v in self._grids.items() if k in live}
+            self._stamp = stamp
+
+    def expire(self):
+        """
+        Force la relecture de la révision au prochain accès (écriture locale).
+        """
+        self._checked_at = None
+
+    def invalidate(self):
+        with self._lock:
+            self._stamp = None
+            self._checked_at = None
+            self._grids = {}
+
+    def _grid(self, version):
+        grid = self._grids.get(version)
+        if grid is None:
+            grid = build_grid(version)
+            self._grids[version] = grid
+        return grid
+
+    def version_at(self, day):
+        """
+        Version en vigueur à la date `day` (id, ou clé implicite), ou None.
+        """
+        self._ensure_fresh()
+        pos = bisect_right(self._starts, day) - 1
+        while pos >= 0:
+            _, end, pk, _ = self._intervals[pos]
+            if end is None or day <= end:
+                return pk
+            pos -= 1
+        return self._legacy.get(day.year)
+
+    def version_for_year(self, year):
+        """
+        Dernière version publiée pour la grille d'une année (simulations), ou None.
+        """
+        self._ensure_fresh()
+        for _, _, pk, version_year in reversed(self._intervals):
+            if version_year == year:
+                return pk
+        return self._legacy.get(year)
+
+    def lookup(self, day, category, place, session_idx, version=None):
+        """
+        Retourne le PathologyDetail couvrant session_idx à la date `day`, ou None.
+        `category` peut être une instance PathologyCategory ou son id ;
+        `version` impose une version (ex: simulation) au lieu de la date.
+        """
+        if session_idx is None or session_idx < 1:
+            return None
+        if version is None:
+            version = self.version_at(day)
+            if version is None:
+                return None
+        else:
+            self._ensure_fresh()
+
+        grid = self._grid(version).get((getattr(category, "pk", category), place))
+        if not grid:
+            return None
+
+        dense, tail = grid
+        if session_idx <= len(dense) and dense[session_idx - 1] is not None:
+            return dense[session_idx - 1]
+        if tail is not None and session_idx >= tail.session_min:
+            return tail
+        return None
+
+
+tariff_index = TariffIndex()
+
+
+def get_tariff(day: date, category, place, session_idx, version=None):
+    return tariff_index.lookup(day, category, place, session_idx, version=version)
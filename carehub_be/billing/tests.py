@@ -1,3 +1,207 @@
-from django.test import TestCase
+import datetime
+import tempfile
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from accounts.models import User
+from offices.models import Office
+from patients.models import Patient
+from prescriptions.models import Prescription
+from .management.commands.import_tariffs import DEFAULT_GRID
+from .models import PathologyCategory, PathologyDetail, TariffVersion
+from .pricing import price_for
+from .tariffs import TariffIndex, current_tariff_stamp
+
+
+class TariffIndexTests(TestCase):
+    """
+    La révision des tarifs vit en base : un index d'un autre processus (ici une
+    seconde instance) voit un import sans partager de cache.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command("import_tariffs", year=2025, stdout=StringIO())
+        cls.category = PathologyCategory.objects.get(code="PC")
+
+    def _import_correction(self, effective_from, corrected="31.00,7.19,38.19"):
+        grid = DEFAULT_GRID.read_text(encoding="utf-8-sig").replace("30.80,7.19,37.99", corrected)
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", encoding="utf-8") as handle:
+            handle.write(grid)
+            handle.flush()
+            call_command("import_tariffs", handle.name, year=2025, effective_from=effective_from, stdout=StringIO())
+
+    @override_settings(TARIFF_STAMP_CHECK_SECONDS=0)
+    def test_other_process_sees_new_version(self):
+        index = TariffIndex()
+        march, august = datetime.date(2025, 3, 3), datetime.date(2025, 8, 4)
+        self.assertEqual(index.lookup(august, self.category, "office", 1).hon_total, Decimal("37.99"))
+        stamp = current_tariff_stamp()
+
+        self._import_correction(datetime.date(2025, 7, 1))
+
+        self.assertGreater(current_tariff_stamp(), stamp)
+        self.assertEqual(index.lookup(august, self.category, "office", 1).hon_total, Decimal("38.19"))
+        self.assertEqual(index.lookup(march, self.category, "office", 1).hon_total, Decimal("37.99"))
+
+    @override_settings(TARIFF_STAMP_CHECK_SECONDS=0)
+    def test_replaced_version_grid_is_released(self):
+        index = TariffIndex()
+        day = datetime.date(2025, 3, 3)
+        first = index.version_at(day)
+        index.lookup(day, self.category, "office", 1)
+
+        self._import_correction(datetime.date(2025, 1, 1))
+
+        self.assertNotEqual(index.version_at(day), first)
+        self.assertNotIn(first, index._grids)
+
+
+    @override_settings(TARIFF_STAMP_CHECK_SECONDS=0)
+    def test_rolled_back_import_is_not_kept(self):
+        index = TariffIndex()
+        august = datetime.date(2025, 8, 4)
+        with transaction.atomic():
+            self._import_correction(datetime.date(2025, 7, 1))
+            self.assertEqual(index.lookup(august, self.category, "office", 1).hon_total, Decimal("38.19"))
+            transaction.set_rollback(True)
+
+        self._import_correction(datetime.date(2025, 7, 1), corrected="31.20,7.19,38.39")
+
+        self.assertEqual(index.lookup(august, self.category, "office", 1).hon_total, Decimal("38.39"))
+
+class ImportTariffsTests(TestCase):
+    def _import_text(self, text, **options):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", encoding="utf-8") as handle:
+            handle.write(text)
+            handle.flush()
+            call_command("import_tariffs", handle.name, stdout=StringIO(), **options)
+
+    def test_default_grid_without_arguments(self):
+        call_command("import_tariffs", stdout=StringIO())
+
+        version = TariffVersion.objects.get()
+        self.assertEqual((version.year, version.effective_from), (2025, datetime.date(2025, 1, 1)))
+        self.assertEqual(PathologyDetail.objects.filter(version=version).count(), 15)
+
+    def test_gap_and_overlap_are_rejected(self):
+        header = "category,session_min,session_max,hon_total\n"
+        with self.assertRaisesMessage(CommandError, "trou, séances 2-2 non couvertes"):
+            self._import_text(header + "PC,1,1,37.99\nPC,3,,30.80\n", year=2025)
+        with self.assertRaisesMessage(CommandError, "chevauchement à la séance 9"):
+            self._import_text(header + "PC,1,9,37.99\nPC,9,,30.80\n", year=2025)
+        self.assertFalse(PathologyDetail.objects.exists())
+
+    def test_prune_removes_unversioned_spans_missing_from_csv(self):
+        legacy = PathologyCategory.objects.create(code="ZZ", label="Ancienne")
+        PathologyDetail.objects.create(year=2025, category=legacy, place="office", session_min=1)
+
+        call_command("import_tariffs", prune=True, stdout=StringIO())
+
+        self.assertFalse(PathologyDetail.objects.filter(category=legacy).exists())
+        self.assertEqual(PathologyDetail.objects.filter(version__isnull=False).count(), 15)
+
+
+    def test_reset_keeps_spans_used_by_prescriptions(self):
+        legacy = PathologyCategory.objects.create(code="ZZ", label="Ancienne")
+        used = PathologyDetail.objects.create(year=2025, category=legacy, place="office", session_min=1)
+        unused = PathologyDetail.objects.create(year=2025, category=legacy, place="home", session_min=1)
+        office = Office.objects.create(name="Cabinet", bce_number="0123", street="Rue", number_street="1",
+                                       zipcode="1000", city="Bruxelles", email="reset@carehub.test")
+        patient = Patient.objects.create(name="Patient", surname="Reset", birth_date=datetime.date(1980, 1, 1),
+                                         street="Rue", street_number="1", zipcode="1000", city="Bruxelles",
+                                         telephone="0470000000", office=office)
+        prescription = Prescription.objects.create(patient=patient, pathology_category=legacy, pathology_detail=used)
+
+        call_command("import_tariffs", reset=True, stdout=StringIO())
+
+        self.assertTrue(Prescription.objects.filter(pk=prescription.pk).exists())
+        self.assertTrue(PathologyDetail.objects.filter(pk=used.pk).exists())
+        self.assertFalse(PathologyDetail.objects.filter(pk=unused.pk).exists())
+
+
+    def test_home_grid_carries_the_travel_fee(self):
+        header = ("category,place,session_min,session_max,code_presta,code_dossier,code_depla,"
+                  "hon_presta,hon_dossier,hon_depla,hon_total,reimb_not_bim,reimb_bim,tm_not_bim,tm_bim\n")
+        self._import_text(header + "PC,home,1,,567114,,567136,30.80,,5.20,36.00,28.50,32.00,7.50,4.00\n", year=2025)
+
+        span = PathologyDetail.objects.get(place="home")
+        self.assertEqual((span.code_depla, span.hon_depla), ("567136", Decimal("5.20")))
+        pricing = price_for(datetime.date(2025, 3, 3), span.category, "home", 2, is_bim=False)
+        self.assertEqual(pricing["honoraires_total"], Decimal("36.00"))
+
+    def test_reimport_of_a_grid_without_travel_columns_is_unchanged(self):
+        call_command("import_tariffs", stdout=StringIO())
+        PathologyDetail.objects.update(code_depla=None)
+
+        call_command("import_tariffs", stdout=StringIO())
+
+        self.assertEqual(TariffVersion.objects.count(), 1)
+
+
+class PriceForTests(TestCase):
+    """
+    Le numéro de séance choisit la tranche (dense puis tranche ouverte finale) ;
+    hors quota, rien n'est remboursé.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command("import_tariffs", year=2025, stdout=StringIO())
+        cls.category = PathologyCategory.objects.get(code="PC")
+        cls.day = datetime.date(2025, 3, 3)
+
+    def test_session_number_selects_the_span(self):
+        first = price_for(self.day, self.category, "office", 1, is_bim=True)
+        self.assertEqual((first["code_dossier"], first["honoraires_total"]), ("567033", Decimal("37.99")))
+        self.assertEqual((first["remboursement"], first["tiers_payant"]), (Decimal("35.49"), Decimal("2.50")))
+
+        codes = [price_for(self.day, self.category.pk, "office", n, is_bim=False)["code_prestation"] for n in (2, 10, 19, 60)]
+        self.assertEqual(codes, ["567011", "560011", "560055", "560055"])
+
+    def test_over_quota_and_missing_tariffs(self):
+        over = price_for(self.day, self.category, "office", 19, is_bim=False, over_quota=True)
+        self.assertEqual((over["remboursement"], over["tiers_payant"]), (0, 0))
+        self.assertEqual(over["honoraires_total"], Decimal("30.80"))
+
+        self.assertIsNone(price_for(datetime.date(2024, 6, 1), self.category, "office", 1, is_bim=False))
+        self.assertIsNone(price_for(self.day, self.category, "office", 0, is_bim=False))
+
+
+class VersionedSpanEditTests(TestCase):
+    """
+    Un span versionné ne se modifie pas : erreur de validation, page d'admin en lecture seule.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command("import_tariffs", year=2025, stdout=StringIO())
+        cls.span = PathologyDetail.objects.filter(version__isnull=False).first()
+        cls.admin = User.objects.create_superuser(email="admin@carehub.test", password="secret", name="Admin",
+                                                  surname="Tarifs")
+
+    def test_clean_reports_a_validation_error(self):
+        self.span.hon_presta = Decimal("99.00")
+        with self.assertRaises(ValidationError):
+            self.span.full_clean()
+        with self.assertRaises(ValidationError):
+            self.span.save()
+
+    def test_admin_change_page_is_read_only(self):
+        self.client.force_login(self.admin)
+        url = reverse("admin:billing_pathologydetail_change", args=[self.span.pk])
+
+        page = self.client.get(url)
+        self.assertEqual(page.status_code, 200)
+        self.assertNotContains(page, 'name="_save"')
+
+        self.assertEqual(self.client.post(url, {"hon_presta": "99.00"}).status_code, 403)
+        self.span.refresh_from_db()
+        self.assertEqual(self.span.hon_presta, Decimal("30.80"))
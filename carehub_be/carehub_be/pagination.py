@@ -0,0 +1,130 @@
+"""
+Pagination par clé (keyset / curseur) pour les listes volumineuses.
+
+Le curseur encode les valeurs de tri de la dernière ligne servie : la page
+suivante est un `WHERE (clés) > (valeurs) ORDER BY clés LIMIT n`, servi par un
+index, donc un temps de réponse indépendant de la profondeur (contrairement à
+OFFSET). Le tri est composite et se termine par `id`, ce qui le rend strict.
+
+La pagination est opt-in : sans `cursor` ni `page_size` dans la requête,
+la liste complète est renvoyée comme avant (le front attend un tableau).
+"""
+
+import base64
+import json
+from datetime import date, datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    ordering = ("id",)
+    page_size = 50
+    max_page_size = 200
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Curseur invalide."
+
+    def _requested(self, request):
+        params = request.query_params
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    # --- curseur ---
+
+    def encode_cursor(self, values, reverse):
+        payload = [v.isoformat() if isinstance(v, (date, datetime)) else v for v in values]
+        raw = json.dumps({"p": payload, "r": int(reverse)}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            raw = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4))
+            data = json.loads(raw)
+            payload = data["p"]
+            if len(payload) != len(self.ordering):
+                raise ValueError
+            values = tuple(model._meta.get_field(f).to_python(v) for f, v in zip(self.ordering, payload))
+            return values, bool(data.get("r"))
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def _position(self, row):
+        if isinstance(row, dict):
+            return tuple(row[f] for f in self.ordering)
+        return tuple(getattr(row, f) for f in self.ordering)
+
+    def _beyond(self, values, reverse):
+        """
+        (k1, k2, k3) > (v1, v2, v3) développé en OR de préfixes égaux ; le premier
+        terme `k1 >= v1` permet au planificateur de borner le parcours d'index.
+        """
+        op = "lt" if reverse else "gt"
+        first = self.ordering[0]
+        clause = Q()
+        for i, field in enumerate(self.ordering):
+            term = Q(**{f"{field}__{op}": values[i]})
+            for prev, value in zip(self.ordering[:i], values[:i]):
+                term &= Q(**{prev: value})
+            clause |= term
+        return Q(**{f"{first}__{op}e": values[0]}) & clause
+
+    # --- pagination ---
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self._requested(request):
+            return None
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request, queryset.model)
+
+        order = [f"-{f}" if reverse else f for f in self.ordering]
+        qs = queryset.order_by(*order)
+        if position is not None:
+            qs = qs.filter(self._beyond(position, reverse))
+
+        rows = list(qs[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        self.page = rows
+        self.has_next = (position is not None) if reverse else has_more
+        self.has_previous = has_more if reverse else (position is not None)
+        return rows
+
+    def _link(self, row, reverse):
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self._position(row), reverse))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self._link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self._link(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
@@ -53,10 +53,12 @@ INSTALLED_APPS = [
     'rest_framework_simplejwt.token_blacklist',
     'accounts',
     'agenda',
+    'analytics',
     'auditing',
     'billing',
     'patients',
     'invoices',
+    'jobs',
     'offices',
     'prescriptions',
     'subscriptions',
@@ -96,6 +98,11 @@ STRIPE_WEBHOOK_SECRET = "whsec_0c32d3a283b6892eb43f59eb7b8ce9ebd3dd6912f5b7c39d0
 AUTH_USER_MODEL = 'accounts.User'
 DATA_RETENTION_YEARS = 30
 
+# File de tâches (jobs) : exécutée par `manage.py run_jobs`. En mode eager, chaque
+# tâche est exécutée dans le processus au commit (tests, développement sans worker).
+JOBS_EAGER = False
+JOBS_RETRY_BASE_SECONDS = 30
+
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -17,6 +17,7 @@ urlpatterns = [
 
     path('api/offices/', include('offices.urls')),
     path('api/agenda/', include('agenda.urls')),
+    path('api/analytics/', include('analytics.urls')),
     path('api/practitioners/', PractitionersList.as_view()),
     path('api/subscriptions/', include('subscriptions.urls')),
     path('api/prescriptions/', include('prescriptions.urls')),
@@ -1,3 +1,7 @@
 from django.contrib import admin
+from .models import InvoiceSequence
 
-# Register your models here.
+
+@admin.register(InvoiceSequence)
+class InvoiceSequenceAdmin(admin.ModelAdmin):
+    list_display = ("year", "last_number")
@@ -0,0 +1,126 @@
+"""
+Facturation mensuelle en lot d'un cabinet.
+
+Les séances réalisées (completed) du mois, sans facture, sont regroupées par
+(patient, praticien) : une facture par groupe. Le coût est fixe quel que soit
+le volume :
+- le cabinet est verrouillé (FOR UPDATE) : deux lots concurrents du même cabinet
+  s'exécutent l'un après l'autre, et le second ne voit plus les séances facturées
+  par le premier (sans ce verrou, le filtre « sans facture » de deux transactions
+  READ COMMITTED peut retenir les mêmes séances),
+- une requête verrouille les séances à facturer,
+- une requête d'agrégat calcule montant et nombre de séances par groupe,
+- un bloc de numéros (invoices.numbering),
+- un bulk_create des factures, un bulk_create des liens facture <-> séance ;
+les PDF sont ensuite rendus par la file de tâches (invoices.render_pdfs).
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, Exists, OuterRef, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from agenda.models import Agenda
+from jobs.registry import enqueue_many
+from offices.models import Office
+from .models import Invoice
+from .numbering import allocate_references
+from .tasks import PDF_JOB_CHUNK
+
+DEFAULT_DUE_DAYS = 30
+LINK_BATCH_SIZE = 1000
+
+
+def month_bounds(year, month):
+    tz = timezone.get_current_timezone()
+    start = datetime(year, month, 1, tzinfo=tz)
+    end = datetime(year + (month == 12), month % 12 + 1, 1, tzinfo=tz)
+    return start, end
+
+
+def billable_appointments(office, year, month):
+    """
+    Séances réalisées du mois, non encore liées à une facture.
+    """
+    start, end = month_bounds(year, month)
+    invoiced = Invoice.agenda.through.objects.filter(agenda_id=OuterRef("pk"))
+    return (Agenda.objects
+            .filter(office=office, status="completed", app_date__gte=start, app_date__lt=end)
+            .exclude(Exists(invoiced)))
+
+
+@transaction.atomic
+def run_monthly_invoicing(office, year, month, due_days=DEFAULT_DUE_DAYS, dry_run=False):
+    """
+    Crée les factures du mois pour `office`. Retourne
+    {"invoices": [...], "sessions": n, "amount": Decimal} ; en dry_run, les groupes
+    sont calculés mais rien n'est écrit (invoices contient des factures non enregistrées).
+    """
+    if not dry_run:
+        Office.objects.select_for_update().only("id").get(pk=office.pk)
+    qs = billable_appointments(office, year, month)
+    rows = list(qs.select_for_update().order_by("id").values_list("id", "patient_id", "practitioner_id"))
+    if not rows:
+        return {"invoices": [], "sessions": 0, "amount": Decimal("0.00")}
+
+    session_ids = defaultdict(list)
+    for pk, patient_id, practitioner_id in rows:
+        session_ids[(patient_id, practitioner_id)].append(pk)
+
+    groups = (Agenda.objects
+              .filter(pk__in=[pk for pk, _, _ in rows])
+              .values("patient_id", "practitioner_id")
+              .annotate(
+                  amount=Coalesce(Sum("honoraires_total"), Value(0, output_field=DecimalField())),
+                  sessions=Count("id"),
+              )
+              .order_by("patient_id", "practitioner_id"))
+
+    today = timezone.localdate()
+    label = f"{month:02d}/{year}"
+    invoices = [
+        Invoice(
+            patient_id=g["patient_id"],
+            practitioner_id=g["practitioner_id"],
+            due_date=today + timedelta(days=due_days),
+            amount=g["amount"],
+            description=f"Séances {label} ({g['sessions']})",
+        )
+        for g in groups
+    ]
+    summary = {
+        "invoices": invoices,
+        "sessions": len(rows),
+        "amount": sum((invoice.amount for invoice in invoices), Decimal("0.00")),
+    }
+    if dry_run:
+        return summary
+
+    for invoice, reference in zip(invoices, allocate_references(len(invoices))):
+        invoice.reference_number = reference
+    Invoice.objects.bulk_create(invoices)
+    if any(invoice.pk is None for invoice in invoices):
+        # Bases sans RETURNING sur insertion groupée : ids relus par référence.
+        ids = dict(Invoice.objects
+                   .filter(reference_number__in=[invoice.reference_number for invoice in invoices])
+                   .values_list("reference_number", "id"))
+        for invoice in invoices:
+            invoice.pk = ids[invoice.reference_number]
+
+    Link = Invoice.agenda.through
+    Link.objects.bulk_create([
+        Link(invoice_id=invoice.pk, agenda_id=agenda_id)
+        for invoice in invoices
+        for agenda_id in session_ids[(invoice.patient_id, invoice.practitioner_id)]
+    ], batch_size=LINK_BATCH_SIZE)
+
+    # PDF rendus hors transaction, par la file de tâches.
+    ids = [invoice.pk for invoice in invoices]
+    enqueue_many("invoices.render_pdfs", [
+        {"invoice_ids": ids[i:i + PDF_JOB_CHUNK]} for i in range(0, len(ids), PDF_JOB_CHUNK)
+    ])
+    return summary
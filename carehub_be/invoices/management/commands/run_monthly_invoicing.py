@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from invoices.batch import DEFAULT_DUE_DAYS, run_monthly_invoicing
+from offices.models import Office
+
+
+class Command(BaseCommand):
+    """
+    Facturation de fin de mois : pour chaque cabinet, une facture par (patient, praticien)
+    regroupant les séances réalisées du mois non encore facturées. Relançable sans
+    doublon (les séances déjà facturées sont ignorées).
+
+    Exemples d’exécution :
+        python manage.py run_monthly_invoicing                       # mois précédent, tous les cabinets
+        python manage.py run_monthly_invoicing --year 2025 --month 3 --office 3 --dry-run
+    """
+
+    help = "Crée en lot les factures mensuelles des séances réalisées."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--year", type=int, default=None, help="Année (par défaut celle du mois précédent)")
+        parser.add_argument("--month", type=int, choices=range(1, 13), default=None, metavar="1-12",
+                            help="Mois (par défaut le mois précédent)")
+        parser.add_argument("--office", default=None, help="Limiter à un cabinet")
+        parser.add_argument("--due-days", type=int, default=DEFAULT_DUE_DAYS, help="Délai de paiement en jours")
+        parser.add_argument("--dry-run", action="store_true", help="Calcule les factures sans rien écrire")
+
+    def handle(self, *args, **options):
+        year, month = options["year"], options["month"]
+        if (year is None) != (month is None):
+            raise CommandError("--year et --month vont ensemble.")
+        if year is None:
+            today = timezone.localdate()
+            year, month = (today.year, today.month - 1) if today.month > 1 else (today.year - 1, 12)
+
+        offices = Office.objects.order_by("id")
+        if options["office"]:
+            offices = offices.filter(pk=options["office"])
+
+        total_invoices = total_sessions = 0
+        for office in offices:
+            result = run_monthly_invoicing(office, year, month, due_days=options["due_days"], dry_run=options["dry_run"])
+            if not result["invoices"]:
+                continue
+            total_invoices += len(result["invoices"])
+            total_sessions += result["sessions"]
+            self.stdout.write(
+                f"{office} : {len(result['invoices'])} factures, {result['sessions']} séances, {result['amount']} €"
+            )
+
+        verb = "seraient créées" if options["dry_run"] else "créées"
+        self.stdout.write(self.style.SUCCESS(
+            f"{month:02d}/{year} : {total_invoices} factures {verb} ({total_sessions} séances)."
+        ))
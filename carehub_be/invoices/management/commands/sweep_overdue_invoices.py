@@ -0,0 +1,36 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from invoices.overdue import overdue_candidates, sweep_overdue
+
+
+class Command(BaseCommand):
+    """
+    Passe en retard (overdue) les factures en attente dont l'échéance est dépassée,
+    puis met en file les rappels aux patients. À planifier une fois par jour (cron).
+
+    Exemples d’exécution :
+        python manage.py sweep_overdue_invoices
+        python manage.py sweep_overdue_invoices --dry-run
+        python manage.py sweep_overdue_invoices --as-of 2025-04-01 --no-reminders
+    """
+
+    help = "Passe en retard les factures échues et programme les rappels."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--as-of", type=date.fromisoformat, default=None,
+                            help="Date de référence (YYYY-MM-DD, par défaut aujourd'hui)")
+        parser.add_argument("--no-reminders", action="store_true", help="Ne programme pas de rappels")
+        parser.add_argument("--dry-run", action="store_true", help="Compte les factures concernées sans rien écrire")
+
+    def handle(self, *args, **options):
+        if options["dry_run"]:
+            count = overdue_candidates(options["as_of"]).count()
+            self.stdout.write(self.style.WARNING(f"Dry-run : {count} facture(s) passeraient en retard."))
+            return
+
+        result = sweep_overdue(options["as_of"], reminders=not options["no_reminders"])
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['count']} facture(s) passée(s) en retard, {result['reminder_jobs']} lot(s) de rappels programmé(s)."
+        ))
@@ -1,9 +1,10 @@
-import datetime
-from django.db import models
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import Sum
 from patients.models import Patient
 from accounts.models import User
 from agenda.models import Agenda
-import datetime
 
 class Invoice(models.Model):
     STATE_CHOICES = [
@@ -23,24 +24,50 @@ class Invoice(models.Model):
     reference_number = models.CharField(max_length=100, unique=True, blank=True, null=True)
     description = models.TextField(blank=True, null=True)
     pdf_file = models.FileField(upload_to='invoices/', blank=True, null=True)
+    overdue_at = models.DateTimeField(blank=True, null=True,
+        help_text="Passage en retard par invoices.overdue.sweep_overdue (identifie aussi le lot).",
+    )
+    reminded_at = models.DateTimeField(blank=True, null=True,
+        help_text="Envoi du rappel de paiement (une facture n'est rappelée qu'une fois, même si la tâche est rejouée).",
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['sending_date', 'id']),
+            # Index partiel : seules les factures en attente sont balayées.
+            models.Index(fields=['state', 'due_date'], name='invoice_pending_due_idx',
+                         condition=models.Q(state='pending')),
+            models.Index(fields=['overdue_at'], name='invoice_overdue_at_idx'),
+        ]
 
     def __str__(self):
         return f"Facture {self.reference_number} - {self.patient} - {self.amount}€ - {self.state}"
     
     def calculate_total_amount(self):
-        total = sum([appt.honoraires_total or 0 for appt in self.agenda.all()])
+        total = self.agenda.aggregate(total=Sum("honoraires_total"))["total"] or Decimal("0.00")
         self.amount = total
         return total
     
     def save(self, *args, **kwargs):
-        if not self.reference_number:
-            current_year = datetime.date.today().year
-            last_invoice = Invoice.objects.filter(
-                reference_number__startswith=f"FAC - {current_year}"
-            ).order_by('id').last()
-            last_number = int(last_invoice.reference_number.split('-')[-1]) if (
-                last_invoice and last_invoice.reference_number
-            ) else 0
-            self.reference_number = f"FAC - {current_year} - {last_number + 1:04d}"
-
-        super().save(*args, **kwargs)
\ No newline at end of file
+        if self.reference_number:
+            return super().save(*args, **kwargs)
+
+        from .numbering import allocate_references
+
+        # Numéro et facture dans la même transaction : un rollback rend le numéro.
+        with transaction.atomic():
+            self.reference_number = allocate_references(1)[0]
+            super().save(*args, **kwargs)
+
+
+class InvoiceSequence(models.Model):
+    """
+    Dernier numéro de facture attribué par année (FAC - YYYY - NNNN).
+    La ligne est verrouillée (SELECT ... FOR UPDATE) le temps de la transaction
+    qui crée les factures ; voir invoices.numbering.
+    """
+    year = models.PositiveSmallIntegerField(primary_key=True)
+    last_number = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.year}: {self.last_number}"
\ No newline at end of file
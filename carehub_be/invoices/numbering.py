@@ -0,0 +1,59 @@
+"""
+Attribution des numéros de facture (FAC - YYYY - NNNN), sans trou ni doublon.
+
+Un compteur par année (InvoiceSequence) est verrouillé avec SELECT ... FOR UPDATE
+puis avancé d'un bloc de `count` numéros en une écriture. Le verrou est tenu
+jusqu'à la fin de la transaction de l'appelant, qui doit aussi insérer les
+factures : en cas de rollback le compteur revient en arrière, aucun numéro n'est
+perdu. Les facturations concurrentes attendent le verrou au lieu d'échouer sur
+la contrainte d'unicité ; une facturation en lot ne le prend qu'une fois.
+"""
+
+import re
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Invoice, InvoiceSequence
+
+REFERENCE_FORMAT = "FAC - {year} - {number:04d}"
+REFERENCE_RE = re.compile(r"^FAC - (\d{4}) - (\d+)$")
+
+
+def format_reference(year, number):
+    return REFERENCE_FORMAT.format(year=year, number=number)
+
+
+def _last_legacy_number(year):
+    """
+    Plus grand numéro déjà émis pour l'année avant la création du compteur
+    (factures numérotées par l'ancien calcul). Parcours unique, à l'initialisation.
+    """
+    last = 0
+    for reference in (Invoice.objects
+                      .filter(reference_number__startswith=f"FAC - {year} - ")
+                      .values_list("reference_number", flat=True)
+                      .iterator()):
+        match = REFERENCE_RE.match(reference)
+        if match:
+            last = max(last, int(match.group(2)))
+    return last
+
+
+@transaction.atomic
+def allocate_references(count=1, year=None):
+    """
+    Réserve `count` numéros consécutifs pour `year` (année courante par défaut)
+    et retourne leurs références. À appeler dans la transaction qui crée les factures.
+    """
+    if count < 1:
+        return []
+    year = year or timezone.localdate().year
+
+    # Valeur par défaut appelable : le parcours des anciennes références n'a lieu qu'à la création.
+    InvoiceSequence.objects.get_or_create(year=year, defaults={"last_number": lambda: _last_legacy_number(year)})
+    sequence = InvoiceSequence.objects.select_for_update().get(year=year)
+    first = sequence.last_number + 1
+    sequence.last_number += count
+    sequence.save(update_fields=["last_number"])
+    return [format_reference(year, number) for number in range(first, first + count)]
@@ -0,0 +1,51 @@
+"""
+Passage en retard des factures impayées (pending -> overdue).
+
+Un seul UPDATE ensembliste, servi par l'index partiel invoice_pending_due_idx :
+le coût suit le nombre de factures en attente, pas la taille de la table.
+L'horodatage overdue_at identifie le lot balayé ; il sert à compter les passages
+par cabinet (événement d'audit) et à mettre en file les rappels par lots.
+"""
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from auditing.utils import log_audit
+from jobs.registry import enqueue_many
+from .models import Invoice
+
+REMINDER_BATCH = 100
+
+
+def overdue_candidates(today=None):
+    return Invoice.objects.filter(state="pending", due_date__lt=today or timezone.localdate())
+
+
+@transaction.atomic
+def sweep_overdue(today=None, reminders=True, batch=REMINDER_BATCH):
+    """
+    Passe en retard les factures en attente échues avant `today`.
+    Retourne {"count": n, "by_office": {office_id: n}, "reminder_jobs": n}.
+    """
+    now = timezone.now()
+    count = overdue_candidates(today).update(state="overdue", overdue_at=now)
+    if not count:
+        return {"count": 0, "by_office": {}, "reminder_jobs": 0}
+
+    swept = Invoice.objects.filter(overdue_at=now, state="overdue")
+    by_office = dict(swept.values_list("patient__office_id").annotate(n=Count("id")).order_by())
+    log_audit(
+        "INVOICES_OVERDUE",
+        reason=f"{count} facture(s) échue(s) avant le {today or timezone.localdate()}",
+        after={"count": count, "by_office": {str(k): v for k, v in by_office.items()}, "swept_at": now.isoformat()},
+    )
+
+    jobs = []
+    if reminders:
+        ids = list(swept.filter(patient__email__isnull=False).exclude(patient__email="")
+                   .order_by("id").values_list("id", flat=True))
+        jobs = enqueue_many("invoices.send_overdue_reminders", [
+            {"invoice_ids": ids[i:i + batch]} for i in range(0, len(ids), batch)
+        ])
+    return {"count": count, "by_office": by_office, "reminder_jobs": len(jobs)}
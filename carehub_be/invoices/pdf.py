@@ -0,0 +1,179 @@
+"""
+Rendu PDF des factures, mis en cache par contenu.
+
+Le PDF ne dépend que des champs imprimés (document_fields) : leur empreinte
+SHA-256 donne le nom du fichier (invoices/ab/abcdef….pdf). Tant que ces champs
+ne changent pas, le fichier stocké est servi tel quel ; un changement (ex: facture
+payée) donne une nouvelle empreinte, donc un nouveau rendu. Deux documents
+identiques partagent le même fichier.
+
+L'export mensuel rend les PDF manquants dans un pool de processus borné et
+produit le ZIP en flux : au plus `workers * 2` rendus en vol, et chaque entrée
+est émise dès qu'elle est écrite.
+
+Ce module n'importe pas les modèles : render_pdf est exécuté dans des processus
+« spawn » qui ne configurent pas Django.
+"""
+
+import hashlib
+import json
+import os
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+PDF_LAYOUT_VERSION = 1
+PDF_DIRECTORY = "invoices"
+
+
+def document_fields(invoice):
+    """
+    Valeurs imprimées sur la facture (et seules entrées de l'empreinte).
+    """
+    return {
+        "layout": PDF_LAYOUT_VERSION,
+        "reference_number": invoice.reference_number,
+        "patient": str(invoice.patient),
+        "amount": str(invoice.amount),
+        "state": invoice.state,
+        "sending_date": invoice.sending_date.isoformat() if invoice.sending_date else None,
+        "due_date": invoice.due_date.isoformat() if invoice.due_date else None,
+        "paid_date": invoice.paid_date.isoformat() if invoice.paid_date else None,
+    }
+
+
+def document_digest(fields):
+    raw = json.dumps(fields, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def pdf_path(digest):
+    return f"{PDF_DIRECTORY}/{digest[:2]}/{digest}.pdf"
+
+
+def render_pdf(fields):
+    """
+    Rend la facture en PDF (bytes) à partir de document_fields. Fonction pure.
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4, invariant=1)
+    c.setFont("Helvetica-Bold", 16)
+    c.drawString(50, 800, f"Facture {fields['reference_number']}")
+    c.setFont("Helvetica", 12)
+    c.drawString(50, 770, f"Patient : {fields['patient']}")
+    c.drawString(50, 750, f"Montant : {fields['amount']}€")
+    c.drawString(50, 730, f"État : {fields['state']}")
+    c.drawString(50, 710, f"Date d'émission : {fields['sending_date']}")
+    c.drawString(50, 690, f"Date d'échéance : {fields['due_date']}")
+    if fields["paid_date"]:
+        c.drawString(50, 670, f"Payée : {fields['paid_date']}")
+    c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+
+def _store(path, content):
+    if not default_storage.exists(path):
+        default_storage.save(path, ContentFile(content))
+
+
+def _attach(invoice, path):
+    if invoice.pdf_file.name != path:
+        invoice.pdf_file.name = path
+        type(invoice).objects.filter(pk=invoice.pk).update(pdf_file=path)
+
+
+def ensure_pdf(invoice):
+    """
+    Retourne le chemin du PDF à jour de la facture, rendu seulement si absent du stockage.
+    """
+    path = pdf_path(document_digest(document_fields(invoice)))
+    if not default_storage.exists(path):
+        _store(path, render_pdf(document_fields(invoice)))
+    _attach(invoice, path)
+    return path
+
+
+# --- export ZIP en flux ---
+
+class _ZipChunks:
+    """
+    Flux non positionnable pour zipfile : les octets écrits sont repris par drain().
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def export_workers():
+    return int(getattr(settings, "INVOICE_PDF_EXPORT_WORKERS", 0) or min(4, os.cpu_count() or 1))
+
+
+def _documents(invoices, render):
+    """
+    (facture, chemin, contenu) dans l'ordre des factures. Les PDF en cache sont lus
+    du stockage ; les autres sont rendus par `render(fields)` qui retourne un futur.
+    """
+    window = deque()
+    limit = export_workers() * 2
+    for invoice in invoices:
+        fields = document_fields(invoice)
+        path = pdf_path(document_digest(fields))
+        if default_storage.exists(path):
+            window.append((invoice, path, None))
+        else:
+            window.append((invoice, path, render(fields)))
+        while len(window) > limit:
+            yield _resolve(*window.popleft())
+    while window:
+        yield _resolve(*window.popleft())
+
+
+def _resolve(invoice, path, future):
+    if future is None:
+        with default_storage.open(path, "rb") as handle:
+            return invoice, path, handle.read()
+    content = future.result()
+    _store(path, content)
+    return invoice, path, content
+
+
+def stream_invoices_zip(invoices):
+    """
+    Générateur des octets d'un ZIP contenant le PDF de chaque facture
+    (nommé d'après sa référence). Les rendus se font dans un pool de processus.
+    """
+    sink = _ZipChunks()
+    with ProcessPoolExecutor(max_workers=export_workers(), mp_context=get_context("spawn")) as pool:
+        with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for invoice, path, content in _documents(invoices, lambda fields: pool.submit(render_pdf, fields)):
+                _attach(invoice, path)
+                archive.writestr(f"{invoice.reference_number or invoice.pk}.pdf", content)
+                yield sink.drain()
+        yield sink.drain()
@@ -1,21 +1,24 @@
+from django.utils import timezone
 from rest_framework import serializers
 from .models import Invoice
 from agenda.models import Agenda
 
+AGENDA_MINI_FIELDS = [
+    "id",
+    "app_date",
+    "duration_minutes",
+    "honoraires_total",
+    "code_prestation",
+    "coverage_source",
+    "status",
+    "patient",
+    "practitioner",
+]
+
 class AgendaMiniSerializer(serializers.ModelSerializer):
     class Meta:
         model = Agenda
-        fields = [
-            "id",
-            "app_date",
-            "duration_minutes",
-            "honoraires_total",
-            "code_prestation",
-            "coverage_source",
-            "status",
-            "patient",
-            "practitioner",
-        ]
+        fields = AGENDA_MINI_FIELDS
 
 class InvoiceSerializer(serializers.ModelSerializer):
     agenda = serializers.PrimaryKeyRelatedField(
@@ -52,3 +55,26 @@ class InvoiceSerializer(serializers.ModelSerializer):
 
     def get_practitioner_display(self, obj):
         return str(obj.practitioner) if obj.practitioner else None
+
+
+class MonthlyInvoicingSerializer(serializers.Serializer):
+    year = serializers.IntegerField(min_value=2000, max_value=2100, required=False)
+    month = serializers.IntegerField(min_value=1, max_value=12, required=False)
+    due_days = serializers.IntegerField(min_value=0, max_value=365, required=False, default=30)
+    dry_run = serializers.BooleanField(required=False, default=False)
+
+    def validate(self, attrs):
+        # Par défaut : le mois précédent.
+        today = timezone.localdate()
+        if not attrs.get('year') and not attrs.get('month'):
+            attrs['year'], attrs['month'] = (today.year, today.month - 1) if today.month > 1 else (today.year - 1, 12)
+        elif not attrs.get('year') or not attrs.get('month'):
+            raise serializers.ValidationError("Indiquez 'year' et 'month' ensemble.")
+        if (attrs['year'], attrs['month']) > (today.year, today.month):
+            raise serializers.ValidationError({"month": "Impossible de facturer un mois futur."})
+        return attrs
+
+
+class InvoiceExportQuerySerializer(serializers.Serializer):
+    year = serializers.IntegerField(min_value=2000, max_value=2100)
+    month = serializers.IntegerField(min_value=1, max_value=12)
@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from jobs.registry import task
+from .models import Invoice
+from .pdf import ensure_pdf
+
+PDF_JOB_CHUNK = 100
+
+
+@task("invoices.render_pdfs")
+def render_pdfs(invoice_ids):
+    """
+    Pré-rend les PDF des factures (cache par contenu, voir invoices.pdf).
+    """
+    for invoice in Invoice.objects.filter(pk__in=invoice_ids).select_related("patient"):
+        ensure_pdf(invoice)
+
+
+@task("invoices.send_overdue_reminders")
+def send_overdue_reminders(invoice_ids):
+    """
+    Rappels de paiement des factures en retard, en une connexion SMTP.
+    Chaque envoi est noté (reminded_at) aussitôt : une reprise après échec ne
+    renvoie pas les rappels déjà partis. Les factures payées entre-temps sont ignorées.
+    """
+    invoices = (Invoice.objects
+                .filter(pk__in=invoice_ids, state="overdue", reminded_at__isnull=True)
+                .exclude(patient__email__isnull=True).exclude(patient__email="")
+                .select_related("patient")
+                .order_by("id"))
+    if not invoices:
+        return
+    with get_connection() as connection:
+        for invoice in invoices:
+            EmailMessage(
+                f"Rappel : facture {invoice.reference_number} en attente de paiement",
+                f"Bonjour {invoice.patient.name},\n\nLa facture {invoice.reference_number} de {invoice.amount}€ "
+                f"était payable au plus tard le {invoice.due_date:%d/%m/%Y}. Merci de procéder au paiement.",
+                settings.DEFAULT_FROM_EMAIL,
+                [invoice.patient.email],
+                connection=connection,
+            ).send()
+            Invoice.objects.filter(pk=invoice.pk).update(reminded_at=timezone.now())
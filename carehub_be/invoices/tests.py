@@ -1,3 +1,254 @@
-from django.test import TestCase
+import datetime
+import tempfile
+import threading
+import unittest
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.db import connection, connections, transaction
+from django.core.files.storage import default_storage
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from jobs.models import Job
+from jobs.worker import run_job
+from agenda.models import Agenda
+from offices.models import Office
+from patients.models import Patient
+from . import pdf
+from .batch import run_monthly_invoicing
+from .models import Invoice, InvoiceSequence
+from .numbering import allocate_references
+from .overdue import sweep_overdue
+from .tasks import send_overdue_reminders
+
+
+def _invoice_fixtures():
+    office = Office.objects.create(name="Cabinet", bce_number="0123", street="Rue", number_street="1",
+                                   zipcode="1000", city="Bruxelles", email="cabinet@carehub.test")
+    practitioner = User.objects.create_user(email="kine@carehub.test", name="Kiné", surname="Test")
+    patient = Patient.objects.create(name="Patient", surname="Test", birth_date=datetime.date(1980, 1, 1),
+                                     street="Rue", street_number="1", zipcode="1000", city="Bruxelles",
+                                     telephone="0470000000", office=office)
+    return patient, practitioner
+
+
+class ReferenceAllocationTests(TestCase):
+    def test_continues_legacy_numbering_and_allocates_blocks(self):
+        patient, practitioner = _invoice_fixtures()
+        Invoice.objects.create(patient=patient, practitioner=practitioner, due_date=datetime.date(2025, 2, 1),
+                               reference_number="FAC - 2025 - 0041")
+
+        self.assertEqual(allocate_references(1, year=2025), ["FAC - 2025 - 0042"])
+        self.assertEqual(allocate_references(3, year=2025),
+                         ["FAC - 2025 - 0043", "FAC - 2025 - 0044", "FAC - 2025 - 0045"])
+        self.assertEqual(allocate_references(1, year=2026), ["FAC - 2026 - 0001"])
+
+    def test_rollback_returns_numbers(self):
+        with transaction.atomic():
+            allocate_references(5, year=2025)
+            transaction.set_rollback(True)
+        self.assertEqual(allocate_references(1, year=2025), ["FAC - 2025 - 0001"])
+
+
+@unittest.skipUnless(connection.features.has_select_for_update and connection.vendor != "sqlite",
+                     "Verrous de ligne concurrents requis (PostgreSQL/MySQL).")
+class ReferenceAllocationStressTest(TransactionTestCase):
+    """
+    Facturations concurrentes : chaque thread crée des factures dans sa propre
+    transaction ; les numéros doivent être uniques et contigus.
+    """
+    THREADS = 16
+    PER_THREAD = 10
+
+    def test_concurrent_invoices_get_gapless_numbers(self):
+        patient, practitioner = _invoice_fixtures()
+        year = datetime.date.today().year
+        barrier = threading.Barrier(self.THREADS)
+        errors = []
+
+        def worker():
+            try:
+                barrier.wait()
+                for n in range(self.PER_THREAD):
+                    if n % 2:
+                        Invoice.objects.create(patient=patient, practitioner=practitioner,
+                                               due_date=datetime.date.today())
+                        continue
+                    # Lot : un bloc de 3 numéros, insertion groupée.
+                    with transaction.atomic():
+                        Invoice.objects.bulk_create([
+                            Invoice(patient=patient, practitioner=practitioner,
+                                    due_date=datetime.date.today(), reference_number=reference)
+                            for reference in allocate_references(3, year=year)
+                        ])
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.THREADS)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(errors, [])
+        expected = self.THREADS * (self.PER_THREAD // 2) * (1 + 3)
+        references = set(Invoice.objects.values_list("reference_number", flat=True))
+        self.assertEqual(references, {f"FAC - {year} - {n:04d}" for n in range(1, expected + 1)})
+        self.assertEqual(InvoiceSequence.objects.get(year=year).last_number, expected)
+
+
+class InvoiceListQueryCountTests(TestCase):
+    """
+    La liste des factures coûte un nombre fixe de requêtes, quel que soit le
+    nombre de factures et de séances par facture.
+    """
+    QUERIES = 2  # factures (+ patient, praticien) ; séances préchargées
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient, cls.practitioner = _invoice_fixtures()
+        cls.office = cls.patient.office
+
+    def _create_invoices(self, count, sessions):
+        start = timezone.make_aware(datetime.datetime(2025, 3, 3, 8, 0))
+        offset = Agenda.objects.count()
+        for i in range(count):
+            appointments = [
+                Agenda(office=self.office, practitioner=self.practitioner, patient=self.patient,
+                       app_date=start + datetime.timedelta(hours=offset + i * sessions + n),
+                       status="completed", honoraires_total=Decimal("30.00"))
+                for n in range(sessions)
+            ]
+            for agenda in appointments:
+                agenda.end_date = agenda.compute_end_date()
+            appointments = Agenda.objects.bulk_create(appointments)
+            invoice = Invoice.objects.create(patient=self.patient, practitioner=self.practitioner,
+                                             due_date=datetime.date(2025, 4, 1))
+            invoice.agenda.set(appointments)
+
+    def _list(self):
+        client = APIClient()
+        client.force_authenticate(self.practitioner)
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get("/api/invoices/")
+        self.assertEqual(response.status_code, 200)
+        return response.json(), len(ctx.captured_queries)
+
+    def test_list_query_count_is_constant(self):
+        self._create_invoices(2, sessions=1)
+        small, small_queries = self._list()
+
+        self._create_invoices(20, sessions=5)
+        large, large_queries = self._list()
+
+        self.assertEqual(len(small), 2)
+        self.assertEqual(len(large), 22)
+        self.assertEqual(len(large[-1]["agenda_details"]), 5)
+        self.assertEqual(small_queries, self.QUERIES)
+        self.assertEqual(large_queries, self.QUERIES)
+
+    def test_total_amount_is_summed_in_sql(self):
+        self._create_invoices(1, sessions=4)
+        invoice = Invoice.objects.get()
+        with self.assertNumQueries(1):
+            self.assertEqual(invoice.calculate_total_amount(), Decimal("120.00"))
+
+
+class MonthlyInvoicingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient, cls.practitioner = _invoice_fixtures()
+        cls.office = cls.patient.office
+        start = datetime.datetime(2025, 3, 3, 10, tzinfo=datetime.timezone.utc)
+        for i, status in enumerate(["completed", "completed", "scheduled"]):
+            Agenda.objects.create(patient=cls.patient, practitioner=cls.practitioner, office=cls.office,
+                                  app_date=start + datetime.timedelta(days=7 * i), status=status,
+                                  honoraires_total=Decimal("30.80"))
+
+    def test_one_invoice_per_group_and_no_double_billing(self):
+        first = run_monthly_invoicing(self.office, 2025, 3)
+        second = run_monthly_invoicing(self.office, 2025, 3)
+
+        self.assertEqual((first["sessions"], first["amount"]), (2, Decimal("61.60")))
+        [invoice] = first["invoices"]
+        self.assertEqual(invoice.agenda.count(), 2)
+        self.assertEqual(second["sessions"], 0)
+        self.assertEqual(Invoice.objects.count(), 1)
+
+    def test_dry_run_writes_nothing(self):
+        result = run_monthly_invoicing(self.office, 2025, 3, dry_run=True)
+        self.assertEqual(result["sessions"], 2)
+        self.assertFalse(Invoice.objects.exists())
+
+
+class OverdueSweepTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient, cls.practitioner = _invoice_fixtures()
+        Patient.objects.filter(pk=cls.patient.pk).update(email="patient@carehub.test")
+        cls.late = Invoice.objects.create(patient=cls.patient, practitioner=cls.practitioner,
+                                          due_date=datetime.date(2025, 3, 31))
+        cls.not_due = Invoice.objects.create(patient=cls.patient, practitioner=cls.practitioner,
+                                             due_date=datetime.date(2025, 4, 30))
+
+    def test_sweep_marks_overdue_and_reminds_once(self):
+        result = sweep_overdue(today=datetime.date(2025, 4, 1))
+
+        self.assertEqual((result["count"], result["reminder_jobs"]), (1, 1))
+        self.late.refresh_from_db()
+        self.not_due.refresh_from_db()
+        self.assertEqual((self.late.state, self.not_due.state), ("overdue", "pending"))
+
+        job = Job.objects.get(name="invoices.send_overdue_reminders")
+        self.assertTrue(run_job(job.pk))
+        # Reprise de la même tâche : le rappel déjà envoyé n'est pas renvoyé.
+        send_overdue_reminders(**job.payload)
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["patient@carehub.test"])
+        self.late.refresh_from_db()
+        self.assertIsNotNone(self.late.reminded_at)
+
+    def test_second_sweep_finds_nothing(self):
+        sweep_overdue(today=datetime.date(2025, 4, 1), reminders=False)
+        self.assertEqual(sweep_overdue(today=datetime.date(2025, 4, 1))["count"], 0)
+
+
+class InvoicePdfCacheTests(TestCase):
+    """
+    Le PDF est nommé d'après l'empreinte des champs imprimés : rendu une seule
+    fois tant qu'ils ne changent pas, rendu à nouveau quand la facture change.
+    """
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        patient, practitioner = _invoice_fixtures()
+        self.invoice = Invoice.objects.create(patient=patient, practitioner=practitioner, amount=Decimal("61.60"),
+                                              due_date=datetime.date(2025, 3, 31))
+
+    def test_pdf_is_rendered_once_per_content(self):
+        with mock.patch.object(pdf, "render_pdf", wraps=pdf.render_pdf) as render:
+            path = pdf.ensure_pdf(self.invoice)
+            self.assertEqual(pdf.ensure_pdf(self.invoice), path)
+            self.assertEqual(render.call_count, 1)
+
+            self.invoice.state = "paid"
+            self.invoice.paid_date = datetime.date(2025, 3, 20)
+            paid_path = pdf.ensure_pdf(self.invoice)
+            self.assertEqual(render.call_count, 2)
+
+        self.assertNotEqual(paid_path, path)
+        self.assertTrue(default_storage.exists(path) and default_storage.exists(paid_path))
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.pdf_file.name, paid_path)
+        with default_storage.open(paid_path, "rb") as handle:
+            self.assertTrue(handle.read().startswith(b"%PDF"))
@@ -1,6 +1,7 @@
 import datetime
-from io import BytesIO
-from django.http import HttpResponse
+from django.db.models import Prefetch, Sum
+from django.core.files.storage import default_storage
+from django.http import FileResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 
 from rest_framework import viewsets
@@ -9,20 +10,35 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes, action
 
+from .batch import month_bounds, run_monthly_invoicing
 from .models import Invoice
+from .pdf import ensure_pdf, stream_invoices_zip
 from .policy import compute_amount_and_description
-from .serializers import InvoiceSerializer
+from .serializers import (
+    AGENDA_MINI_FIELDS, InvoiceExportQuerySerializer, InvoiceSerializer, MonthlyInvoicingSerializer,
+)
 from agenda.models import Agenda
+from carehub_be.pagination import KeysetPagination
+from offices.utils import manager_office
 from patients.models import Patient
 
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
+
+class InvoicePagination(KeysetPagination):
+    ordering = ("sending_date", "id")
 
 
 class InvoiceViewSet(viewsets.ModelViewSet):
-    queryset = Invoice.objects.all()
+    # Liste en requêtes constantes : patient/praticien joints, séances préchargées
+    # en une requête limitée aux champs de AgendaMiniSerializer.
+    queryset = (Invoice.objects
+                .select_related('patient', 'practitioner')
+                .prefetch_related(Prefetch(
+                    'agenda',
+                    queryset=Agenda.objects.only(*AGENDA_MINI_FIELDS),
+                )))
     serializer_class = InvoiceSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = InvoicePagination
 
     lookup_value_regex = r'\d+'
 
@@ -45,14 +61,12 @@ class InvoiceViewSet(viewsets.ModelViewSet):
         if not appointments.exists():
             return Response({"error": "Aucun rendez-vous valide pour ce patient."}, status=404)
         
-        invoice = Invoice(patient=patient, practitioner=practitioner, due_date=due_date, amount=0)
+        amount = appointments.aggregate(total=Sum('honoraires_total'))['total'] or 0
+        invoice = Invoice(patient=patient, practitioner=practitioner, due_date=due_date, amount=amount)
         invoice.save()
 
         invoice.agenda.set(appointments)
 
-        invoice.calculate_total_amount()
-        invoice.save(update_fields=['amount'])
-
         return Response({
             "invoice_id": invoice.id,
             "reference_number": invoice.reference_number,
@@ -60,6 +74,65 @@ class InvoiceViewSet(viewsets.ModelViewSet):
             "state": invoice.state
         }, status=201)
 
+    @action(detail=False, methods=['post'], url_path='monthly-run')
+    def monthly_run(self, request):
+        """
+        Facturation du mois pour le cabinet : une facture par (patient, praticien)
+        regroupant les séances réalisées non facturées.
+        Body: [year, month (mois précédent par défaut), due_days=30, dry_run=false]
+        """
+        office = manager_office(request)
+        if not office:
+            return Response({"detail": "Réservé aux managers et secrétaires du cabinet."}, status=403)
+
+        params = MonthlyInvoicingSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        p = params.validated_data
+
+        result = run_monthly_invoicing(office, p['year'], p['month'], due_days=p['due_days'], dry_run=p['dry_run'])
+        return Response({
+            "year": p['year'],
+            "month": p['month'],
+            "dry_run": p['dry_run'],
+            "sessions": result['sessions'],
+            "amount": result['amount'],
+            "invoices": [
+                {
+                    "id": invoice.pk,
+                    "reference_number": invoice.reference_number,
+                    "patient": invoice.patient_id,
+                    "practitioner": invoice.practitioner_id,
+                    "amount": invoice.amount,
+                    "description": invoice.description,
+                }
+                for invoice in result['invoices']
+            ],
+        }, status=200 if p['dry_run'] else 201)
+
+    @action(detail=False, methods=['get'], url_path='export')
+    def export(self, request):
+        """
+        ZIP des PDF des factures émises dans le mois par le cabinet, produit en flux.
+        Params: year=2025 & month=3
+        """
+        office = manager_office(request)
+        if not office:
+            return Response({"detail": "Réservé aux managers et secrétaires du cabinet."}, status=403)
+
+        params = InvoiceExportQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        p = params.validated_data
+
+        start, end = month_bounds(p['year'], p['month'])
+        invoices = (Invoice.objects
+                    .filter(patient__office=office, sending_date__gte=start.date(), sending_date__lt=end.date())
+                    .select_related('patient')
+                    .order_by('sending_date', 'id')
+                    .iterator(chunk_size=500))
+        response = StreamingHttpResponse(stream_invoices_zip(invoices), content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="factures-{p["year"]}-{p["month"]:02d}.zip"'
+        return response
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def mark_paid(request, pk):
@@ -72,26 +145,7 @@ def mark_paid(request, pk):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def download_invoice(request, pk):
-    invoice = get_object_or_404(Invoice, pk=pk)
-
-    buffer = BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
-    c.setFont("Helvetica-Bold", 16)
-    c.drawString(50, 800, f"Facture {invoice.reference_number}")
-    c.setFont("Helvetica", 12)
-    c.drawString(50, 770, f"Patient : {invoice.patient}")
-    c.drawString(50, 750, f"Montant : {invoice.amount}€")
-    c.drawString(50, 730, f"État : {invoice.state}")
-    c.drawString(50, 710, f"Date d'émission : {invoice.sending_date}")
-    c.drawString(50, 690, f"Date d'échéance : {invoice.due_date}")
-    if invoice.paid_date:
-        c.drawString(50, 670, f"Payée : {invoice.paid_date}")
-    c.showPage()
-    c.save()
-
-    pdf = buffer.getvalue()
-    buffer.close()
-
-    response = HttpResponse(pdf, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="{invoice.reference_number}.pdf"'
-    return response
\ No newline at end of file
+    invoice = get_object_or_404(Invoice.objects.select_related('patient'), pk=pk)
+    path = ensure_pdf(invoice)
+    return FileResponse(default_storage.open(path, 'rb'), as_attachment=True,
+                        filename=f"{invoice.reference_number}.pdf", content_type='application/pdf')
@@ -0,0 +1,17 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("id", "name", "status", "attempts", "max_attempts", "run_at", "created_at", "finished_at")
+    list_filter = ("status", "name")
+    search_fields = ("name",)
+    readonly_fields = ("created_at", "finished_at", "locked_at", "last_error")
+    actions = ["retry_now"]
+
+    @admin.action(description="Relancer maintenant")
+    def retry_now(self, request, queryset):
+        queryset.exclude(status="running").update(status="pending", run_at=timezone.now(), attempts=0)
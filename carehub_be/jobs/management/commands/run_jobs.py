@@ -0,0 +1,46 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+
+from jobs.worker import run_pending
+
+
+class Command(BaseCommand):
+    """
+    Worker de la file de tâches : réclame les tâches dues par lots et les exécute.
+    Plusieurs workers peuvent tourner en parallèle (FOR UPDATE SKIP LOCKED).
+
+    Exemples d’exécution :
+        python manage.py run_jobs                 # boucle (service)
+        python manage.py run_jobs --once          # vide la file puis s'arrête (cron)
+    """
+
+    help = "Exécute les tâches différées (e-mails, Stripe, PDF)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="S'arrête quand la file est vide")
+        parser.add_argument("--batch", type=int, default=10, help="Tâches réclamées par lot")
+        parser.add_argument("--sleep", type=float, default=2.0, help="Attente (s) quand la file est vide")
+
+    def handle(self, *args, **options):
+        self._stop = False
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+
+        total_ok = total_failed = 0
+        while not self._stop:
+            ok, failed = run_pending(options["batch"])
+            total_ok += ok
+            total_failed += failed
+            if ok or failed:
+                continue
+            if options["once"]:
+                break
+            time.sleep(options["sleep"])
+
+        self.stdout.write(self.style.SUCCESS(f"{total_ok} tâches exécutées, {total_failed} en échec."))
+
+    def _request_stop(self, signum, frame):
+        # Termine le lot en cours avant de s'arrêter.
+        self._stop = True
@@ -0,0 +1,63 @@
+"""
+Déclaration et mise en file des tâches.
+
+    @task("accounts.send_invitation")
+    def send_invitation(email, ...): ...
+
+    enqueue("accounts.send_invitation", email=..., ...)
+
+Le payload doit être sérialisable en JSON (ids plutôt qu'instances). La tâche
+peut être rejouée : elle doit être idempotente.
+
+Avec JOBS_EAGER = True (tests, développement), la tâche est exécutée dans le
+processus au commit de la transaction, avec la même gestion d'erreur qu'un worker.
+"""
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Job
+
+TASKS = {}
+
+
+def task(name, max_attempts=5):
+    def register(func):
+        if name in TASKS:
+            raise ValueError(f"Tâche déjà déclarée : {name}")
+        func.job_name = name
+        func.max_attempts = max_attempts
+        TASKS[name] = func
+        return func
+    return register
+
+
+def enqueue(name, run_at=None, **payload):
+    """
+    Ajoute la tâche `name` à la file ; retourne le Job.
+    """
+    if name not in TASKS:
+        raise KeyError(f"Tâche inconnue : {name}")
+    job = Job(name=name, payload=payload, max_attempts=TASKS[name].max_attempts)
+    if run_at is not None:
+        job.run_at = run_at
+    job.save()
+
+    if getattr(settings, "JOBS_EAGER", False):
+        from .worker import run_job
+        transaction.on_commit(lambda: run_job(job.pk))
+    return job
+
+
+def enqueue_many(name, payloads):
+    """
+    Mise en file groupée (un INSERT) d'une tâche pour plusieurs payloads.
+    """
+    if name not in TASKS:
+        raise KeyError(f"Tâche inconnue : {name}")
+    if getattr(settings, "JOBS_EAGER", False):
+        return [enqueue(name, **payload) for payload in payloads]
+    return Job.objects.bulk_create(
+        [Job(name=name, payload=payload, max_attempts=TASKS[name].max_attempts) for payload in payloads],
+        batch_size=500,
+    )
@@ -0,0 +1,85 @@
+from datetime import timedelta
+
+from django.core import mail
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import User, UserOfficeRole
+from offices.models import Office
+from .models import Job
+from .registry import enqueue, task
+from .worker import claim, run_pending
+
+CALLS = []
+
+
+@task("jobs.tests.record")
+def record(value):
+    CALLS.append(value)
+
+
+@task("jobs.tests.broken", max_attempts=3)
+def broken():
+    raise RuntimeError("indisponible")
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        CALLS.clear()
+
+    def test_enqueued_job_runs_in_worker(self):
+        job = enqueue("jobs.tests.record", value=1)
+        self.assertEqual(CALLS, [])
+
+        self.assertEqual(run_pending(), (1, 0))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("done", 1))
+        self.assertEqual(CALLS, [1])
+        self.assertEqual(claim(), [])
+
+    def test_future_job_is_not_claimed(self):
+        enqueue("jobs.tests.record", run_at=timezone.now() + timedelta(hours=1), value=2)
+        self.assertEqual(run_pending(), (0, 0))
+
+    def test_failures_back_off_then_fail(self):
+        job = enqueue("jobs.tests.broken")
+        for attempt in range(1, 4):
+            Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+            self.assertEqual(run_pending(), (0, 1))
+            job.refresh_from_db()
+            self.assertEqual(job.attempts, attempt)
+            if attempt < 3:
+                self.assertEqual(job.status, "pending")
+                self.assertGreater(job.run_at, timezone.now())
+        self.assertEqual(job.status, "failed")
+        self.assertIn("indisponible", job.last_error)
+
+    @override_settings(JOBS_EAGER=True)
+    def test_eager_mode_runs_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue("jobs.tests.record", value=3)
+            self.assertEqual(CALLS, [])
+        self.assertEqual(CALLS, [3])
+        self.assertEqual(Job.objects.get().status, "done")
+
+
+class InvitationEmailJobTests(TestCase):
+    def test_invitation_email_is_sent_by_the_worker(self):
+        office = Office.objects.create(name="Cabinet", bce_number="0123", street="Rue", number_street="1",
+                                       zipcode="1000", city="Bruxelles", email="cabinet@carehub.test")
+        manager = User.objects.create_user(email="manager@carehub.test", name="Man", surname="Ager")
+        UserOfficeRole.objects.create(user=manager, office=office, role="manager")
+        client = APIClient()
+        client.force_authenticate(manager)
+
+        response = client.post("/api/invite-user/", {
+            "office_id": office.pk, "role": "secretary",
+            "email": "secretaire@carehub.test", "name": "Sec", "surname": "Retaire",
+        }, format="json")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(run_pending(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn("register-join?token=", mail.outbox[0].body)
@@ -0,0 +1,94 @@
+"""
+Exécution des tâches en file (voir jobs.registry).
+
+Un worker réclame un lot de tâches dues avec SELECT ... FOR UPDATE SKIP LOCKED :
+plusieurs workers se partagent la file sans se bloquer ni exécuter deux fois la
+même tâche. Une tâche en échec est replanifiée avec un délai exponentiel
+(JOBS_RETRY_BASE_SECONDS * 2^(essai-1), plafonné, avec gigue) jusqu'à
+max_attempts, puis marquée failed. Une tâche restée `running` au-delà de
+JOBS_STALE_SECONDS (worker tué) redevient due.
+"""
+
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Job
+from .registry import TASKS
+
+logger = logging.getLogger(__name__)
+
+
+def retry_delay(attempts):
+    base = getattr(settings, "JOBS_RETRY_BASE_SECONDS", 30)
+    cap = getattr(settings, "JOBS_RETRY_MAX_SECONDS", 6 * 3600)
+    delay = min(cap, base * 2 ** max(0, attempts - 1))
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def claim(batch=10, now=None):
+    """
+    Réserve jusqu'à `batch` tâches dues et les passe en running ; retourne leurs ids.
+    """
+    now = now or timezone.now()
+    stale = now - timedelta(seconds=getattr(settings, "JOBS_STALE_SECONDS", 15 * 60))
+    with transaction.atomic():
+        ids = list(
+            Job.objects
+            .filter(Q(status="pending", run_at__lte=now) | Q(status="running", locked_at__lt=stale))
+            .order_by("run_at", "id")
+            .select_for_update(skip_locked=True)
+            .values_list("id", flat=True)[:batch]
+        )
+        if ids:
+            Job.objects.filter(pk__in=ids).update(status="running", locked_at=now)
+    return ids
+
+
+def run_job(job_id):
+    """
+    Exécute une tâche réclamée (ou, en mode eager, tout juste créée).
+    Retourne True si elle a réussi.
+    """
+    job = Job.objects.get(pk=job_id)
+    func = TASKS.get(job.name)
+    job.attempts += 1
+    try:
+        if func is None:
+            raise LookupError(f"Tâche inconnue : {job.name}")
+        func(**job.payload)
+    except Exception:
+        now = timezone.now()
+        job.last_error = traceback.format_exc()[-4000:]
+        job.locked_at = None
+        if job.attempts >= job.max_attempts:
+            job.status, job.finished_at = "failed", now
+            logger.error("Tâche %s #%s abandonnée après %s essais", job.name, job.pk, job.attempts)
+        else:
+            job.status, job.run_at = "pending", now + retry_delay(job.attempts)
+            logger.warning("Tâche %s #%s en échec (essai %s), reprise à %s", job.name, job.pk, job.attempts, job.run_at)
+        job.save(update_fields=["attempts", "status", "run_at", "locked_at", "last_error", "finished_at"])
+        return False
+
+    job.status, job.finished_at, job.locked_at, job.last_error = "done", timezone.now(), None, ""
+    job.save(update_fields=["attempts", "status", "locked_at", "last_error", "finished_at"])
+    return True
+
+
+def run_pending(batch=10):
+    """
+    Réclame et exécute un lot ; retourne (réussies, échouées).
+    """
+    ok = failed = 0
+    for job_id in claim(batch):
+        if run_job(job_id):
+            ok += 1
+        else:
+            failed += 1
+    return ok, failed
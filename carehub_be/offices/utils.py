@@ -0,0 +1,13 @@
+from accounts.models import UserOfficeRole
+
+
+def manager_office(request):
+    """
+    Cabinet courant (X-Office-Id ou premier rôle actif), si l'utilisateur y est manager ou secrétaire.
+    """
+    roles = UserOfficeRole.objects.filter(user=request.user, is_active=True, role__in=['manager', 'secretary'])
+    office_id = request.headers.get('X-Office-Id')
+    if office_id:
+        roles = roles.filter(office_id=office_id)
+    uor = roles.select_related('office').order_by('id').first()
+    return uor.office if uor else None
@@ -24,6 +24,11 @@ class Patient(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['office', 'surname', 'name', 'id']),
+        ]
+
     @property
     def full_name(self):
         return f"{self.name} {self.surname}".strip()
@@ -1,3 +1,61 @@
+import datetime
+
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from accounts.models import User, UserOfficeRole
+from offices.models import Office
+from .models import Patient
+
+
+class PatientKeysetPaginationTests(TestCase):
+    """
+    Pagination par curseur sur (surname, name, id) : pages disjointes et complètes
+    malgré les homonymes, retour arrière par le curseur `previous`.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.office = Office.objects.create(name="Cabinet", bce_number="0123", street="Rue", number_street="1",
+                                           zipcode="1000", city="Bruxelles", email="pages@carehub.test", is_paid=True)
+        cls.secretary = User.objects.create_user(email="pages-sec@carehub.test", name="Sec", surname="Pages")
+        UserOfficeRole.objects.create(user=cls.secretary, office=cls.office, role="secretary")
+        # Homonymes : l'ordre (surname, name) ne départage pas, seul id le fait.
+        names = [("Dupont", "Anne")] * 4 + [("Dupont", "Marc"), ("Martin", "Luc"), ("Albert", "Zoé")]
+        for surname, name in names:
+            Patient.objects.create(name=name, surname=surname, birth_date=datetime.date(1980, 1, 1),
+                                   street="Rue", street_number="1", zipcode="1000", city="Bruxelles",
+                                   telephone="0470000000", office=cls.office)
+        cls.expected = list(Patient.objects.order_by("surname", "name", "id").values_list("id", flat=True))
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.secretary)
+
+    def _get(self, url, **params):
+        return self.api.get(url, params, HTTP_X_OFFICE_ID=str(self.office.id))
+
+    def test_without_params_returns_a_plain_list(self):
+        response = self._get(reverse("patient-list"))
+        self.assertEqual([p["id"] for p in response.data], self.expected)
+
+    def test_next_then_previous_cursors_cover_every_row_once(self):
+        pages, response = [], self._get(reverse("patient-list"), page_size=3)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            pages.append([p["id"] for p in response.data["results"]])
+            if not response.data["next"]:
+                break
+            response = self.api.get(response.data["next"], HTTP_X_OFFICE_ID=str(self.office.id))
+
+        self.assertEqual(pages, [self.expected[0:3], self.expected[3:6], self.expected[6:7]])
+
+        back = self.api.get(response.data["previous"], HTTP_X_OFFICE_ID=str(self.office.id))
+        self.assertEqual([p["id"] for p in back.data["results"]], self.expected[3:6])
+        self.assertIsNotNone(back.data["next"])
 
-# Create your tests here.
+    def test_invalid_cursor_is_rejected(self):
+        for cursor in ("pas-un-curseur", "eyJwIjpbMV0sInIiOjB9"):
+            response = self._get(reverse("patient-list"), cursor=cursor)
+            self.assertEqual(response.status_code, 404)
@@ -9,6 +9,7 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 
 from accounts.models import UserOfficeRole
+from carehub_be.pagination import KeysetPagination
 from offices.models import Office
 from .models import Patient
 from .serializers import PatientSerializer
@@ -22,9 +23,13 @@ def _current_office(request):
 
     return rel.office if rel else None
 
+class PatientPagination(KeysetPagination):
+    ordering = ("surname", "name", "id")
+
 class PatientViewSet(viewsets.ModelViewSet):
     serializer_class = PatientSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = PatientPagination
     queryset = Patient.objects.all()
 
     def get_queryset(self):
@@ -1,3 +1,62 @@
+import datetime
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from agenda.models import AnnualSessionCounter, PrescriptionSessionCounter
+from billing.models import PathologyCategory, PathologyDetail
+from offices.models import Office
+from patients.models import Patient
+from .models import Prescription
+
+
+class PrescriptionPricingTests(TestCase):
+    """
+    Prescription et aperçu de tarification passent par price_for : même grille,
+    numéro de séance lu dans les compteurs.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command("import_tariffs", year=2025, stdout=StringIO())
+        office = Office.objects.create(name="Cabinet", bce_number="0123", street="Rue", number_street="1",
+                                       zipcode="1000", city="Bruxelles", email="presc@carehub.test")
+        cls.user = User.objects.create_user(email="presc-kine@carehub.test", name="Kiné", surname="Presc")
+        cls.patient = Patient.objects.create(name="Patient", surname="Presc", birth_date=datetime.date(1980, 1, 1),
+                                             street="Rue", street_number="1", zipcode="1000", city="Bruxelles",
+                                             telephone="0470000000", office=office)
+        cls.category = PathologyCategory.objects.get(code="PC")
+        cls.prescription = Prescription.objects.create(
+            patient=cls.patient, prescribed_by=cls.user, pathology_category=cls.category,
+            pathology_detail=PathologyDetail.objects.filter(category=cls.category).first(),
+        )
+
+    def _preview(self, **data):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        payload = {"patient_id": self.patient.pk, "pathology_category": "PC", "place": "office",
+                   "date": "2025-03-03", **data}
+        return client.post(reverse("calculate-pricing"), payload, format="json")
+
+    def test_calculate_pricing_uses_the_tariff_grid(self):
+        pricing = self.prescription.calculate_pricing(False, 0, place="office", day=datetime.date(2025, 3, 3))
+        self.assertEqual((pricing["code_dossier"], pricing["remboursement"]), ("567033", Decimal("31.74")))
+
+        pricing = self.prescription.calculate_pricing(True, 9, place="office", day=datetime.date(2025, 3, 3))
+        self.assertEqual((pricing["code_prestation"], pricing["remboursement"]), ("560011", Decimal("28.30")))
+
+    def test_preview_reads_session_counters(self):
+        PrescriptionSessionCounter.objects.create(prescription=self.prescription, planned=1)
+        response = self._preview(prescription_id=self.prescription.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data["session_index"], response.data["code_dossier"]), (2, None))
 
-# Create your tests here.
+        AnnualSessionCounter.objects.create(patient=self.patient, year=2025, category=self.category, planned=18)
+        response = self._preview()
+        self.assertEqual((response.data["session_index"], response.data["is_over_annual"]), (19, True))
+        self.assertEqual(response.data["remboursement"], 0)
@@ -1,12 +1,14 @@
 from django.shortcuts import render
-from billing.models import PathologyDetail
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from billing.models import PathologyCategory
+from billing.pricing import price_for
 from rest_framework import viewsets
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from .models import Prescription, Patient
 from .serializers import PrescriptionSerializer
-from .utils import get_session_number
 
 class PrescriptionViewSet(viewsets.ModelViewSet):
     queryset = Prescription.objects.all()
@@ -14,44 +16,45 @@ class PrescriptionViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
 
 class PricingCalculationView(APIView):
+    """
+    Aperçu de la tarification de la prochaine séance d'un patient.
+    Body: patient_id, pathology_category (id ou code) [, prescription_id, place, is_bim, date]
+    Le numéro de séance vient des compteurs dénormalisés, le tarif de la table en mémoire.
+    """
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
+        from agenda.models import ANNUAL_QUOTA, AnnualSessionCounter, PrescriptionSessionCounter
+
         patient_id = request.data.get('patient_id')
-        category_code = request.data.get('pathology_category')
-        is_bim = request.data.get('is_bim', False)
+        category = request.data.get('pathology_category')
+        prescription_id = request.data.get('prescription_id')
+        is_bim = str(request.data.get('is_bim', False)).lower() in ('1', 'true')
+        place = request.data.get('place') or 'home'
 
-        if not patient_id or not category_code:
+        if not patient_id or not category:
             return Response({"error": "patient_id et pathology_category sont requis."}, status=400)
-        
-        try:
-            patient = Patient.objects.get(id=patient_id)
-        except Patient.DoesNotExist:
+
+        day = parse_date(str(request.data.get('date') or '')) or timezone.localdate()
+
+        category_id = category if str(category).isdigit() else (
+            PathologyCategory.objects.filter(code=category).values_list('id', flat=True).first()
+        )
+        if not category_id:
+            return Response({"error": "Catégorie de pathologie inconnue."}, status=404)
+
+        if not Patient.objects.filter(id=patient_id).exists():
             return Response({"error": "Patient introuvable."}, status=404)
-        
-        nb_sessions = patient.appointments.filter(prescription__pathology_category=category_code).count()
-        session_number = get_session_number(category_code, nb_sessions)
-        is_first_session = (session_number == '1ère')
-
-        
-        try:
-            pathology_detail = PathologyDetail.objects.get(
-                category__code=category_code,
-                session_number=session_number
-            )
-        except PathologyDetail.DoesNotExist:
+
+        if prescription_id:
+            session_idx = PrescriptionSessionCounter.planned_for(prescription_id) + 1
+            over_quota = False
+        else:
+            session_idx = AnnualSessionCounter.planned_for(patient_id, day.year, int(category_id)) + 1
+            over_quota = session_idx > ANNUAL_QUOTA
+
+        pricing = price_for(day, int(category_id), place, session_idx, is_bim, over_quota)
+        if not pricing:
             return Response({"error": "Données tarifaires non trouvées pour cette session."}, status=404)
 
-        honoraires_total = pathology_detail.honoraire_presta or 0
-        if is_first_session:
-            honoraires_total += pathology_detail.honoraire_dossier or 0
-        if pathology_detail.honoraire_depla:
-            honoraires_total += pathology_detail.honoraire_depla
-
-        return Response({
-            "code_prestation": pathology_detail.code_presta,
-            "code_dossier": pathology_detail.code_dossier if is_first_session else None,
-            "honoraires_total": honoraires_total,
-            "remboursement": pathology_detail.reimbursement_bim if is_bim else pathology_detail.reimbursement_non_bim,
-            "tiers_payant": pathology_detail.tm_bim if is_bim else pathology_detail.tm_not_bim,
-        })
\ No newline at end of file
+        return Response({**pricing, "session_index": session_idx, "is_over_annual": over_quota})
@@ -5,7 +5,6 @@ from rest_framework_simplejwt.authentication import JWTAuthentication
 from accounts.models import UserOfficeRole
 from offices.models import Office
 from .utils import office_has_active_access
-from .services import ensure_subscription_matches_roles
 
 WHITELIST_PATH_PREFIXES = (
     "/api/auth/",
@@ -57,18 +56,10 @@ class SubscriptionGateMiddleware(MiddlewareMixin):
         if office_has_active_access(office):
             return None
 
+        # Pas d'appel Stripe ici : le paywall ouvre la session via subscriptions/checkout/start.
         payload = {
             "detail": "payment_required",
             "office_id": office.id,
             "office_name": office.name,
         }
-        try:
-            res = ensure_subscription_matches_roles(
-                office, user.email, create_checkout_if_needed=True
-            )
-            if isinstance(res, dict) and res.get("checkout_url"):
-                payload["checkout_url"] = res["checkout_url"]
-        except Exception:
-            pass
-
         return JsonResponse(payload, status=402)
@@ -85,10 +85,12 @@ def _dt_from_ts(ts: int | None) -> datetime.datetime | None:
     return datetime.datetime.fromtimestamp(int(ts), tz=datetime.timezone.utc)
 
 @transaction.atomic
-def ensure_subscription_matches_roles(office: Office, customer_email: str) -> Union[Subscription, Dict[str, object]]:
+def ensure_subscription_matches_roles(
+    office: Office, customer_email: str, create_checkout_if_needed: bool = True,
+) -> Union[Subscription, Dict[str, object]]:
     """
     1) Calcule les quantités par rôle (manager/practitioner/secretary) pour le cabinet.
-    2) Si aucune souscription Stripe n'existe encore:
+    2) Si aucune souscription Stripe n'existe encore (et create_checkout_if_needed):
          - crée une Checkout Session (mode=subscription) avec les items désirés
          - si SUBSCRIPTION_TRIAL_DAYS > 0, ajoute une période d'essai
          - renvoie {"checkout_url": ..., "subscription": <sub>}
@@ -108,7 +110,9 @@ def ensure_subscription_matches_roles(office: Office, customer_email: str) -> Un
     counts = count_roles(office.id)
     desired_items = _desired_items_from_counts(counts)
 
-    sub, _ = Subscription.objects.get_or_create(office=office)
+    Subscription.objects.get_or_create(office=office)
+    # Verrou : le worker (jobs) et le paywall peuvent synchroniser le même cabinet en parallèle.
+    sub = Subscription.objects.select_for_update().get(office=office)
 
     # S'assurer que le customer Stripe existe
     _ensure_customer(sub, customer_email)
@@ -139,6 +143,8 @@ def ensure_subscription_matches_roles(office: Office, customer_email: str) -> Un
 
     # Aucune souscription Stripe encore : on crée une Checkout Session
     if not sub.stripe_subscription_id:
+        if not create_checkout_if_needed:
+            return sub
         session_params = {
             "mode": "subscription",
             "customer": sub.stripe_customer_id,
@@ -0,0 +1,21 @@
+from jobs.registry import task
+from offices.models import Office
+from .services import ensure_subscription_matches_roles
+from .utils import sync_quantity_to_stripe
+
+
+@task("subscriptions.sync_roles")
+def sync_roles(office_id, email):
+    """
+    Aligne les quantités Stripe sur les rôles actifs du cabinet (et crée le client
+    Stripe si besoin). N'ouvre jamais de session de paiement : c'est le rôle du paywall.
+    """
+    office = Office.objects.filter(pk=office_id).first()
+    if office is None:
+        return
+    ensure_subscription_matches_roles(office, email, create_checkout_if_needed=False)
+
+
+@task("subscriptions.sync_quantity")
+def sync_quantity(office_id):
+    sync_quantity_to_stripe(office_id)